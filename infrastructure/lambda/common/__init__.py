@@ -0,0 +1,3 @@
+"""
+Shared modules packaged alongside every Brandpoint AI Platform Lambda function.
+"""
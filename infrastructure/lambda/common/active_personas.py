@@ -0,0 +1,92 @@
+"""
+Active persona lookup for Brandpoint AI Platform Lambda functions.
+
+Active personas are read from the sparse active-personas index, which
+only holds active personas and projects just the workflow fields. Until
+scripts/backfill-active-status.py has run (ACTIVE_PERSONAS_BACKFILLED),
+older personas may lack activeStatus, so the table is read with a
+parallel segmented scan projected to the same fields instead.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import boto3
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+ACTIVE_PERSONAS_INDEX = os.environ.get('ACTIVE_PERSONAS_INDEX', 'active-personas-index')
+ACTIVE_PERSONAS_BACKFILLED = os.environ.get('ACTIVE_PERSONAS_BACKFILLED', 'false').lower() == 'true'
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '8'))
+
+# Fields the workflow needs from each persona; the index projects these
+WORKFLOW_FIELDS = [
+    'personaId', 'name', 'brandId', 'clientId', 'demographics', 'psychographics',
+    'queryPatterns', 'targetQueries', 'preferredEngines', 'version', 'updatedAt'
+]
+
+
+def load_active_personas(table_name: str) -> List[Dict[str, Any]]:
+    """Every active persona in the table, with the workflow fields only."""
+    if ACTIVE_PERSONAS_INDEX and ACTIVE_PERSONAS_BACKFILLED:
+        try:
+            return query_active_index(table_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+                raise
+            logger.warning(f"Active personas index unavailable, scanning: {e}")
+
+    return parallel_scan_active(table_name)
+
+
+def query_active_index(table_name: str) -> List[Dict[str, Any]]:
+    """Read every persona from the sparse active-personas GSI."""
+    table = boto3.resource('dynamodb').Table(table_name)
+    query_kwargs = {
+        'IndexName': ACTIVE_PERSONAS_INDEX,
+        'KeyConditionExpression': Key('activeStatus').eq('active')
+    }
+
+    personas = []
+    while True:
+        response = table.query(**query_kwargs)
+        personas.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return personas
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def parallel_scan_active(table_name: str, total_segments: int = SCAN_SEGMENTS) -> List[Dict[str, Any]]:
+    """Scan the table in parallel segments, returning active personas only."""
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        segments = executor.map(
+            lambda segment: scan_segment(table_name, segment, total_segments),
+            range(total_segments)
+        )
+        return [persona for segment in segments for persona in segment]
+
+
+def scan_segment(table_name: str, segment: int, total_segments: int) -> List[Dict[str, Any]]:
+    """Scan one segment of the personas table."""
+    # boto3 resources are not thread-safe; each segment gets its own
+    segment_table = boto3.session.Session().resource('dynamodb').Table(table_name)
+
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        # Personas created through persona-api use isActive; older
+        # records used status = 'active'
+        'FilterExpression': Attr('isActive').eq(True) | Attr('status').eq('active'),
+        'ProjectionExpression': ', '.join(f"#f{i}" for i in range(len(WORKFLOW_FIELDS))),
+        'ExpressionAttributeNames': {f"#f{i}": field for i, field in enumerate(WORKFLOW_FIELDS)}
+    }
+
+    personas = []
+    while True:
+        response = segment_table.scan(**scan_kwargs)
+        personas.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return personas
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,213 @@
+"""
+Shared Bedrock invocation layer for Brandpoint AI Platform Lambda functions.
+
+Every Bedrock call goes through one client configured with botocore's
+adaptive retry mode and explicit timeouts. Calls are bounded per model
+by a semaphore, and each call's latency and token usage are emitted as
+CloudWatch metrics in embedded metric format (a structured log line, so
+no extra API calls are made).
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Union
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BEDROCK_CONNECT_TIMEOUT = int(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '5'))
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', '120'))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '6'))
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', '8'))
+# Per-model overrides, e.g. {"amazon.titan-embed-text-v2:0": 16}
+BEDROCK_MODEL_CONCURRENCY = json.loads(os.environ.get('BEDROCK_MODEL_CONCURRENCY', '{}') or '{}')
+BEDROCK_METRICS_ENABLED = os.environ.get('BEDROCK_METRICS_ENABLED', 'true').lower() == 'true'
+BEDROCK_METRICS_NAMESPACE = os.environ.get('BEDROCK_METRICS_NAMESPACE', 'Brandpoint/Bedrock')
+DEFAULT_EMBEDDING_MODEL = os.environ.get('BEDROCK_EMBEDDING_MODEL', 'amazon.titan-embed-text-v2:0')
+
+_client = None
+_client_lock = threading.Lock()
+_semaphores = {}
+_usage = {}
+
+
+def get_bedrock_client():
+    """Return the shared bedrock-runtime client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client('bedrock-runtime', config=Config(
+                    retries={'mode': 'adaptive', 'max_attempts': BEDROCK_MAX_ATTEMPTS},
+                    connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                    read_timeout=BEDROCK_READ_TIMEOUT,
+                    max_pool_connections=max(BEDROCK_MAX_CONCURRENCY, *BEDROCK_MODEL_CONCURRENCY.values(), 10)
+                ))
+    return _client
+
+
+def invoke_model(model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoke a model and return the decoded response body."""
+    started = time.monotonic()
+    with _model_semaphore(model_id):
+        response = get_bedrock_client().invoke_model(
+            modelId=model_id,
+            body=json.dumps(body),
+            contentType="application/json",
+            accept="application/json"
+        )
+        response_body = json.loads(response['body'].read())
+
+    _record(model_id, (time.monotonic() - started) * 1000, _usage_from_body(response_body))
+    return response_body
+
+
+def invoke_model_stream(model_id: str, body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Invoke a model with response streaming, yielding decoded chunks.
+
+    The model's concurrency slot is held until the stream is exhausted
+    or closed.
+    """
+    started = time.monotonic()
+    first_byte_ms = None
+    usage = {}
+    with _model_semaphore(model_id):
+        response = get_bedrock_client().invoke_model_with_response_stream(
+            modelId=model_id,
+            body=json.dumps(body),
+            contentType="application/json",
+            accept="application/json"
+        )
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            data = json.loads(chunk['bytes'])
+            if first_byte_ms is None:
+                first_byte_ms = (time.monotonic() - started) * 1000
+            if data.get('type') == 'message_start':
+                usage.update(_usage_from_body(data.get('message', {})))
+            metrics = data.get('amazon-bedrock-invocationMetrics')
+            if metrics:
+                usage['inputTokens'] = metrics.get('inputTokenCount', usage.get('inputTokens', 0))
+                usage['outputTokens'] = metrics.get('outputTokenCount', 0)
+            yield data
+
+    _record(model_id, (time.monotonic() - started) * 1000, usage, first_byte_ms)
+
+
+def invoke_claude(
+    model_id: str,
+    prompt: str,
+    system_prompt: Union[str, List[Dict[str, Any]], None] = None,
+    max_tokens: int = 4096,
+    temperature: float = 0.7
+) -> str:
+    """Invoke a Claude model with a single user turn and return the text."""
+    response_body = invoke_model(model_id, build_claude_body(prompt, system_prompt, max_tokens, temperature))
+    return response_body['content'][0]['text']
+
+
+def build_claude_body(
+    prompt: str,
+    system_prompt: Union[str, List[Dict[str, Any]], None] = None,
+    max_tokens: int = 4096,
+    temperature: float = 0.7
+) -> Dict[str, Any]:
+    """Messages API request body for a single user turn."""
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+    if system_prompt:
+        body["system"] = system_prompt
+    return body
+
+
+def embed_text(
+    text: str,
+    model_id: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: Optional[int] = None,
+    normalize: Optional[bool] = None
+) -> List[float]:
+    """Generate a Titan embedding for one text."""
+    body = {"inputText": text}
+    if dimensions:
+        body["dimensions"] = dimensions
+    if normalize is not None:
+        body["normalize"] = normalize
+    return invoke_model(model_id, body).get('embedding', [])
+
+
+def get_usage() -> Dict[str, Dict[str, int]]:
+    """Calls and token totals per model since the container started."""
+    return {model_id: dict(totals) for model_id, totals in _usage.items()}
+
+
+def _model_semaphore(model_id: str) -> threading.BoundedSemaphore:
+    semaphore = _semaphores.get(model_id)
+    if semaphore is None:
+        with _client_lock:
+            semaphore = _semaphores.setdefault(model_id, threading.BoundedSemaphore(
+                int(BEDROCK_MODEL_CONCURRENCY.get(model_id, BEDROCK_MAX_CONCURRENCY))
+            ))
+    return semaphore
+
+
+def _usage_from_body(response_body: Dict[str, Any]) -> Dict[str, int]:
+    # Claude reports usage.input_tokens/output_tokens; Titan embeddings
+    # report inputTextTokenCount.
+    usage = response_body.get('usage') or {}
+    counts = {
+        'inputTokens': usage.get('input_tokens', response_body.get('inputTextTokenCount', 0)),
+        'outputTokens': usage.get('output_tokens', 0)
+    }
+    if usage.get('cache_read_input_tokens') or usage.get('cache_creation_input_tokens'):
+        counts['cacheReadInputTokens'] = usage.get('cache_read_input_tokens', 0)
+        counts['cacheWriteInputTokens'] = usage.get('cache_creation_input_tokens', 0)
+    return counts
+
+
+def _record(model_id: str, latency_ms: float, usage: Dict[str, int], first_byte_ms: Optional[float] = None):
+    with _client_lock:
+        totals = _usage.setdefault(model_id, {'calls': 0, 'inputTokens': 0, 'outputTokens': 0})
+        totals['calls'] += 1
+        for name, value in usage.items():
+            totals[name] = totals.get(name, 0) + (value or 0)
+
+    if not BEDROCK_METRICS_ENABLED:
+        return
+
+    metrics = {'LatencyMs': round(latency_ms, 1)}
+    if first_byte_ms is not None:
+        metrics['TimeToFirstByteMs'] = round(first_byte_ms, 1)
+    for name, value in usage.items():
+        metrics[name[0].upper() + name[1:]] = value or 0
+
+    units = {name: 'Milliseconds' if name.endswith('Ms') else 'Count' for name in metrics}
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': BEDROCK_METRICS_NAMESPACE,
+                'Dimensions': [['ModelId'], ['ModelId', 'FunctionName']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()]
+            }]
+        },
+        'ModelId': model_id,
+        'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+        **metrics
+    }
+    # Written rather than logged so the line is pure JSON for EMF parsing,
+    # in a single write so concurrent calls cannot interleave lines
+    sys.stdout.write(json.dumps(record) + '\n')
@@ -0,0 +1,90 @@
+"""
+Text chunking for Brandpoint AI Platform embeddings.
+
+Content is split on paragraph and sentence boundaries into chunks of
+roughly CHUNK_CHARS characters, each starting with the last
+CHUNK_OVERLAP_CHARS of the previous one so no sentence loses its
+context. Input may be a string or any iterable of text pieces (such as
+a streamed S3 body); chunks are yielded as soon as they are complete, so
+memory stays bounded by the chunk size rather than the document size.
+"""
+import os
+import re
+from typing import Iterable, Iterator, Union
+
+CHUNK_CHARS = int(os.environ.get('CHUNK_CHARS', '2000'))
+CHUNK_OVERLAP_CHARS = int(os.environ.get('CHUNK_OVERLAP_CHARS', '200'))
+
+# End of a sentence (followed by whitespace) or a blank line
+_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+def iter_chunks(
+    source: Union[str, Iterable[str]],
+    chunk_chars: int = CHUNK_CHARS,
+    overlap_chars: int = CHUNK_OVERLAP_CHARS
+) -> Iterator[str]:
+    """Yield overlapping chunks of the source text."""
+    current = []
+    size = 0
+    fresh = False  # current holds more than carried-over overlap
+
+    for unit in _iter_units(source, chunk_chars):
+        if fresh and size + len(unit) > chunk_chars:
+            yield ''.join(current).strip()
+
+            carry = []
+            carried = 0
+            for previous in reversed(current):
+                if carried + len(previous) > overlap_chars:
+                    break
+                carry.insert(0, previous)
+                carried += len(previous)
+            current, size, fresh = carry, carried, False
+
+        current.append(unit)
+        size += len(unit)
+        fresh = fresh or bool(unit.strip())
+
+    if fresh:
+        yield ''.join(current).strip()
+
+
+def _iter_units(source: Union[str, Iterable[str]], max_len: int) -> Iterator[str]:
+    """Yield sentences and paragraphs, none longer than max_len."""
+    pieces = [source] if isinstance(source, str) else source
+    buffer = ''
+
+    for piece in pieces:
+        if isinstance(piece, bytes):
+            piece = piece.decode('utf-8', errors='replace')
+        buffer += piece
+
+        last = 0
+        for match in _BOUNDARY.finditer(buffer):
+            yield from _split_long(buffer[last:match.end()], max_len)
+            last = match.end()
+        buffer = buffer[last:]
+
+        # A run of text with no boundary must not grow without limit
+        while len(buffer) > max_len:
+            head, buffer = _cut(buffer, max_len)
+            yield head
+
+    if buffer:
+        yield from _split_long(buffer, max_len)
+
+
+def _split_long(unit: str, max_len: int) -> Iterator[str]:
+    while len(unit) > max_len:
+        head, unit = _cut(unit, max_len)
+        yield head
+    if unit:
+        yield unit
+
+
+def _cut(text: str, max_len: int):
+    # Prefer the last whitespace before the limit
+    cut = text.rfind(' ', max_len // 2, max_len)
+    cut = cut + 1 if cut > 0 else max_len
+    return text[:cut], text[cut:]
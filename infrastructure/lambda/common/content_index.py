@@ -0,0 +1,294 @@
+"""
+Layout and lifecycle of the content vector indices.
+
+Content is written through a write alias to the newest index and read
+through a read alias spanning every index. The write index is rolled
+over by age, size or document count, and the next index gets a shard
+count sized from the one it replaces. Rolled-over (sealed) indices are
+write-blocked and force-merged to one segment, which keeps their HNSW
+graphs compact. Searches bounded by published date are sent only to the
+indices whose date range overlaps the filter.
+
+Indices are named {OPENSEARCH_INDEX}-000001, -000002, ...; a pre-alias
+index named OPENSEARCH_INDEX itself joins the read alias as sealed, and
+the first index takes its engine and space type so scores stay on one
+scale. A
+vector migration starts a new family, {OPENSEARCH_INDEX}-{encoding}-
+{dimension}-{timestamp}-000001, which takes over both aliases once it
+is backfilled (see common.vector_encoding).
+"""
+import os
+import math
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common.vector_encoding import FILTER_ENGINES, TITAN_DIMENSIONS, config_from_mapping, knn_engine
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'content-embeddings')
+OPENSEARCH_WRITE_ALIAS = f"{OPENSEARCH_INDEX}-write"
+OPENSEARCH_READ_ALIAS = f"{OPENSEARCH_INDEX}-read"
+
+INDEX_ROLLOVER_MAX_AGE = os.environ.get('INDEX_ROLLOVER_MAX_AGE', '30d')
+INDEX_ROLLOVER_MAX_SIZE = os.environ.get('INDEX_ROLLOVER_MAX_SIZE', '50gb')
+INDEX_ROLLOVER_MAX_DOCS = int(os.environ.get('INDEX_ROLLOVER_MAX_DOCS', '5000000'))
+INDEX_INITIAL_SHARDS = int(os.environ.get('INDEX_INITIAL_SHARDS', '2'))
+INDEX_TARGET_SHARD_GB = float(os.environ.get('INDEX_TARGET_SHARD_GB', '25'))
+INDEX_MAX_SHARDS = int(os.environ.get('INDEX_MAX_SHARDS', '8'))
+INDEX_MERGES_PER_RUN = int(os.environ.get('INDEX_MERGES_PER_RUN', '1'))
+INDEX_MERGE_TIMEOUT = int(os.environ.get('INDEX_MERGE_TIMEOUT', '600'))
+INDEX_LAYOUT_TTL_SECONDS = int(os.environ.get('INDEX_LAYOUT_TTL_SECONDS', '300'))
+
+_layout = {'expiresAt': 0.0}
+
+
+def bootstrap(client, index_body: Callable[[int, Optional[Dict[str, Any]]], Dict[str, Any]]) -> bool:
+    """
+    Create the first index behind the aliases if the write alias is missing.
+
+    index_body(shards, vector_config) returns the settings and mappings
+    for a new index; a None config means the default for new families.
+    Returns True if anything was created.
+    """
+    if client.indices.exists_alias(name=OPENSEARCH_WRITE_ALIAS):
+        return False
+
+    # The first index must match a pre-alias index it is searched with
+    legacy = client.indices.exists(index=OPENSEARCH_INDEX)
+    config = None
+    if legacy:
+        config = config_from_mapping(client.indices.get_mapping(index=OPENSEARCH_INDEX)[OPENSEARCH_INDEX]['mappings'])
+        if config['dimension'] not in TITAN_DIMENSIONS:
+            logger.warning(f"Legacy index {OPENSEARCH_INDEX} has {config['dimension']}-dimension vectors, which "
+                           f"the embedding model cannot produce; searches and writes will fail until a "
+                           f"migrate-vectors job re-embeds it")
+
+    first = f"{OPENSEARCH_INDEX}-000001"
+    body = index_body(INDEX_INITIAL_SHARDS, config)
+    body['aliases'] = {
+        OPENSEARCH_WRITE_ALIAS: {'is_write_index': True},
+        OPENSEARCH_READ_ALIAS: {}
+    }
+    try:
+        client.indices.create(index=first, body=body)
+        logger.info(f"Created index {first} behind {OPENSEARCH_WRITE_ALIAS}")
+    except Exception as e:
+        # Another container won the race
+        if 'resource_already_exists' not in str(e):
+            raise
+        return False
+
+    # Keep content indexed before aliases existed searchable
+    if legacy:
+        client.indices.update_aliases(body={'actions': [
+            {'add': {'index': OPENSEARCH_INDEX, 'alias': OPENSEARCH_READ_ALIAS}}
+        ]})
+        logger.info(f"Added legacy index {OPENSEARCH_INDEX} to {OPENSEARCH_READ_ALIAS}")
+    _layout['expiresAt'] = 0.0
+    return True
+
+
+def rollover(client, index_body: Callable[[int, Optional[Dict[str, Any]]], Dict[str, Any]],
+             force: bool = False) -> Dict[str, Any]:
+    """Roll the write alias over if a condition is met (or force)."""
+    shards = next_shard_count(client)
+    # The next index keeps the family's vector config
+    body = index_body(shards, vector_config(client, write=True))
+    body['aliases'] = {OPENSEARCH_READ_ALIAS: {}}
+    if not force:
+        body['conditions'] = {
+            'max_age': INDEX_ROLLOVER_MAX_AGE,
+            'max_size': INDEX_ROLLOVER_MAX_SIZE,
+            'max_docs': INDEX_ROLLOVER_MAX_DOCS
+        }
+
+    response = client.indices.rollover(alias=OPENSEARCH_WRITE_ALIAS, body=body)
+    if response.get('rolled_over'):
+        _layout['expiresAt'] = 0.0
+        logger.info(f"Rolled {response['old_index']} over to {response['new_index']} with {shards} shards")
+    return {
+        'rolledOver': bool(response.get('rolled_over')),
+        'oldIndex': response.get('old_index'),
+        'newIndex': response.get('new_index'),
+        'shards': shards,
+        'conditions': response.get('conditions', {})
+    }
+
+
+def next_shard_count(client) -> int:
+    """Primary shards for the next index, sized from the current write index."""
+    try:
+        stats = client.indices.stats(index=OPENSEARCH_WRITE_ALIAS, metric='store')
+        size_bytes = stats['_all']['primaries']['store']['size_in_bytes']
+    except Exception as e:
+        logger.warning(f"Could not read write index size: {e}")
+        return INDEX_INITIAL_SHARDS
+    shards = math.ceil(size_bytes / (INDEX_TARGET_SHARD_GB * 1024 ** 3))
+    return max(1, min(INDEX_MAX_SHARDS, shards))
+
+
+def merge_sealed(client) -> List[str]:
+    """
+    Write-block and force-merge sealed indices not yet merged.
+
+    At most INDEX_MERGES_PER_RUN indices per call; a merge that outlasts
+    INDEX_MERGE_TIMEOUT keeps running on the cluster.
+    """
+    merged = []
+    for index in sealed_indices(client, refresh=True):
+        if len(merged) >= INDEX_MERGES_PER_RUN:
+            break
+        settings = client.indices.get_settings(index=index, name='index.blocks.write')
+        blocked = settings.get(index, {}).get('settings', {}).get('index', {}).get('blocks', {}).get('write')
+        if str(blocked).lower() == 'true':
+            continue
+
+        client.indices.put_settings(index=index, body={'index': {'blocks': {'write': True}}})
+        try:
+            client.indices.forcemerge(index=index, max_num_segments=1, request_timeout=INDEX_MERGE_TIMEOUT)
+            logger.info(f"Force-merged {index}")
+        except Exception as e:
+            logger.warning(f"Force merge of {index} still running or failed: {e}")
+        merged.append(index)
+    return merged
+
+
+def get_layout(client, refresh: bool = False) -> Tuple[Optional[str], List[str]]:
+    """(write index, all read indices), cached for INDEX_LAYOUT_TTL_SECONDS."""
+    if refresh or _layout['expiresAt'] < time.monotonic():
+        write_index = None
+        read_indices = []
+        for index, info in client.indices.get_alias(name=f"{OPENSEARCH_WRITE_ALIAS},{OPENSEARCH_READ_ALIAS}").items():
+            aliases = info.get('aliases', {})
+            if aliases.get(OPENSEARCH_WRITE_ALIAS, {}).get('is_write_index'):
+                write_index = index
+            if OPENSEARCH_READ_ALIAS in aliases:
+                read_indices.append(index)
+        _layout.update({
+            'writeIndex': write_index,
+            'readIndices': sorted(read_indices),
+            'bounds': None,
+            'vectorConfigs': {},
+            'knnEngines': {},
+            'expiresAt': time.monotonic() + INDEX_LAYOUT_TTL_SECONDS
+        })
+    return _layout['writeIndex'], _layout['readIndices']
+
+
+def vector_config(client, write: bool = False) -> Dict[str, Any]:
+    """Vector config of the write index, or of the newest read index."""
+    write_index, read_indices = get_layout(client)
+    index = write_index if write or write_index in read_indices else read_indices[-1]
+    cached = _layout.get('vectorConfigs', {})
+    if index not in cached:
+        mapping = client.indices.get_mapping(index=index)[index]['mappings']
+        cached[index] = config_from_mapping(mapping)
+        _layout['vectorConfigs'] = cached
+    return cached[index]
+
+
+def knn_filter_supported(client, indices: Optional[List[str]] = None) -> bool:
+    """True if every index searched (default: the read alias) can filter inside k-NN."""
+    _, read_indices = get_layout(client)
+    engines = _layout.get('knnEngines', {})
+    for index in indices or read_indices:
+        if index not in engines:
+            engines[index] = knn_engine(client.indices.get_mapping(index=index)[index]['mappings'])
+            _layout['knnEngines'] = engines
+        if engines[index] not in FILTER_ENGINES:
+            return False
+    return True
+
+
+def new_family_index(config: Dict[str, Any]) -> str:
+    """Name for the first index of a new family with this vector config."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M')
+    return f"{OPENSEARCH_INDEX}-{config['encoding']}-{config['dimension']}-{stamp}-000001"
+
+
+def swap_family(client, target: str) -> List[str]:
+    """
+    Point both aliases at target alone, in one atomic alias update.
+
+    Returns the indices taken out of the read alias; they are kept for
+    rollback and can be deleted once the new family is trusted.
+    """
+    write_index, read_indices = get_layout(client, refresh=True)
+    actions = [{'remove': {'index': index, 'alias': OPENSEARCH_READ_ALIAS}} for index in read_indices]
+    actions += [
+        {'remove': {'index': write_index, 'alias': OPENSEARCH_WRITE_ALIAS}},
+        {'add': {'index': target, 'alias': OPENSEARCH_WRITE_ALIAS, 'is_write_index': True}},
+        {'add': {'index': target, 'alias': OPENSEARCH_READ_ALIAS}}
+    ]
+    client.indices.update_aliases(body={'actions': actions})
+    _layout['expiresAt'] = 0.0
+    logger.info(f"Swapped {OPENSEARCH_WRITE_ALIAS} and {OPENSEARCH_READ_ALIAS} to {target}")
+    return read_indices
+
+
+def sealed_indices(client, refresh: bool = False) -> List[str]:
+    """Read indices that no longer take writes, oldest first."""
+    write_index, read_indices = get_layout(client, refresh)
+    return [index for index in read_indices if index != write_index]
+
+
+def indices_for_dates(client, date_from: Optional[str], date_to: Optional[str]) -> Optional[List[str]]:
+    """
+    Read indices whose published_date range overlaps [date_from, date_to].
+
+    Returns None when no routing applies (search the read alias). The
+    write index is always included, since its range is still growing.
+    """
+    start = _epoch_millis(date_from)
+    end = _epoch_millis(date_to, round_up=True)
+    if start is None and end is None:
+        return None
+
+    write_index, _ = get_layout(client)
+    bounds = _layout.get('bounds')
+    if bounds is None:
+        response = client.search(index=OPENSEARCH_READ_ALIAS, body={
+            "size": 0,
+            "aggs": {
+                "indices": {
+                    "terms": {"field": "_index", "size": 1000},
+                    "aggs": {
+                        "min_date": {"min": {"field": "published_date"}},
+                        "max_date": {"max": {"field": "published_date"}}
+                    }
+                }
+            }
+        })
+        bounds = {
+            bucket['key']: (bucket['min_date'].get('value'), bucket['max_date'].get('value'))
+            for bucket in response['aggregations']['indices']['buckets']
+        }
+        _layout['bounds'] = bounds
+
+    selected = [] if write_index is None else [write_index]
+    for index, (low, high) in bounds.items():
+        if index == write_index or low is None:
+            continue
+        if (end is None or low <= end) and (start is None or high >= start):
+            selected.append(index)
+    return selected
+
+
+def _epoch_millis(value: Optional[str], round_up: bool = False) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    millis = parsed.timestamp() * 1000
+    if round_up and len(value) == 10:
+        # A bare date as an upper bound covers the whole day, as in a range query
+        millis += 24 * 60 * 60 * 1000 - 1
+    return millis
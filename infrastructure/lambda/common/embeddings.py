@@ -0,0 +1,263 @@
+"""
+Shared embedding service for Brandpoint AI Platform Lambda functions.
+
+Embeddings are keyed by the SHA-256 of model, dimensions, normalization
+and text, so an identical text is only ever embedded once. Lookups go
+through an in-memory LRU per container and, when EMBEDDING_CACHE_TABLE
+is set, a DynamoDB tier shared by every function. Misses in a batch are
+embedded concurrently through common.bedrock. Texts longer than
+EMBEDDING_MAX_CHARS are never cut; they are chunked and pooled like a
+document (see embed_document).
+"""
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Union
+import boto3
+
+from common.bedrock import DEFAULT_EMBEDDING_MODEL, embed_text
+from common.chunking import iter_chunks
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+EMBEDDING_CACHE_TABLE = os.environ.get('EMBEDDING_CACHE_TABLE', '')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', '2048'))
+EMBEDDING_CACHE_TTL_DAYS = int(os.environ.get('EMBEDDING_CACHE_TTL_DAYS', '30'))
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', '8'))
+EMBEDDING_MAX_CHARS = int(os.environ.get('EMBEDDING_MAX_CHARS', '8000'))
+EMBEDDING_CHUNK_WINDOW = int(os.environ.get('EMBEDDING_CHUNK_WINDOW', '16'))
+MAX_STORED_CHUNKS = int(os.environ.get('MAX_STORED_CHUNKS', '64'))
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_dynamodb = None
+_stats = {'memoryHits': 0, 'sharedHits': 0, 'misses': 0}
+
+
+def embed(
+    text: str,
+    model_id: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: Optional[int] = None,
+    normalize: Optional[bool] = None
+) -> List[float]:
+    """Embedding for one text, served from cache when possible."""
+    return embed_many([text], model_id, dimensions, normalize)[0]
+
+
+def embed_many(
+    texts: List[str],
+    model_id: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: Optional[int] = None,
+    normalize: Optional[bool] = None
+) -> List[List[float]]:
+    """
+    Embeddings for a list of texts, in order.
+
+    Repeated texts within the list and texts already cached are not sent
+    to Bedrock; the remaining unique texts are embedded concurrently.
+    Texts longer than EMBEDDING_MAX_CHARS get the pooled, unit-length
+    vector of their chunks.
+    """
+    vectors = _embed_texts(
+        [text for text in texts if len(text) <= EMBEDDING_MAX_CHARS], model_id, dimensions, normalize
+    )
+    short = iter(vectors)
+    return [
+        next(short) if len(text) <= EMBEDDING_MAX_CHARS
+        else embed_document(text, model_id, dimensions)['embedding']
+        for text in texts
+    ]
+
+
+def embed_document(
+    source: Union[str, Iterable[str]],
+    model_id: str = DEFAULT_EMBEDDING_MODEL,
+    dimensions: Optional[int] = None,
+    keep_chunks: bool = False
+) -> Dict[str, Any]:
+    """
+    Embed a document of any length.
+
+    The document is chunked with overlap (see common.chunking) and chunks
+    are embedded EMBEDDING_CHUNK_WINDOW at a time, so only one window is
+    held in memory. The result always carries a pooled document vector,
+    the length-weighted mean of the normalized chunk vectors. With
+    keep_chunks, up to MAX_STORED_CHUNKS per-chunk vectors are returned
+    as well, for nested k-NN.
+
+    Returns {"embedding": [...], "chunks": [{"chunk_index", "embedding"}],
+    "chunkCount": n}.
+    """
+    pooled = None
+    chunks = []
+    chunk_count = 0
+
+    chunk_iter = iter_chunks(source)
+    while True:
+        window = list(islice(chunk_iter, EMBEDDING_CHUNK_WINDOW))
+        if not window:
+            break
+
+        for text, vector in zip(window, _embed_texts(window, model_id, dimensions, None)):
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            weight = len(text) / norm
+            if pooled is None:
+                pooled = [0.0] * len(vector)
+            for i, value in enumerate(vector):
+                pooled[i] += value * weight
+
+            if keep_chunks and len(chunks) < MAX_STORED_CHUNKS:
+                chunks.append({'chunk_index': chunk_count, 'embedding': vector})
+            chunk_count += 1
+
+    if pooled is None:
+        return {'embedding': [], 'chunks': [], 'chunkCount': 0}
+
+    norm = math.sqrt(sum(v * v for v in pooled)) or 1.0
+    return {
+        'embedding': [v / norm for v in pooled],
+        'chunks': chunks,
+        'chunkCount': chunk_count
+    }
+
+
+def cache_key(text: str, model_id: str, dimensions: Optional[int] = None, normalize: Optional[bool] = None) -> str:
+    """Content hash identifying an embedding."""
+    raw = f"{model_id}\x1f{dimensions or ''}\x1f{'' if normalize is None else int(normalize)}\x1f{text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_stats() -> Dict[str, int]:
+    """Cache hit and miss counts since the container started."""
+    with _memory_lock:
+        return dict(_stats)
+
+
+def _embed_texts(
+    texts: List[str],
+    model_id: str,
+    dimensions: Optional[int],
+    normalize: Optional[bool]
+) -> List[List[float]]:
+    if not texts:
+        return []
+    keys = [cache_key(text, model_id, dimensions, normalize) for text in texts]
+
+    found = _get_memory(keys)
+    missing = [k for k in dict.fromkeys(keys) if k not in found]
+
+    if missing:
+        shared = _get_shared(missing)
+        found.update(shared)
+        for key, vector in shared.items():
+            _put_memory(key, vector)
+
+    to_embed = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            to_embed.setdefault(key, text)
+
+    if to_embed:
+        with _memory_lock:
+            _stats['misses'] += len(to_embed)
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_CONCURRENCY, len(to_embed))) as executor:
+            vectors = list(executor.map(
+                lambda text: embed_text(text, model_id, dimensions=dimensions, normalize=normalize),
+                to_embed.values()
+            ))
+        computed = dict(zip(to_embed.keys(), vectors))
+        for key, vector in computed.items():
+            _put_memory(key, vector)
+        _put_shared(computed)
+        found.update(computed)
+
+    return [list(found[key]) for key in keys]
+
+
+def _get_memory(keys: List[str]) -> Dict[str, List[float]]:
+    found = {}
+    with _memory_lock:
+        for key in keys:
+            if key in _memory and key not in found:
+                _memory.move_to_end(key)
+                found[key] = _memory[key]
+                _stats['memoryHits'] += 1
+    return found
+
+
+def _put_memory(key: str, vector: List[float]):
+    with _memory_lock:
+        _memory[key] = vector
+        _memory.move_to_end(key)
+        while len(_memory) > EMBEDDING_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _get_dynamodb():
+    global _dynamodb
+    if _dynamodb is None and EMBEDDING_CACHE_TABLE:
+        _dynamodb = boto3.resource('dynamodb')
+    return _dynamodb
+
+
+def _get_shared(keys: List[str]) -> Dict[str, List[float]]:
+    dynamodb = _get_dynamodb()
+    if dynamodb is None:
+        return {}
+
+    found = {}
+    try:
+        for i in range(0, len(keys), 100):
+            request = {EMBEDDING_CACHE_TABLE: {
+                'Keys': [{'cacheKey': key} for key in keys[i:i + 100]],
+                'ProjectionExpression': 'cacheKey, embedding'
+            }}
+            while request:
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(EMBEDDING_CACHE_TABLE, []):
+                    found[item['cacheKey']] = _decode(item['embedding'])
+                request = response.get('UnprocessedKeys') or None
+                if request:
+                    time.sleep(0.05)
+    except Exception as e:
+        logger.warning(f"Embedding cache read failed: {e}")
+
+    with _memory_lock:
+        _stats['sharedHits'] += len(found)
+    return found
+
+
+def _put_shared(vectors: Dict[str, List[float]]):
+    dynamodb = _get_dynamodb()
+    if dynamodb is None or not vectors:
+        return
+
+    expires_at = int(time.time()) + EMBEDDING_CACHE_TTL_DAYS * 24 * 60 * 60
+    try:
+        with dynamodb.Table(EMBEDDING_CACHE_TABLE).batch_writer(overwrite_by_pkeys=['cacheKey']) as batch:
+            for key, vector in vectors.items():
+                batch.put_item(Item={
+                    'cacheKey': key,
+                    'embedding': _encode(vector),
+                    'expiresAt': expires_at
+                })
+    except Exception as e:
+        logger.warning(f"Embedding cache write failed: {e}")
+
+
+def _encode(vector: List[float]) -> bytes:
+    # float32 halves item size and is ample precision for similarity search
+    return array('f', vector).tobytes()
+
+
+def _decode(value) -> List[float]:
+    raw = value.value if hasattr(value, 'value') else bytes(value)
+    return array('f', raw).tolist()
@@ -0,0 +1,105 @@
+"""
+MinHash signatures for near-duplicate detection.
+
+Text is reduced to word shingles and summarized by a MinHash signature
+whose agreement rate estimates the Jaccard similarity of two documents.
+Signatures are split into LSH bands; documents sharing any band token
+are candidates, confirmed by comparing full signatures. Syndicated
+copies that differ only in boilerplate share most shingles and so land
+in the same buckets.
+"""
+import os
+import re
+import random
+import hashlib
+from typing import List
+
+MINHASH_PERMUTATIONS = int(os.environ.get('MINHASH_PERMUTATIONS', '64'))
+MINHASH_BANDS = int(os.environ.get('MINHASH_BANDS', '16'))
+SHINGLE_WORDS = int(os.environ.get('SHINGLE_WORDS', '5'))
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures must be comparable across containers and runs
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    """Hashed word n-grams of the normalized text."""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = (' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return {
+        int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=4).digest(), 'big')
+        for g in grams
+    }
+
+
+def signature(text: str) -> List[int]:
+    """MinHash signature of a text (empty for text without words)."""
+    hashed = shingles(text)
+    if not hashed:
+        return []
+    return [
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_tokens(sig: List[int]) -> List[str]:
+    """LSH band tokens for a signature, suitable for a keyword field."""
+    if not sig:
+        return []
+    rows = len(sig) // MINHASH_BANDS
+    return [
+        f"{band}:{hashlib.blake2b(str(sig[band * rows:(band + 1) * rows]).encode(), digest_size=8).hexdigest()}"
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def encode(sig: List[int]) -> str:
+    """Compact hex form of a signature for storage."""
+    return ''.join(f"{value:08x}" for value in sig)
+
+
+def decode(value: str) -> List[int]:
+    """Inverse of encode."""
+    return [int(value[i:i + 8], 16) for i in range(0, len(value or ''), 8)]
+
+
+class LshIndex:
+    """In-memory LSH buckets for near-duplicate checks within one run."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._signatures = {}
+
+    def match(self, scope: str, sig: List[int], threshold: float):
+        """(doc_id, similarity) of the closest added signature at or above threshold."""
+        best = None
+        candidates = {self._buckets.get((scope, token)) for token in band_tokens(sig)} - {None}
+        for doc_id in candidates:
+            score = similarity(sig, self._signatures[doc_id])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (doc_id, round(score, 3))
+        return best
+
+    def add(self, scope: str, doc_id: str, sig: List[int]):
+        """Make doc_id the bucket representative wherever none exists yet."""
+        self._signatures[doc_id] = sig
+        for token in band_tokens(sig):
+            self._buckets.setdefault((scope, token), doc_id)
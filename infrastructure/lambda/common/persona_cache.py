@@ -0,0 +1,79 @@
+"""
+Read-through persona cache for Brandpoint AI Platform Lambda functions.
+
+Personas are read on every workflow run but change rarely. Entries are
+held in memory per container and carry the persona's version, so a
+writer replaces or invalidates its own container's copy at once. Other
+containers are not told about writes: they serve their copy until it
+expires, so PERSONA_CACHE_TTL_SECONDS is the bound on how stale a
+persona read can be after an update or delete elsewhere.
+"""
+import os
+import copy
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Staleness bound across containers; keep it short
+PERSONA_CACHE_TTL_SECONDS = int(os.environ.get('PERSONA_CACHE_TTL_SECONDS', '15'))
+PERSONA_CACHE_MAX_ENTRIES = int(os.environ.get('PERSONA_CACHE_MAX_ENTRIES', '512'))
+
+
+def persona_version(persona: Dict[str, Any]) -> Tuple[int, str]:
+    """Orderable version used to key a cached persona."""
+    return (int(persona.get('version') or 0), persona.get('updatedAt', ''))
+
+
+class PersonaCache:
+    """Versioned read-through cache in front of the personas table."""
+
+    def __init__(self, table, ttl_seconds: int = PERSONA_CACHE_TTL_SECONDS,
+                 max_entries: int = PERSONA_CACHE_MAX_ENTRIES):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, persona_id: str) -> Optional[Dict[str, Any]]:
+        """Return the persona, or None if it does not exist."""
+        cached = self.get_cached(persona_id)
+        if cached is not None:
+            return cached
+
+        response = self.table.get_item(Key={'personaId': persona_id})
+        persona = response.get('Item')
+        if persona is None:
+            self._entries.pop(persona_id, None)
+            return None
+
+        self._put_local(persona_id, persona)
+        return copy.deepcopy(persona)
+
+    def get_cached(self, persona_id: str) -> Optional[Dict[str, Any]]:
+        """Return the persona only if a fresh in-memory copy exists."""
+        entry = self._entries.get(persona_id)
+        if entry and entry['expiresAt'] > time.monotonic():
+            return copy.deepcopy(entry['persona'])
+        return None
+
+    def put(self, persona: Dict[str, Any]):
+        """Write through a persona that was just stored."""
+        persona_id = persona['personaId']
+        entry = self._entries.get(persona_id)
+        if entry and entry['version'] > persona_version(persona):
+            # A newer version is already cached; never move backwards.
+            return
+        self._put_local(persona_id, persona)
+
+    def invalidate(self, persona_id: str):
+        """Drop a persona from this container's cache."""
+        self._entries.pop(persona_id, None)
+
+    def _put_local(self, persona_id: str, persona: Dict[str, Any]):
+        if persona_id not in self._entries and len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k]['expiresAt'])
+            self._entries.pop(oldest, None)
+        self._entries[persona_id] = {
+            'persona': copy.deepcopy(persona),
+            'version': persona_version(persona),
+            'expiresAt': time.monotonic() + self.ttl_seconds
+        }
@@ -0,0 +1,161 @@
+"""
+Streamed query runs for the persona agent workflow.
+
+A streamed run replaces the workflow's ExecuteQueriesMap: generate-queries
+sends each query to QUERY_STREAM_QUEUE_URL as soon as the model finishes
+it, execute-query-stream runs it across the engines, and the workflow
+waits on a task token until every query has results. Run state lives in
+QUERY_STREAM_TABLE under the execution id: a "run" item holding the task
+token, the number of queries once generation has finished and a count of
+completed queries, plus one "query#<index>" item per executed query.
+
+Whichever side sees the count reach the total sends the collected
+results back to the workflow, shaped like ExecuteQueriesMap output, so
+AnalyzeVisibility and StoreResults are unchanged. A duplicate SQS
+delivery is recorded once, because the query item and the count are
+written in one transaction conditioned on the item not existing.
+"""
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+QUERY_STREAM_TABLE = os.environ.get('QUERY_STREAM_TABLE', '')
+QUERY_STREAM_TTL_SECONDS = int(os.environ.get('QUERY_STREAM_TTL_SECONDS', str(24 * 60 * 60)))
+
+RUN_KEY = 'run'
+
+_dynamodb = None
+_stepfunctions = None
+
+
+def open_run(execution_id: str, task_token: str):
+    """Record a streamed run before its first query is sent."""
+    _get_table().put_item(Item={
+        'executionId': execution_id,
+        'itemKey': RUN_KEY,
+        'taskToken': task_token,
+        'completed': 0,
+        'expiresAt': int(time.time()) + QUERY_STREAM_TTL_SECONDS
+    })
+
+
+def close_run(execution_id: str, expected: int):
+    """Record how many queries the run produced, finishing it if all have results."""
+    run = _get_table().update_item(
+        Key={'executionId': execution_id, 'itemKey': RUN_KEY},
+        UpdateExpression='SET expected = :expected',
+        ExpressionAttributeValues={':expected': expected},
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+    _finish_if_complete(execution_id, run)
+
+
+def fail_run(task_token: str, error: str, cause: str):
+    """Fail the waiting workflow step."""
+    try:
+        _get_stepfunctions().send_task_failure(taskToken=task_token, error=error, cause=cause[:32768])
+    except ClientError as e:
+        logger.warning(f"Could not fail streamed run: {e}")
+
+
+def record_query(execution_id: str, query_index: int, result: Dict[str, Any]):
+    """Store one executed query's results and finish the run if it was the last."""
+    table = _get_table()
+    try:
+        table.meta.client.transact_write_items(TransactItems=[
+            {'Put': {
+                'TableName': QUERY_STREAM_TABLE,
+                'Item': {
+                    'executionId': {'S': execution_id},
+                    'itemKey': {'S': _query_key(query_index)},
+                    'result': {'S': json.dumps(result, default=str)},
+                    'expiresAt': {'N': str(int(time.time()) + QUERY_STREAM_TTL_SECONDS)}
+                },
+                'ConditionExpression': 'attribute_not_exists(itemKey)'
+            }},
+            {'Update': {
+                'TableName': QUERY_STREAM_TABLE,
+                'Key': {'executionId': {'S': execution_id}, 'itemKey': {'S': RUN_KEY}},
+                'UpdateExpression': 'ADD completed :one',
+                'ConditionExpression': 'attribute_exists(taskToken)',
+                'ExpressionAttributeValues': {':one': {'N': '1'}}
+            }}
+        ])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+        if reasons and reasons[0] == 'ConditionalCheckFailed':
+            logger.info(f"Query {query_index} of {execution_id} already recorded")
+            return
+        if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+            logger.warning(f"No streamed run {execution_id}; dropping query {query_index}")
+            return
+        raise
+
+    run = table.get_item(
+        Key={'executionId': execution_id, 'itemKey': RUN_KEY},
+        ConsistentRead=True
+    ).get('Item')
+    _finish_if_complete(execution_id, run)
+
+
+def collect_results(execution_id: str) -> List[Dict[str, Any]]:
+    """Executed queries of a run, in query order."""
+    query_kwargs = {
+        'KeyConditionExpression': Key('executionId').eq(execution_id) & Key('itemKey').begins_with('query#'),
+        'ConsistentRead': True
+    }
+    results = []
+    table = _get_table()
+    while True:
+        response = table.query(**query_kwargs)
+        results.extend(json.loads(item['result']) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return results
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _finish_if_complete(execution_id: str, run: Optional[Dict[str, Any]]):
+    if not run or 'expected' not in run or int(run.get('completed', 0)) < int(run['expected']):
+        return
+    try:
+        _get_stepfunctions().send_task_success(
+            taskToken=run['taskToken'],
+            output=json.dumps(collect_results(execution_id))
+        )
+        logger.info(f"Streamed run {execution_id} complete with {run['expected']} queries")
+    except ClientError as e:
+        # Both sides can see the final count; the second success is refused
+        if e.response['Error']['Code'] not in ('TaskTimedOut', 'InvalidToken', 'TaskDoesNotExist'):
+            raise
+        logger.info(f"Streamed run {execution_id} already finished: {e}")
+
+
+def _query_key(query_index: int) -> str:
+    # Zero-padded so the sort key orders queries numerically
+    return f"query#{query_index:05d}"
+
+
+def _get_table():
+    global _dynamodb
+    if not QUERY_STREAM_TABLE:
+        raise ValueError("QUERY_STREAM_TABLE is not configured")
+    if _dynamodb is None:
+        _dynamodb = boto3.resource('dynamodb')
+    return _dynamodb.Table(QUERY_STREAM_TABLE)
+
+
+def _get_stepfunctions():
+    global _stepfunctions
+    if _stepfunctions is None:
+        _stepfunctions = boto3.client('stepfunctions')
+    return _stepfunctions
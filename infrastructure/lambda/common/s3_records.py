@@ -0,0 +1,162 @@
+"""
+Streaming record reader for large S3 objects.
+
+Objects are read with ranged GETs of S3_RANGE_BYTES, so a file of any
+size is never held in memory. JSON-lines and CSV (header row required)
+are supported, optionally gzip-compressed; the format is taken from the
+key suffix unless given. Each record is yielded with the offset just
+past it, which a caller can store as a checkpoint and pass back as
+start_offset to resume. Uncompressed objects resume with a ranged GET
+starting at the offset (CSV re-reads only the header block first). For
+gzip objects the offset counts decompressed bytes, since a gzip stream
+cannot be entered mid-way; resuming decompresses and discards the bytes
+before the offset.
+"""
+import os
+import csv
+import json
+import zlib
+from typing import Any, Dict, Iterator, Optional, Tuple
+import boto3
+from botocore.exceptions import ClientError
+
+S3_RANGE_BYTES = int(os.environ.get('S3_RANGE_BYTES', str(8 * 1024 * 1024)))
+
+_s3 = None
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split s3://bucket/key into (bucket, key)."""
+    if not uri.startswith('s3://'):
+        raise ValueError("source must be an s3:// URI")
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    if not bucket or not key:
+        raise ValueError("source must name a bucket and key")
+    return bucket, key
+
+
+def detect_format(key: str) -> Tuple[str, bool]:
+    """(format, gzipped) from an object key such as data/posts.jsonl.gz."""
+    name = key.lower()
+    gzipped = name.endswith('.gz')
+    if gzipped:
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv', gzipped
+    return 'jsonl', gzipped
+
+
+def iter_records(
+    uri: str,
+    fmt: Optional[str] = None,
+    start_offset: int = 0,
+    range_bytes: int = S3_RANGE_BYTES
+) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """Yield (record, offset after record) from an S3 object."""
+    bucket, key = parse_s3_uri(uri)
+    detected, gzipped = detect_format(key)
+    fmt = fmt or detected
+    if fmt not in ('jsonl', 'csv'):
+        raise ValueError("format must be jsonl or csv")
+
+    # Offsets are line ends, so an uncompressed object can be entered there
+    resume_at = 0 if gzipped else start_offset
+    lines = _iter_lines(bucket, key, gzipped, range_bytes, resume_at)
+
+    if fmt == 'jsonl':
+        for line, end in lines:
+            if end <= start_offset or not line.strip():
+                continue
+            yield json.loads(line), end
+        return
+
+    # CSV: the header is always read, then rows before the checkpoint are skipped
+    header = None
+    header_lines = _iter_lines(bucket, key, gzipped, range_bytes) if resume_at else lines
+    for line, end in header_lines:
+        if line.strip():
+            header = next(csv.reader([line.decode('utf-8-sig')]))
+            break
+    if header is None:
+        return
+
+    ends = []
+
+    def text_lines():
+        for line, end in lines:
+            ends.append(end)
+            yield line.decode('utf-8')
+
+    # csv.reader pulls extra lines for quoted fields spanning lines, so
+    # the offset of a row is the end of the last line it consumed
+    for row in csv.reader(text_lines()):
+        end = ends[-1]
+        if end <= start_offset or not any(row):
+            continue
+        yield dict(zip(header, row)), end
+
+
+def _iter_lines(bucket: str, key: str, gzipped: bool, range_bytes: int,
+                position: int = 0) -> Iterator[Tuple[bytes, int]]:
+    """Yield (line, offset after line), offsets in (decompressed) bytes."""
+    buffer = b''
+    offset = position
+    for block in _iter_blocks(bucket, key, gzipped, range_bytes, position):
+        buffer += block
+        start = 0
+        while True:
+            newline = buffer.find(b'\n', start)
+            if newline < 0:
+                break
+            offset += newline + 1 - start
+            yield buffer[start:newline + 1], offset
+            start = newline + 1
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer, offset + len(buffer)
+
+
+def _iter_blocks(bucket: str, key: str, gzipped: bool, range_bytes: int,
+                 position: int = 0) -> Iterator[bytes]:
+    """Yield raw (or decompressed) blocks from byte position onwards; gzip starts at 0."""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if gzipped else None
+    while True:
+        try:
+            response = _get_s3().get_object(
+                Bucket=bucket,
+                Key=key,
+                Range=f"bytes={position}-{position + range_bytes - 1}"
+            )
+        except ClientError as e:
+            # Requesting a range past the end of the object
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                break
+            raise
+        block = response['Body'].read()
+        if not block:
+            break
+        position += len(block)
+        if decompressor:
+            data = decompressor.decompress(block)
+            # Concatenated gzip members, as written by many log shippers
+            while decompressor.eof and decompressor.unused_data:
+                rest = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                data += decompressor.decompress(rest)
+            yield data
+        else:
+            yield block
+        total = int(response.get('ContentRange', '').rpartition('/')[2] or 0)
+        if not total or position >= total:
+            break
+    if decompressor:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def _get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3')
+    return _s3
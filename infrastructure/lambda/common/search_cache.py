@@ -0,0 +1,179 @@
+"""
+Result cache for similarity search.
+
+Results are keyed by the normalized search request and the content
+generation, a counter ingestion bumps whenever a change to the indexed
+content becomes visible (a refresh after indexing, deletes, an alias
+swap). Bumping the generation retires every cached result at once. A
+container re-reads the generation at most every
+SEARCH_GENERATION_TTL_SECONDS, which bounds how long it can serve
+results from before an ingestion. get returns the generation it looked
+up and put stores under that one, so a result computed while the
+generation moved is filed under the older generation, never the newer.
+
+Entries are held in memory per container and, when SEARCH_CACHE_TABLE
+(default: the embedding cache table) is set, under "search:" keys in
+DynamoDB, shared by every container. Query embeddings themselves are
+cached by text hash in common.embeddings.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SEARCH_CACHE_ENABLED = os.environ.get('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+SEARCH_CACHE_TABLE = os.environ.get('SEARCH_CACHE_TABLE', os.environ.get('EMBEDDING_CACHE_TABLE', ''))
+SEARCH_CACHE_TTL_SECONDS = int(os.environ.get('SEARCH_CACHE_TTL_SECONDS', '300'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '512'))
+SEARCH_GENERATION_TTL_SECONDS = float(os.environ.get('SEARCH_GENERATION_TTL_SECONDS', '5'))
+# DynamoDB items are limited to 400 KB
+SEARCH_CACHE_MAX_ITEM_BYTES = 350 * 1024
+
+GENERATION_KEY = 'generation:content'
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_generation = {'value': 0, 'expiresAt': 0.0}
+_dynamodb = None
+_stats = {'memoryHits': 0, 'sharedHits': 0, 'misses': 0}
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Hash of a normalized search request."""
+    raw = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def current_generation() -> int:
+    """Content generation, re-read at most every SEARCH_GENERATION_TTL_SECONDS."""
+    if _generation['expiresAt'] > time.monotonic():
+        return _generation['value']
+
+    table = _get_table()
+    if table is not None:
+        try:
+            item = table.get_item(Key={'cacheKey': GENERATION_KEY}).get('Item') or {}
+            _generation['value'] = int(item.get('generation', 0))
+        except Exception as e:
+            logger.warning(f"Search cache generation read failed: {e}")
+    _generation['expiresAt'] = time.monotonic() + SEARCH_GENERATION_TTL_SECONDS
+    return _generation['value']
+
+
+def bump_generation() -> Optional[int]:
+    """Retire every cached result; called by writers once changes are visible."""
+    with _memory_lock:
+        _memory.clear()
+    _generation['expiresAt'] = 0.0
+
+    table = _get_table()
+    if table is None:
+        return None
+    try:
+        response = table.update_item(
+            Key={'cacheKey': GENERATION_KEY},
+            UpdateExpression='ADD generation :one',
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['generation'])
+    except Exception as e:
+        logger.warning(f"Search cache generation bump failed: {e}")
+        return None
+
+
+def get(request: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    (cached result or None, generation) for a request at the current
+    generation. Pass the generation to put when caching a miss.
+    """
+    if not SEARCH_CACHE_ENABLED:
+        return None, 0
+    generation = current_generation()
+    key = _entry_key(request, generation)
+
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry and entry[1] > time.monotonic():
+            _memory.move_to_end(key)
+            _stats['memoryHits'] += 1
+            return json.loads(entry[0]), generation
+
+    table = _get_table()
+    if table is not None:
+        try:
+            item = table.get_item(Key={'cacheKey': f"search:{key}"}).get('Item')
+            if item and int(item.get('expiresAt', 0)) > time.time():
+                _put_memory(key, item['result'])
+                with _memory_lock:
+                    _stats['sharedHits'] += 1
+                return json.loads(item['result']), generation
+        except Exception as e:
+            logger.warning(f"Search cache read failed: {e}")
+
+    with _memory_lock:
+        _stats['misses'] += 1
+    return None, generation
+
+
+def put(request: Dict[str, Any], result: Dict[str, Any], generation: int):
+    """Cache a result under the generation get returned before it was computed."""
+    if not SEARCH_CACHE_ENABLED:
+        return
+    key = _entry_key(request, generation)
+    value = json.dumps(result, default=_encode_value)
+    _put_memory(key, value)
+
+    table = _get_table()
+    if table is None or len(value) > SEARCH_CACHE_MAX_ITEM_BYTES:
+        return
+    try:
+        table.put_item(Item={
+            'cacheKey': f"search:{key}",
+            'result': value,
+            'expiresAt': int(time.time()) + SEARCH_CACHE_TTL_SECONDS
+        })
+    except Exception as e:
+        logger.warning(f"Search cache write failed: {e}")
+
+
+def get_stats() -> Dict[str, int]:
+    """Cache hit and miss counts since the container started."""
+    with _memory_lock:
+        return dict(_stats)
+
+
+def _entry_key(request: Dict[str, Any], generation: int) -> str:
+    return f"{generation}:{request_key(request)}"
+
+
+def _put_memory(key: str, value: str):
+    with _memory_lock:
+        _memory[key] = (value, time.monotonic() + SEARCH_CACHE_TTL_SECONDS)
+        _memory.move_to_end(key)
+        while len(_memory) > SEARCH_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _encode_value(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _get_table():
+    global _dynamodb
+    if not SEARCH_CACHE_TABLE:
+        return None
+    if _dynamodb is None:
+        _dynamodb = boto3.resource('dynamodb')
+    return _dynamodb.Table(SEARCH_CACHE_TABLE)
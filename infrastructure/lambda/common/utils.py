@@ -9,6 +9,7 @@ from decimal import Decimal
 from typing import Any, Dict, Optional
 import boto3
 from botocore.exceptions import ClientError
+from common import bedrock
 
 # Configure logging
 logger = logging.getLogger()
@@ -56,48 +57,12 @@ def invoke_bedrock(
     temperature: float = 0.7
 ) -> str:
     """Invoke a Bedrock model and return the response text."""
-    client = get_client('bedrock-runtime')
-
-    messages = [{"role": "user", "content": prompt}]
-
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": max_tokens,
-        "messages": messages,
-        "temperature": temperature
-    }
-
-    if system_prompt:
-        body["system"] = system_prompt
-
-    response = client.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
-
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text']
+    return bedrock.invoke_claude(model_id, prompt, system_prompt, max_tokens, temperature)
 
 
 def invoke_bedrock_embeddings(model_id: str, text: str) -> list:
     """Generate embeddings using Bedrock Titan."""
-    client = get_client('bedrock-runtime')
-
-    body = {
-        "inputText": text
-    }
-
-    response = client.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
-
-    response_body = json.loads(response['body'].read())
-    return response_body['embedding']
+    return bedrock.embed_text(text, model_id)
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -0,0 +1,204 @@
+"""
+Vector dimension and encoding for the content k-NN indices.
+
+A vector config is {"dimension", "encoding", "byteScale", "modelId",
+"engine", "spaceType"}; engine and spaceType default to faiss and
+innerproduct, and are only set for the family continuing a pre-_meta
+(nmslib, cosinesimil) index.
+Titan v2 embeds at 256, 512 or 1024 dimensions; encodings trade recall
+for native memory on the faiss engine:
+
+    fp32  4 bytes per dimension
+    fp16  2 bytes, scalar-quantized by faiss at index time
+    byte  1 byte, quantized here (value * byteScale, clipped to int8)
+    pq    product quantization from a trained k-NN model (modelId)
+
+Each index records its config in the mapping's _meta, so readers and
+writers follow the index they talk to rather than their environment.
+Every index behind the read alias shares one family's config, so all
+scores are on one scale; normalize_score maps it to the public scale,
+1 / (2 - cosine) in [1/3, 1], which is what the original nmslib
+cosinesimil indices reported.
+EMBEDDING_DIMENSIONS and VECTOR_ENCODING only set the config of newly
+created index families.
+"""
+import os
+import math
+from typing import Any, Dict, List, Optional
+
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '1024'))
+VECTOR_ENCODING = os.environ.get('VECTOR_ENCODING', 'fp32')
+# Titan v2 vectors are unit length with components well inside +-0.25
+VECTOR_BYTE_SCALE = float(os.environ.get('VECTOR_BYTE_SCALE', '512'))
+KNN_MODEL_ID = os.environ.get('KNN_MODEL_ID', '')
+
+HNSW_M = 24
+HNSW_EF_CONSTRUCTION = 128
+HNSW_EF_SEARCH = 100
+
+ENCODINGS = ('fp32', 'fp16', 'byte', 'pq')
+TITAN_DIMENSIONS = (256, 512, 1024)
+BYTES_PER_DIMENSION = {'fp32': 4, 'fp16': 2, 'byte': 1}
+# Engines that apply a filter inside the k-NN search
+FILTER_ENGINES = ('faiss', 'lucene')
+
+
+def default_config() -> Dict[str, Any]:
+    """Config for new index families, from the environment."""
+    return make_config(EMBEDDING_DIMENSIONS, VECTOR_ENCODING)
+
+
+def make_config(dimension: int, encoding: str, byte_scale: Optional[float] = None,
+                model_id: Optional[str] = None) -> Dict[str, Any]:
+    """Validated vector config."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+    if int(dimension) not in TITAN_DIMENSIONS:
+        raise ValueError(f"dimension must be one of {', '.join(map(str, TITAN_DIMENSIONS))}")
+    config = {'dimension': int(dimension), 'encoding': encoding}
+    if encoding == 'byte':
+        config['byteScale'] = float(byte_scale or VECTOR_BYTE_SCALE)
+    if encoding == 'pq':
+        config['modelId'] = model_id or KNN_MODEL_ID
+        if not config['modelId']:
+            raise ValueError("pq encoding needs a trained k-NN model (KNN_MODEL_ID)")
+    return config
+
+
+def config_from_mapping(mapping: Dict[str, Any]) -> Dict[str, Any]:
+    """Vector config of an index from its mapping."""
+    meta = mapping.get('_meta', {}).get('vector')
+    if meta:
+        return dict(meta)
+    # Indices created before _meta existed: fp32 with the mapped dimension,
+    # engine and space, so indices created to sit beside them score alike
+    field = mapping.get('properties', {}).get('embedding', {})
+    method = field.get('method', {})
+    return {
+        'dimension': int(field.get('dimension', 1536)),
+        'encoding': 'fp32',
+        'engine': method.get('engine', 'nmslib'),
+        'spaceType': method.get('space_type', 'cosinesimil')
+    }
+
+
+def knn_engine(mapping: Dict[str, Any]) -> str:
+    """k-NN engine behind an index's embedding field."""
+    meta = mapping.get('_meta', {}).get('vector')
+    if meta:
+        return meta.get('engine', 'faiss')
+    field = mapping.get('properties', {}).get('embedding', {})
+    return field.get('method', {}).get('engine', 'nmslib')
+
+
+def knn_vector_mapping(config: Dict[str, Any]) -> Dict[str, Any]:
+    """knn_vector field mapping for a config."""
+    if config['encoding'] == 'pq':
+        return {"type": "knn_vector", "model_id": config['modelId']}
+
+    if config.get('engine', 'faiss') != 'faiss':
+        # Continuing a pre-_meta family; ef_search is an index setting there
+        return {
+            "type": "knn_vector",
+            "dimension": config['dimension'],
+            "method": {
+                "name": "hnsw",
+                "engine": config['engine'],
+                "space_type": config.get('spaceType', 'cosinesimil'),
+                "parameters": {"ef_construction": HNSW_EF_CONSTRUCTION, "m": HNSW_M}
+            }
+        }
+
+    # Vectors are unit length, so inner product ranks as cosine does
+    method = {
+        "name": "hnsw",
+        "engine": "faiss",
+        "space_type": config.get('spaceType', 'innerproduct'),
+        "parameters": {
+            "ef_construction": HNSW_EF_CONSTRUCTION,
+            "ef_search": HNSW_EF_SEARCH,
+            "m": HNSW_M
+        }
+    }
+    field = {"type": "knn_vector", "dimension": config['dimension'], "method": method}
+    if config['encoding'] == 'fp16':
+        method['parameters']['encoder'] = {"name": "sq", "parameters": {"type": "fp16", "clip": True}}
+    elif config['encoding'] == 'byte':
+        field['data_type'] = 'byte'
+    return field
+
+
+def encode_vector(vector: List[float], config: Dict[str, Any]) -> List[float]:
+    """Vector as stored in (and queried against) an index with this config."""
+    if config.get('encoding') != 'byte' or not vector or all(isinstance(v, int) for v in vector):
+        return vector
+    scale = config['byteScale']
+    return [max(-128, min(127, round(v * scale))) for v in vector]
+
+
+def check_dimension(vector: List[float], config: Dict[str, Any]) -> List[float]:
+    """The vector, if it fits the index; otherwise a ValueError naming the fix."""
+    if vector and len(vector) != config['dimension']:
+        raise ValueError(
+            f"Embedding has {len(vector)} dimensions but the index expects {config['dimension']}; "
+            f"run a migrate-vectors job to re-embed the index at {len(vector)} dimensions"
+        )
+    return vector
+
+
+def exact_score_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Config describing scores of exact (knn_score script) search, which are 1 + cosine."""
+    return {**config, 'spaceType': 'exact'}
+
+
+def score_cosine(score: float, config: Dict[str, Any]) -> float:
+    """
+    Cosine similarity behind a score from an index with this config.
+
+    nmslib cosinesimil scores 1 / (2 - cosine); exact search scores
+    1 + cosine. Inner product over unit vectors scores 1 + product
+    (1 / (1 - product) when negative), and byte vectors scale the
+    product by byteScale^2.
+    """
+    if config.get('spaceType') == 'cosinesimil':
+        return 2 - 1 / score
+    if config.get('spaceType') == 'exact':
+        return score - 1
+    product = score - 1 if score >= 1 else 1 - 1 / score
+    if config.get('encoding') == 'byte':
+        product /= config['byteScale'] ** 2
+    return product
+
+
+def score_threshold(min_score: float, config: Dict[str, Any]) -> float:
+    """min_score on the index's scale for a threshold on the public 1 / (2 - cosine) scale."""
+    if min_score <= 1 / 3:
+        return 0.0
+    cosine = 2 - 1 / min(min_score, 1.0)
+    if config.get('spaceType') == 'cosinesimil':
+        return 1 / (2 - cosine)
+    if config.get('spaceType') == 'exact':
+        return 1 + cosine
+    product = cosine * config['byteScale'] ** 2 if config.get('encoding') == 'byte' else cosine
+    return product + 1 if product >= 0 else 1 / (1 - product)
+
+
+def normalize_score(score: float, config: Dict[str, Any]) -> float:
+    """Score on the public 1 / (2 - cosine) scale, whatever the index's encoding and space."""
+    cosine = max(-1.0, min(1.0, score_cosine(score, config)))
+    return 1 / (2 - cosine)
+
+
+def memory_bytes(num_vectors: int, config: Dict[str, Any], m: int = HNSW_M,
+                 pq_m: Optional[int] = None, pq_code_size: int = 8) -> int:
+    """
+    Estimated native memory of an HNSW graph, per the k-NN sizing guide.
+
+    pq_m defaults to dimension / 8 subquantizers for the pq encoding.
+    """
+    if config['encoding'] == 'pq':
+        pq_m = pq_m or config['dimension'] // 8
+        per_vector = (pq_code_size / 8) * pq_m + 24 + 8 * m
+    else:
+        per_vector = BYTES_PER_DIMENSION[config['encoding']] * config['dimension'] + 8 * m
+    return math.ceil(1.1 * per_vector * num_vectors)
@@ -6,24 +6,70 @@ and storing them in OpenSearch for vector similarity search.
 """
 import os
 import json
+import uuid
+import queue
 import logging
+import time
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
+from itertools import islice
 import boto3
-from opensearchpy import OpenSearch, RequestsHttpConnection
+from opensearchpy import OpenSearch, RequestsHttpConnection, ConflictError, helpers
 from requests_aws4auth import AWS4Auth
+from common import content_index, minhash, search_cache
+from common.content_index import OPENSEARCH_READ_ALIAS, OPENSEARCH_WRITE_ALIAS
+from common.embeddings import embed_document
+from common.s3_records import iter_records
+from common.vector_encoding import (
+    EMBEDDING_DIMENSIONS, HNSW_EF_SEARCH, TITAN_DIMENSIONS, VECTOR_ENCODING,
+    check_dimension, default_config, encode_vector, knn_vector_mapping, make_config
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Environment variables
 OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT', '')
-OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'content-embeddings')
 BEDROCK_EMBEDDING_MODEL = os.environ.get('BEDROCK_EMBEDDING_MODEL', 'amazon.titan-embed-text-v2:0')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+# pooled: one document vector; chunks: also store per-chunk vectors for nested k-NN
+EMBEDDING_MODE = os.environ.get('EMBEDDING_MODE', 'pooled')
+
+# Bulk mode
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', '200'))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get('BULK_MAX_CHUNK_BYTES', str(10 * 1024 * 1024)))
+BULK_THREAD_COUNT = int(os.environ.get('BULK_THREAD_COUNT', '4'))
+BULK_EMBED_CONCURRENCY = int(os.environ.get('BULK_EMBED_CONCURRENCY', '8'))
+BULK_REQUEST_TIMEOUT = int(os.environ.get('BULK_REQUEST_TIMEOUT', '120'))
+BULK_MAX_REPORTED_ERRORS = 20
+
+# Pipeline mode (streamed S3 objects with checkpoints)
+INGESTION_JOBS_TABLE = os.environ.get('INGESTION_JOBS_TABLE', '')
+PIPELINE_SEGMENT_SIZE = int(os.environ.get('PIPELINE_SEGMENT_SIZE', '500'))
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '2000'))
+# Stop and hand over to a fresh invocation with this much time left
+PIPELINE_RESERVE_MS = int(os.environ.get('PIPELINE_RESERVE_MS', '120000'))
+# Vector migrations re-read this far behind the cursor before swapping
+MIGRATION_CATCHUP_SECONDS = int(os.environ.get('MIGRATION_CATCHUP_SECONDS', '900'))
+
+# Near-duplicate detection (MinHash LSH, scoped per brand)
+NEAR_DUP_ENABLED = os.environ.get('NEAR_DUP_ENABLED', 'true').lower() == 'true'
+NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', '0.8'))
+NEAR_DUP_ACTION = os.environ.get('NEAR_DUP_ACTION', 'skip')  # skip | flag
+NEAR_DUP_CANDIDATES = int(os.environ.get('NEAR_DUP_CANDIDATES', '10'))
+
+NEAR_DUP_PROPERTIES = {
+    "minhash_bands": {"type": "keyword"},
+    "minhash_signature": {"type": "keyword", "index": False, "doc_values": False},
+    "near_duplicate_of": {"type": "keyword"}
+}
 
 # Clients
-bedrock = boto3.client('bedrock-runtime')
+dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
 credentials = boto3.Session().get_credentials()
 
 # OpenSearch client (lazy initialization)
@@ -57,53 +103,69 @@ def get_opensearch_client():
 
 
 def ensure_index_exists(client):
-    """Create index with k-NN mapping if it doesn't exist."""
-    if not client.indices.exists(index=OPENSEARCH_INDEX):
-        index_body = {
-            "settings": {
-                "index": {
-                    "knn": True,
-                    "knn.algo_param.ef_search": 100
-                },
-                "number_of_shards": 2,
-                "number_of_replicas": 1
-            },
-            "mappings": {
-                "properties": {
-                    "content_id": {"type": "keyword"},
-                    "content_hash": {"type": "keyword"},
-                    "content_type": {"type": "keyword"},
-                    "brand_id": {"type": "keyword"},
-                    "client_id": {"type": "keyword"},
-                    "title": {"type": "text"},
-                    "content": {"type": "text"},
-                    "content_preview": {"type": "text"},
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": 1536,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "cosinesimil",
-                            "engine": "nmslib",
-                            "parameters": {
-                                "ef_construction": 128,
-                                "m": 24
-                            }
-                        }
-                    },
-                    "source_url": {"type": "keyword"},
-                    "author": {"type": "keyword"},
-                    "published_date": {"type": "date"},
-                    "ingested_at": {"type": "date"},
-                    "metadata": {"type": "object", "enabled": False},
-                    "sentiment_score": {"type": "float"},
-                    "word_count": {"type": "integer"},
-                    "tags": {"type": "keyword"}
-                }
+    """Create the first index and its aliases if they don't exist."""
+    if content_index.bootstrap(client, index_body):
+        upgrade_mappings(client)
+
+
+def upgrade_mappings(client):
+    """Add fields introduced since older indices were created."""
+    properties = dict(NEAR_DUP_PROPERTIES)
+    if EMBEDDING_MODE == 'chunks':
+        properties['chunks'] = chunks_mapping(content_index.vector_config(client))
+    client.indices.put_mapping(index=OPENSEARCH_READ_ALIAS, body={"properties": properties})
+
+
+def index_body(shards: int, config: dict = None) -> dict:
+    """Settings and k-NN mapping for a new content index."""
+    config = config or default_config()
+    knn_settings = {"knn": True}
+    if config.get('engine', 'faiss') == 'nmslib':
+        # nmslib takes ef_search as an index setting rather than a method parameter
+        knn_settings["knn.algo_param.ef_search"] = HNSW_EF_SEARCH
+    return {
+        "settings": {
+            "index": knn_settings,
+            "number_of_shards": shards,
+            "number_of_replicas": 1
+        },
+        "mappings": {
+            "_meta": {"vector": config},
+            "properties": {
+                "content_id": {"type": "keyword"},
+                "content_hash": {"type": "keyword"},
+                "content_type": {"type": "keyword"},
+                "brand_id": {"type": "keyword"},
+                "client_id": {"type": "keyword"},
+                "title": {"type": "text"},
+                "content": {"type": "text"},
+                "content_preview": {"type": "text"},
+                "embedding": knn_vector_mapping(config),
+                "chunks": chunks_mapping(config),
+                "source_url": {"type": "keyword"},
+                "author": {"type": "keyword"},
+                "published_date": {"type": "date"},
+                "ingested_at": {"type": "date"},
+                "metadata": {"type": "object", "enabled": False},
+                "sentiment_score": {"type": "float"},
+                "word_count": {"type": "integer"},
+                "chunk_count": {"type": "integer"},
+                "tags": {"type": "keyword"},
+                **NEAR_DUP_PROPERTIES
             }
         }
-        client.indices.create(index=OPENSEARCH_INDEX, body=index_body)
-        logger.info(f"Created index: {OPENSEARCH_INDEX}")
+    }
+
+
+def chunks_mapping(config: dict) -> dict:
+    """Nested per-chunk vectors, searched with a nested knn query."""
+    return {
+        "type": "nested",
+        "properties": {
+            "chunk_index": {"type": "integer"},
+            "embedding": knn_vector_mapping(config)
+        }
+    }
 
 
 def handler(event, context):
@@ -128,32 +190,72 @@ def handler(event, context):
         {
             "contentId": "...",
             "indexed": true,
-            "embedding_dimensions": 1536
+            "embedding_dimensions": 1024
         }
+
+    Bulk mode input (one of):
+        {"mode": "bulk", "documents": [{...}, {...}]}
+        {"mode": "bulk", "manifest": "s3://bucket/key.jsonl"}
+
+    Bulk mode output:
+        {
+            "indexed": 980,
+            "duplicates": 12,
+            "nearDuplicates": 30,
+            "failed": 20,
+            "errors": [...],
+            "elapsedSeconds": 41.2,
+            "docsPerSecond": 23.8
+        }
+
+    Pipeline mode input (streams a large S3 object with checkpoints):
+        {
+            "mode": "pipeline",
+            "source": "s3://bucket/key.jsonl|.csv|.jsonl.gz|.csv.gz",
+            "jobId": "optional; an existing job resumes",
+            "embedWorkers": 8,
+            "indexWorkers": 4
+        }
+
+    Pipeline mode output:
+        {"jobId": "...", "status": "running|complete|failed", "offset": 123456,
+         "indexed": 980, "duplicates": 12, "nearDuplicates": 30, "failed": 2, ...}
+
+    Near-duplicate scan of the existing index:
+        {"mode": "near-dup-scan", "action": "report|flag|delete", "brandId": "optional"}
+
+    Index lifecycle (scheduled; see common.content_index):
+        {"mode": "lifecycle", "forceRollover": false}
+
+    Vector migration to a new dimension or encoding (see common.vector_encoding):
+        {"mode": "migrate-vectors", "dimensions": 256|512|1024,
+         "encoding": "fp32|fp16|byte|pq", "swap": true, "jobId": "optional"}
+
+    Content whose MinHash similarity to earlier content of the same brand
+    reaches NEAR_DUP_THRESHOLD is skipped before embedding, or indexed
+    with near_duplicate_of set when NEAR_DUP_ACTION=flag.
     """
-    content = event.get('content', '')
-    content_type = event.get('contentType', 'article')
-    title = event.get('title', '')
-    brand_id = event.get('brandId', '')
-    client_id = event.get('clientId', '')
-    source_url = event.get('sourceUrl', '')
-    author = event.get('author', '')
-    published_date = event.get('publishedDate')
-    metadata = event.get('metadata', {})
-    tags = event.get('tags', [])
+    if event.get('mode') == 'bulk':
+        return bulk_ingest(event)
+    if event.get('mode') == 'pipeline':
+        return pipeline_ingest(event, context)
+    if event.get('mode') == 'migrate-vectors':
+        return migrate_vectors(event, context)
+    if event.get('mode') == 'lifecycle':
+        return manage_indices(event.get('forceRollover', False))
+    if event.get('mode') == 'near-dup-scan':
+        return scan_near_duplicates(event.get('action', 'report'), event.get('brandId'))
 
+    content = event.get('content', '')
     if not content:
         raise ValueError("content is required")
 
-    logger.info(f"Ingesting {content_type} content for brand: {brand_id}")
+    logger.info(f"Ingesting {event.get('contentType', 'article')} content for brand: {event.get('brandId', '')}")
 
-    # Generate content hash for deduplication
-    content_hash = hashlib.sha256(content.encode()).hexdigest()
-    content_id = f"{brand_id}#{content_hash[:16]}"
-
-    # Check for duplicates
+    content_hash, content_id = content_identity(event)
     client = get_opensearch_client()
-    if check_duplicate(client, content_hash):
+
+    if sealed_ids(client, [content_id]):
         logger.info(f"Duplicate content detected: {content_id}")
         return {
             'contentId': content_id,
@@ -162,89 +264,877 @@ def handler(event, context):
             'message': 'Content already exists'
         }
 
-    # Generate embedding
-    embedding = generate_embedding(content)
+    sig = minhash.signature(content) if NEAR_DUP_ENABLED else []
+    near = find_near_duplicate(client, sig, event.get('brandId', ''), content_id)
+    if near and NEAR_DUP_ACTION == 'skip':
+        logger.info(f"Near-duplicate content detected: {content_id} ~ {near[0]} ({near[1]:.2f})")
+        return {
+            'contentId': content_id,
+            'indexed': False,
+            'nearDuplicate': True,
+            'duplicateOf': near[0],
+            'similarity': near[1],
+            'message': 'Near-duplicate of existing content'
+        }
+
+    document = build_document(event, content_hash, content_id, sig, near[0] if near else None)
+
+    # The id derives from the content hash, so a create that conflicts
+    # means the content is already indexed. This is a single round trip
+    # and, unlike a search, does not depend on the index having refreshed.
+    try:
+        response = client.create(
+            index=OPENSEARCH_WRITE_ALIAS,
+            id=content_id,
+            body=document,
+            refresh=True
+        )
+    except ConflictError:
+        logger.info(f"Duplicate content detected: {content_id}")
+        return {
+            'contentId': content_id,
+            'indexed': False,
+            'duplicate': True,
+            'message': 'Content already exists'
+        }
+
+    logger.info(f"Indexed content: {content_id}, result: {response['result']}")
+    # Indexed with refresh, so it is already searchable
+    search_cache.bump_generation()
+
+    return {
+        'contentId': content_id,
+        'indexed': True,
+        'embeddingDimensions': len(document['embedding']),
+        'chunkCount': document['chunk_count'],
+        'wordCount': document['word_count'],
+        'sentimentScore': document['sentiment_score']
+    }
 
-    # Calculate basic features
-    word_count = len(content.split())
-    sentiment_score = calculate_basic_sentiment(content)
 
-    # Prepare document
+def manage_indices(force_rollover: bool = False) -> dict:
+    """Roll the write index over when due and force-merge sealed indices."""
+    client = get_opensearch_client()
+    upgrade_mappings(client)
+    rollover = content_index.rollover(client, index_body, force=force_rollover)
+    merged = content_index.merge_sealed(client)
+    write_index, read_indices = content_index.get_layout(client, refresh=True)
+
+    logger.info(f"Index lifecycle: write index {write_index}, {len(read_indices)} indices, merged {merged}")
+
+    return {
+        'rollover': rollover,
+        'merged': merged,
+        'writeIndex': write_index,
+        'readIndices': read_indices
+    }
+
+
+def content_identity(item: dict) -> tuple:
+    """Return (content_hash, content_id) for a content item."""
+    content_hash = hashlib.sha256(item['content'].encode()).hexdigest()
+    return content_hash, f"{item.get('brandId', '')}#{content_hash[:16]}"
+
+
+def build_document(item: dict, content_hash: str, content_id: str,
+                   sig: list = None, near_duplicate_of: str = None) -> dict:
+    """Embed a content item and build its OpenSearch document."""
+    content = item['content']
+
+    # Generate embedding
+    embedded = generate_embedding(content)
+
     document = {
         'content_id': content_id,
         'content_hash': content_hash,
-        'content_type': content_type,
-        'brand_id': brand_id,
-        'client_id': client_id,
-        'title': title,
+        'content_type': item.get('contentType', 'article'),
+        'brand_id': item.get('brandId', ''),
+        'client_id': item.get('clientId', ''),
+        'title': item.get('title', ''),
         'content': content,
         'content_preview': content[:500] if len(content) > 500 else content,
-        'embedding': embedding,
-        'source_url': source_url,
-        'author': author,
-        'published_date': published_date,
+        'embedding': embedded['embedding'],
+        'chunk_count': embedded['chunkCount'],
+        'source_url': item.get('sourceUrl', ''),
+        'author': item.get('author', ''),
+        'published_date': item.get('publishedDate'),
         'ingested_at': datetime.utcnow().isoformat(),
-        'metadata': metadata,
-        'sentiment_score': sentiment_score,
-        'word_count': word_count,
-        'tags': tags
+        'metadata': item.get('metadata', {}),
+        'sentiment_score': calculate_basic_sentiment(content),
+        'word_count': len(content.split()),
+        'tags': item.get('tags', [])
     }
+    if embedded['chunks']:
+        document['chunks'] = embedded['chunks']
+    if sig:
+        document['minhash_signature'] = minhash.encode(sig)
+        document['minhash_bands'] = minhash.band_tokens(sig)
+    if near_duplicate_of:
+        document['near_duplicate_of'] = near_duplicate_of
+    return document
 
-    # Index document
-    response = client.index(
-        index=OPENSEARCH_INDEX,
-        id=content_id,
-        body=document,
-        refresh=True
-    )
 
-    logger.info(f"Indexed content: {content_id}, result: {response['result']}")
+def near_duplicate_query(sig: list, brand_id: str, exclude_id: str) -> dict:
+    """Search for same-brand documents sharing LSH bands, most bands first."""
+    return {
+        "size": NEAR_DUP_CANDIDATES,
+        "_source": ["content_id", "minhash_signature"],
+        "query": {
+            "bool": {
+                "should": [
+                    {"constant_score": {"filter": {"term": {"minhash_bands": token}}}}
+                    for token in minhash.band_tokens(sig)
+                ],
+                "minimum_should_match": 1,
+                "filter": [{"term": {"brand_id": brand_id}}],
+                "must_not": [{"ids": {"values": [exclude_id]}}]
+            }
+        }
+    }
+
+
+def best_near_duplicate(sig: list, hits: list):
+    """(content_id, similarity) of the closest candidate at or above threshold."""
+    best = None
+    for hit in hits:
+        score = minhash.similarity(sig, minhash.decode(hit['_source'].get('minhash_signature', '')))
+        if score >= NEAR_DUP_THRESHOLD and (best is None or score > best[1]):
+            best = (hit['_id'], round(score, 3))
+    return best
+
+
+def find_near_duplicate(client, sig: list, brand_id: str, content_id: str):
+    """Closest indexed near-duplicate of a signature, or None."""
+    if not sig:
+        return None
+    try:
+        response = client.search(index=OPENSEARCH_READ_ALIAS, body=near_duplicate_query(sig, brand_id, content_id))
+        return best_near_duplicate(sig, response['hits']['hits'])
+    except Exception as e:
+        logger.warning(f"Near-duplicate lookup failed: {e}")
+        return None
+
+
+def find_near_duplicates(client, entries: list) -> dict:
+    """Indexed near-duplicates for (content_id, brand_id, sig) entries, one msearch."""
+    entries = [entry for entry in entries if entry[2]]
+    if not entries:
+        return {}
+
+    body = []
+    for content_id, brand_id, sig in entries:
+        body.append({"index": OPENSEARCH_READ_ALIAS})
+        body.append(near_duplicate_query(sig, brand_id, content_id))
+
+    found = {}
+    try:
+        responses = client.msearch(body=body)['responses']
+        for (content_id, _, sig), response in zip(entries, responses):
+            near = best_near_duplicate(sig, response.get('hits', {}).get('hits', []))
+            if near:
+                found[content_id] = near
+    except Exception as e:
+        logger.warning(f"Near-duplicate lookup failed: {e}")
+    return found
+
+
+def scan_near_duplicates(action: str = 'report', brand_id: str = None) -> dict:
+    """
+    Find near-duplicates already in the index.
+
+    Documents are scanned oldest first; each is compared through in-memory
+    LSH buckets with earlier documents of the same brand, so the first
+    ingested copy is kept as the original. Documents indexed before
+    signatures existed get one computed and written back. action=flag sets
+    near_duplicate_of on duplicates, action=delete removes them.
+    """
+    if action not in ('report', 'flag', 'delete'):
+        raise ValueError("action must be report, flag or delete")
+
+    client = get_opensearch_client()
+    started = time.monotonic()
+    query = {
+        "query": {"term": {"brand_id": brand_id}} if brand_id else {"match_all": {}},
+        "_source": ["content_id", "brand_id", "content", "minhash_signature"],
+        "sort": [{"ingested_at": "asc"}]
+    }
+
+    lsh = minhash.LshIndex()
+    pairs = []
+    scanned = 0
+    backfilled = 0
+    pending = []
+
+    def flush():
+        if pending:
+            helpers.bulk(client, pending, raise_on_error=False, request_timeout=BULK_REQUEST_TIMEOUT)
+            pending.clear()
+
+    for hit in helpers.scan(client, index=OPENSEARCH_READ_ALIAS, query=query, preserve_order=True, size=500):
+        scanned += 1
+        source = hit['_source']
+        doc_id = hit['_id']
+        brand = source.get('brand_id', '')
+
+        sig = minhash.decode(source.get('minhash_signature', ''))
+        if not sig:
+            sig = minhash.signature(source.get('content', ''))
+            if not sig:
+                continue
+            pending.append({
+                '_op_type': 'update', '_index': hit['_index'], '_id': doc_id,
+                'doc': {'minhash_signature': minhash.encode(sig), 'minhash_bands': minhash.band_tokens(sig)}
+            })
+            backfilled += 1
+
+        match = lsh.match(brand, sig, NEAR_DUP_THRESHOLD)
+        if match:
+            pairs.append({'contentId': doc_id, 'duplicateOf': match[0], 'similarity': match[1]})
+            if action == 'flag':
+                pending.append({
+                    '_op_type': 'update', '_index': hit['_index'], '_id': doc_id,
+                    'doc': {'near_duplicate_of': match[0]}
+                })
+            elif action == 'delete':
+                pending.append({'_op_type': 'delete', '_index': hit['_index'], '_id': doc_id})
+        else:
+            # Only originals act as bucket representatives
+            lsh.add(brand, doc_id, sig)
+
+        if len(pending) >= BULK_CHUNK_SIZE:
+            flush()
+
+    flush()
+    if action != 'report' and pairs:
+        search_cache.bump_generation()
+    elapsed = time.monotonic() - started
+
+    logger.info(f"Near-duplicate scan: {scanned} scanned, {len(pairs)} near-duplicates, "
+                f"{backfilled} signatures backfilled in {elapsed:.1f}s")
 
     return {
-        'contentId': content_id,
-        'indexed': True,
-        'embeddingDimensions': len(embedding),
-        'wordCount': word_count,
-        'sentimentScore': sentiment_score
+        'action': action,
+        'scanned': scanned,
+        'nearDuplicates': len(pairs),
+        'backfilled': backfilled,
+        'pairs': pairs[:100],
+        'elapsedSeconds': round(elapsed, 1)
     }
 
 
-def check_duplicate(client, content_hash: str) -> bool:
-    """Check if content already exists."""
+def bulk_ingest(event: dict) -> dict:
+    """
+    Backfill many documents through the _bulk API.
+
+    Documents are read lazily (from the event or an S3 JSON-lines or CSV
+    manifest), embedded BULK_EMBED_CONCURRENCY at a time and written with
+    parallel_bulk. Index refresh is disabled for the duration of the
+    backfill and restored afterwards. Document ids derive from the
+    content hash; content already indexed (checked per batch with mget)
+    or repeated within the run is skipped before embedding, and writes
+    use op_type=create so a concurrent writer's copy is never replaced.
+    """
+    if event.get('manifest'):
+        items = read_manifest(event['manifest'])
+    elif event.get('documents') is not None:
+        items = iter(event['documents'])
+    else:
+        raise ValueError("documents or manifest is required")
+
+    client = get_opensearch_client()
+    started = time.monotonic()
+    errors = []
+    rejected = []
+    duplicates = []
+    near_duplicates = []
+
+    refresh_state = disable_refresh(client)
     try:
-        query = {
-            "query": {
-                "term": {"content_hash": content_hash}
-            }
+        indexed = index_actions(
+            client,
+            generate_bulk_actions(client, items, rejected, duplicates, near_duplicates),
+            duplicates,
+            errors
+        )
+    finally:
+        restore_refresh(client, refresh_state)
+
+    errors = rejected + errors
+    elapsed = time.monotonic() - started
+    docs_per_second = round(indexed / elapsed, 1) if elapsed else 0.0
+
+    logger.info(f"Bulk ingested {indexed} documents ({len(duplicates)} duplicates, "
+                f"{len(near_duplicates)} near-duplicates, "
+                f"{len(errors)} failed) in {elapsed:.1f}s, "
+                f"{docs_per_second} docs/sec")
+
+    return {
+        'indexed': indexed,
+        'duplicates': len(duplicates),
+        'nearDuplicates': len(near_duplicates),
+        'failed': len(errors),
+        'errors': errors[:BULK_MAX_REPORTED_ERRORS],
+        'elapsedSeconds': round(elapsed, 1),
+        'docsPerSecond': docs_per_second
+    }
+
+
+def pipeline_ingest(event: dict, context) -> dict:
+    """
+    Ingest a large JSON-lines or CSV object (optionally gzip) from S3.
+
+    The stages run concurrently with bounded hand-offs: a reader thread
+    parses records from ranged GETs into a queue of PIPELINE_QUEUE_SIZE;
+    each segment of PIPELINE_SEGMENT_SIZE records is deduplicated,
+    embedded by embedWorkers threads and written by indexWorkers bulk
+    threads. Once a segment is fully written its end offset is stored in
+    the jobs table, so invoking again with the same jobId (including
+    Lambda's own async retries) resumes after the last complete segment.
+    Records of a partly written segment are re-read on resume and
+    rejected as duplicates by the create. When the invocation nears its
+    timeout the job hands over to a fresh asynchronous invocation.
+    """
+    if not INGESTION_JOBS_TABLE:
+        raise ValueError("INGESTION_JOBS_TABLE is required for pipeline mode")
+
+    source = event.get('source', '')
+    job_id = event.get('jobId') or str(uuid.uuid4())
+    embed_workers = int(event.get('embedWorkers') or BULK_EMBED_CONCURRENCY)
+    index_workers = int(event.get('indexWorkers') or BULK_THREAD_COUNT)
+
+    job = load_job(job_id)
+    if job and job.get('status') == 'complete':
+        return job_summary(job)
+    if not job:
+        if not source:
+            raise ValueError("source is required")
+        job = {
+            'jobId': job_id,
+            'source': source,
+            'format': event.get('format', ''),
+            'status': 'running',
+            'offset': 0,
+            'indexed': 0,
+            'duplicates': 0,
+            'nearDuplicates': 0,
+            'failed': 0,
+            'errors': [],
+            'startedAt': datetime.utcnow().isoformat() + 'Z'
         }
-        response = client.search(index=OPENSEARCH_INDEX, body=query, size=1)
-        return response['hits']['total']['value'] > 0
+    job['status'] = 'running'
+    save_job(job)
+
+    logger.info(f"Pipeline {job_id}: reading {job['source']} from offset {job['offset']}")
+
+    records = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=read_records,
+        args=(job['source'], job.get('format') or None, int(job['offset']), records, stop),
+        daemon=True
+    )
+    reader.start()
+
+    client = get_opensearch_client()
+    started = time.monotonic()
+    seen = set()
+    lsh = minhash.LshIndex()
+    finished = False
+
+    refresh_state = disable_refresh(client)
+    try:
+        while True:
+            segment = take_segment(records)
+            if not segment:
+                finished = True
+                break
+
+            errors = []
+            rejected = []
+            duplicates = []
+            near_duplicates = []
+            indexed = index_actions(
+                client,
+                generate_bulk_actions(
+                    client, iter([record for record, _ in segment]), rejected, duplicates,
+                    near_duplicates, seen, lsh, embed_workers
+                ),
+                duplicates,
+                errors,
+                index_workers
+            )
+
+            errors = rejected + errors
+            job['offset'] = segment[-1][1]
+            job['indexed'] += indexed
+            job['duplicates'] += len(duplicates)
+            job['nearDuplicates'] += len(near_duplicates)
+            job['failed'] += len(errors)
+            job['errors'] = (job['errors'] + [json.dumps(e, default=str)[:1000] for e in errors])[-BULK_MAX_REPORTED_ERRORS:]
+            save_job(job)
+
+            if context and context.get_remaining_time_in_millis() < PIPELINE_RESERVE_MS:
+                break
     except Exception as e:
-        logger.warning(f"Error checking duplicate: {e}")
-        return False
+        job['status'] = 'failed'
+        job['errors'] = (job['errors'] + [str(e)[:1000]])[-BULK_MAX_REPORTED_ERRORS:]
+        save_job(job)
+        raise
+    finally:
+        stop.set()
+        restore_refresh(client, refresh_state)
+
+    elapsed = time.monotonic() - started
+    if finished:
+        job['status'] = 'complete'
+        job['completedAt'] = datetime.utcnow().isoformat() + 'Z'
+        save_job(job)
+    else:
+        continue_job(context, {
+            'mode': 'pipeline',
+            'jobId': job_id,
+            'embedWorkers': embed_workers,
+            'indexWorkers': index_workers
+        })
+
+    logger.info(f"Pipeline {job_id}: {job['status']} at offset {job['offset']}, "
+                f"{job['indexed']} indexed in total, {elapsed:.1f}s this invocation")
 
+    result = job_summary(job)
+    result['elapsedSeconds'] = round(elapsed, 1)
+    return result
 
-def generate_embedding(content: str) -> list:
-    """Generate embedding using Bedrock Titan."""
-    max_chars = 8000
-    truncated_content = content[:max_chars] if len(content) > max_chars else content
 
+def read_records(source: str, fmt: str, offset: int, records: queue.Queue, stop: threading.Event):
+    """Reader stage: parse records into the queue, then a None sentinel."""
     try:
-        body = {"inputText": truncated_content}
+        for item in iter_records(source, fmt, offset):
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        records.put(None)
+    except Exception as e:
+        records.put(e)
+
+
+def take_segment(records: queue.Queue) -> list:
+    """Next segment of (record, offset) pairs; empty once the source is exhausted."""
+    segment = []
+    while len(segment) < PIPELINE_SEGMENT_SIZE:
+        item = records.get()
+        if item is None:
+            records.put(None)
+            break
+        if isinstance(item, Exception):
+            raise item
+        segment.append(item)
+    return segment
+
+
+def continue_job(context, payload: dict):
+    """Hand the rest of a job to a fresh asynchronous invocation."""
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(payload)
+    )
+
+
+def load_job(job_id: str) -> dict:
+    """Stored job record, or None."""
+    item = dynamodb.Table(INGESTION_JOBS_TABLE).get_item(Key={'jobId': job_id}).get('Item')
+    if item:
+        for name, value in item.items():
+            if isinstance(value, Decimal):
+                item[name] = int(value)
+        item.setdefault('errors', [])
+    return item
+
+
+def save_job(job: dict):
+    """Store the job record (the checkpoint)."""
+    job['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+    dynamodb.Table(INGESTION_JOBS_TABLE).put_item(Item=job)
+
+
+def job_summary(job: dict) -> dict:
+    return {
+        'jobId': job['jobId'],
+        'status': job['status'],
+        'source': job['source'],
+        'offset': job['offset'],
+        'indexed': job['indexed'],
+        'duplicates': job['duplicates'],
+        'nearDuplicates': job['nearDuplicates'],
+        'failed': job['failed'],
+        'errors': job['errors']
+    }
 
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_EMBEDDING_MODEL,
-            body=json.dumps(body),
-            contentType="application/json",
-            accept="application/json"
+
+def migrate_vectors(event: dict, context) -> dict:
+    """
+    Move the content indices to a new vector dimension or encoding.
+
+    A new index family is created with the target config, outside both
+    aliases, and documents are copied into it from the read alias in
+    ingested_at order, one checkpointed page at a time. Stored vectors
+    are reused when the dimension is unchanged; otherwise the content is
+    re-embedded at the target dimension. Ingestion and search continue
+    against the old family meanwhile. Once a pass finds nothing new, a
+    last pass rewinds MIGRATION_CATCHUP_SECONDS to pick up documents that
+    were not yet refreshed, and then both aliases swap to the new family
+    in one atomic update. The old indices stay in place for rollback.
+    Readers and writers pick up the new config within
+    INDEX_LAYOUT_TTL_SECONDS.
+    """
+    if not INGESTION_JOBS_TABLE:
+        raise ValueError("INGESTION_JOBS_TABLE is required for migrate-vectors mode")
+
+    client = get_opensearch_client()
+    job = load_job(event['jobId']) if event.get('jobId') else None
+    if job and job.get('status') == 'complete':
+        return migration_summary(job)
+
+    if not job:
+        config = make_config(
+            event.get('dimensions') or EMBEDDING_DIMENSIONS,
+            event.get('encoding') or VECTOR_ENCODING,
+            event.get('byteScale'),
+            event.get('modelId')
         )
+        target = content_index.new_family_index(config)
+        client.indices.create(index=target, body=index_body(content_index.next_shard_count(client), config))
+        client.indices.put_settings(index=target, body={'index': {'refresh_interval': '-1'}})
+        job = {
+            'jobId': event.get('jobId') or f"migrate-{target}",
+            'target': target,
+            'vectorConfig': json.dumps(config),
+            'status': 'running',
+            'cursor': '',
+            'caughtUp': False,
+            'migrated': 0,
+            'reembedded': 0,
+            'failed': 0,
+            'errors': [],
+            'startedAt': datetime.utcnow().isoformat() + 'Z'
+        }
+        save_job(job)
+        logger.info(f"Migrating {OPENSEARCH_READ_ALIAS} to {target} ({config})")
+
+    if 'swap' in event:
+        job['swap'] = bool(event['swap'])
+    config = json.loads(job['vectorConfig'])
+    source_config = content_index.vector_config(client)
+    # cosinesimil indices may hold vectors that are not unit length, which
+    # innerproduct would rank differently, so those are re-embedded
+    reuse = (
+        source_config['dimension'] == config['dimension']
+        and source_config['encoding'] != 'byte'
+        and source_config.get('spaceType', 'innerproduct') == 'innerproduct'
+    )
+    started = time.monotonic()
+
+    def convert(hit):
+        source = hit['_source']
+        try:
+            if not (reuse and source.get('embedding')):
+                embedded = embed_document(
+                    source.get('content', ''),
+                    BEDROCK_EMBEDDING_MODEL,
+                    dimensions=config['dimension'],
+                    keep_chunks=EMBEDDING_MODE == 'chunks'
+                )
+                source['embedding'] = embedded['embedding']
+                source['chunk_count'] = embedded['chunkCount']
+                source['chunks'] = embedded['chunks']
+            source['embedding'] = encode_vector(source['embedding'], config)
+            for chunk in source.get('chunks') or []:
+                chunk['embedding'] = encode_vector(chunk['embedding'], config)
+            if not source.get('chunks'):
+                source.pop('chunks', None)
+        except Exception as e:
+            return None, {'contentId': hit['_id'], 'error': str(e)}
+        return {'_op_type': 'index', '_index': job['target'], '_id': hit['_id'], '_source': source}, None
+
+    with ThreadPoolExecutor(max_workers=BULK_EMBED_CONCURRENCY) as executor:
+        while True:
+            body = {
+                "size": PIPELINE_SEGMENT_SIZE,
+                "query": {"match_all": {}},
+                "sort": [{"ingested_at": "asc"}, {"content_id": "asc"}]
+            }
+            if not reuse:
+                body["_source"] = {"excludes": ["embedding", "chunks"]}
+            if job['cursor']:
+                body["search_after"] = json.loads(job['cursor'])
+            hits = client.search(index=OPENSEARCH_READ_ALIAS, body=body)['hits']['hits']
 
-        response_body = json.loads(response['body'].read())
-        return response_body.get('embedding', [0.0] * 1536)
+            if not hits:
+                if job['caughtUp']:
+                    break
+                # Rewind once for documents that were not yet searchable on the first pass
+                if job['cursor']:
+                    last = json.loads(job['cursor'])
+                    job['cursor'] = json.dumps([last[0] - MIGRATION_CATCHUP_SECONDS * 1000, ''])
+                job['caughtUp'] = True
+                save_job(job)
+                continue
+
+            errors = []
+            actions = []
+            for action, error in executor.map(convert, hits):
+                if action:
+                    actions.append(action)
+                else:
+                    errors.append(error)
+            migrated = index_actions(client, iter(actions), [], errors)
+
+            job['cursor'] = json.dumps(hits[-1]['sort'])
+            job['migrated'] += migrated
+            job['reembedded'] += 0 if reuse else migrated
+            job['failed'] += len(errors)
+            job['errors'] = (job['errors'] + [json.dumps(e, default=str)[:1000] for e in errors])[-BULK_MAX_REPORTED_ERRORS:]
+            save_job(job)
+
+            if context and context.get_remaining_time_in_millis() < PIPELINE_RESERVE_MS:
+                continue_job(context, {'mode': 'migrate-vectors', 'jobId': job['jobId']})
+                return migration_summary(job)
+
+    if job.get('swap', True):
+        restore_refresh(client, (job['target'], None))
+        job['retired'] = content_index.swap_family(client, job['target'])
+        search_cache.bump_generation()
+        job['status'] = 'complete'
+        job['completedAt'] = datetime.utcnow().isoformat() + 'Z'
+    else:
+        # Backfilled; invoke again with "swap": true to cut over
+        job['status'] = 'ready'
+    save_job(job)
+
+    logger.info(f"Migration {job['jobId']}: {job['status']}, {job['migrated']} documents "
+                f"in {time.monotonic() - started:.1f}s this invocation")
+    return migration_summary(job)
+
+
+def migration_summary(job: dict) -> dict:
+    return {
+        'jobId': job['jobId'],
+        'status': job['status'],
+        'target': job['target'],
+        'vectorConfig': json.loads(job['vectorConfig']),
+        'migrated': job['migrated'],
+        'reembedded': job['reembedded'],
+        'failed': job['failed'],
+        'errors': job['errors'],
+        'retired': job.get('retired', [])
+    }
+
+
+def index_actions(client, actions, duplicates: list, errors: list,
+                  index_workers: int = BULK_THREAD_COUNT) -> int:
+    """Write actions with parallel_bulk; returns the number indexed."""
+    indexed = 0
+    results = helpers.parallel_bulk(
+        client,
+        actions,
+        thread_count=index_workers,
+        chunk_size=BULK_CHUNK_SIZE,
+        max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+        raise_on_error=False,
+        raise_on_exception=False,
+        request_timeout=BULK_REQUEST_TIMEOUT
+    )
+    for ok, info in results:
+        if ok:
+            indexed += 1
+        elif info.get('create', {}).get('status') == 409:
+            duplicates.append(info['create'].get('_id'))
+        else:
+            errors.append(info)
+    return indexed
+
+
+def generate_bulk_actions(client, items, rejected: list, duplicates: list, near_duplicates: list,
+                          seen: set = None, lsh: minhash.LshIndex = None,
+                          embed_workers: int = BULK_EMBED_CONCURRENCY):
+    """
+    Yield create actions, embedding new documents in concurrent batches.
+
+    seen and lsh carry run state across calls when one run is fed in
+    several parts.
+    """
+    seen = set() if seen is None else seen
+    # LSH buckets for this run; refresh is off, so the index cannot see them
+    lsh = minhash.LshIndex() if lsh is None else lsh
+
+    with ThreadPoolExecutor(max_workers=embed_workers) as executor:
+        while True:
+            batch = list(islice(items, embed_workers * 4))
+            if not batch:
+                return
+
+            # Identify each item and drop repeats within this run
+            pending = []
+            for item in batch:
+                if not item.get('content'):
+                    rejected.append({'sourceUrl': item.get('sourceUrl', ''), 'error': 'content is required'})
+                    continue
+                content_hash, content_id = content_identity(item)
+                if content_id in seen:
+                    duplicates.append(content_id)
+                    continue
+                seen.add(content_id)
+                pending.append((item, content_hash, content_id))
+
+            # Skip content already in the index before paying to embed it
+            existing = existing_ids(client, [content_id for _, _, content_id in pending])
+            duplicates.extend(content_id for _, _, content_id in pending if content_id in existing)
+            pending = [p for p in pending if p[2] not in existing]
+
+            # Near-duplicates of indexed content or of earlier documents in this run
+            sigs = {
+                content_id: minhash.signature(item['content']) if NEAR_DUP_ENABLED else []
+                for item, _, content_id in pending
+            }
+            near = find_near_duplicates(
+                client, [(content_id, item.get('brandId', ''), sigs[content_id]) for item, _, content_id in pending]
+            )
+            kept = []
+            for item, content_hash, content_id in pending:
+                sig = sigs[content_id]
+                brand = item.get('brandId', '')
+                match = near.get(content_id) or (lsh.match(brand, sig, NEAR_DUP_THRESHOLD) if sig else None)
+                if match:
+                    near_duplicates.append({'contentId': content_id, 'duplicateOf': match[0], 'similarity': match[1]})
+                    if NEAR_DUP_ACTION == 'skip':
+                        continue
+                elif sig:
+                    lsh.add(brand, content_id, sig)
+                kept.append((item, content_hash, content_id, sig, match[0] if match else None))
+            pending = kept
+
+            def prepare(entry):
+                item, content_hash, content_id, sig, near_duplicate_of = entry
+                try:
+                    return content_id, build_document(item, content_hash, content_id, sig, near_duplicate_of)
+                except Exception as e:
+                    rejected.append({'contentId': content_id, 'error': str(e)})
+                    return None
+
+            for prepared in executor.map(prepare, pending):
+                if prepared:
+                    content_id, document = prepared
+                    yield {
+                        '_op_type': 'create',
+                        '_index': OPENSEARCH_WRITE_ALIAS,
+                        '_id': content_id,
+                        '_source': document
+                    }
+
+
+def read_manifest(uri: str):
+    """Stream content items from an S3 JSON-lines or CSV manifest."""
+    for record, _ in iter_records(uri):
+        yield record
+
+
+def disable_refresh(client) -> tuple:
+    """
+    Turn off refresh on the write index for a backfill.
+
+    Returns (index, previous setting). The concrete index is kept so the
+    setting is restored on it even if the alias rolls over meanwhile.
+    """
+    settings = client.indices.get_settings(index=OPENSEARCH_WRITE_ALIAS, name='index.refresh_interval')
+    index, previous = None, None
+    for index, index_settings in settings.items():
+        previous = index_settings.get('settings', {}).get('index', {}).get('refresh_interval')
+    if previous == '-1':
+        # Left over from an interrupted or concurrent backfill; restore the default
+        previous = None
+    client.indices.put_settings(index=index, body={'index': {'refresh_interval': '-1'}})
+    return index, previous
+
+
+def restore_refresh(client, state: tuple):
+    """Restore the refresh interval (None resets the default) and refresh."""
+    index, previous = state
+    try:
+        client.indices.put_settings(index=index, body={'index': {'refresh_interval': previous}})
+        client.indices.refresh(index=index)
+    except Exception as e:
+        logger.error(f"Failed to restore refresh_interval on {index}: {e}")
+    # Whatever was indexed is visible now (or on the next scheduled refresh)
+    search_cache.bump_generation()
+
+
+def existing_ids(client, content_ids: list) -> set:
+    """Ids among content_ids already in any content index."""
+    if not content_ids:
+        return set()
+    found = set()
+    try:
+        # mget sees unrefreshed documents, but only through a single index
+        response = client.mget(index=OPENSEARCH_WRITE_ALIAS, body={'ids': content_ids}, _source=False)
+        found = {doc['_id'] for doc in response.get('docs', []) if doc.get('found')}
+    except Exception as e:
+        # Creates still reject duplicates; this only saves embedding work
+        logger.warning(f"Error checking existing ids: {e}")
+    return found | sealed_ids(client, [i for i in content_ids if i not in found])
+
+
+def sealed_ids(client, content_ids: list) -> set:
+    """
+    Ids among content_ids in rolled-over indices.
+
+    A create only conflicts within the write index, so content first
+    indexed before a rollover is found here. Sealed indices take no
+    writes, so an ids search sees all of their documents.
+    """
+    sealed = content_index.sealed_indices(client)
+    if not content_ids or not sealed:
+        return set()
+    try:
+        response = client.search(index=','.join(sealed), body={
+            "size": len(content_ids),
+            "query": {"ids": {"values": content_ids}},
+            "_source": False
+        })
+        return {hit['_id'] for hit in response['hits']['hits']}
+    except Exception as e:
+        logger.warning(f"Error checking sealed indices: {e}")
+        return set()
+
+
+def generate_embedding(content: str, config: dict = None) -> dict:
+    """
+    Generate chunked document embeddings using Bedrock Titan, encoded for the index.
+
+    Errors are raised rather than indexing a placeholder vector, which
+    would match every query equally; bulk and pipeline modes count the
+    item as failed.
+    """
+    config = config or content_index.vector_config(get_opensearch_client(), write=True)
+    try:
+        embedded = embed_document(
+            content,
+            BEDROCK_EMBEDDING_MODEL,
+            dimensions=config['dimension'] if config['dimension'] in TITAN_DIMENSIONS else None,
+            keep_chunks=EMBEDDING_MODE == 'chunks'
+        )
+        embedded['embedding'] = encode_vector(check_dimension(embedded['embedding'], config), config)
+        for chunk in embedded['chunks']:
+            chunk['embedding'] = encode_vector(chunk['embedding'], config)
+        return embedded
 
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
-        return [0.0] * 1536
+        raise
 
 
 def calculate_basic_sentiment(content: str) -> float:
@@ -0,0 +1,101 @@
+"""
+Execute Query Stream Lambda Function
+
+Consumes queries streamed by generate-queries, runs each against every
+engine's execute-query function in parallel and records the results for
+the waiting workflow (see common/query_stream.py).
+"""
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from common.query_stream import record_query
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables
+ENGINE_FUNCTION_PREFIX = os.environ.get('ENGINE_FUNCTION_PREFIX', '')
+STREAM_ENGINES = [e for e in os.environ.get(
+    'STREAM_ENGINES', 'chatgpt,perplexity,gemini,claude'
+).split(',') if e]
+
+# Clients
+lambda_client = boto3.client('lambda')
+
+
+def handler(event, context):
+    """
+    Execute streamed queries from the query stream queue.
+
+    Input (SQS event, one record per query):
+        {
+            "Records": [
+                {
+                    "messageId": "...",
+                    "body": "{\"executionId\": \"...\", \"queryIndex\": 0, \"query\": \"...\", \"persona\": {...}}"
+                }
+            ]
+        }
+
+    Output:
+        {
+            "batchItemFailures": [{"itemIdentifier": "..."}]
+        }
+
+    Each query is recorded as the ExecuteQueriesMap item it replaces:
+        {
+            "query": "...",
+            "persona": {...},
+            "executionId": "...",
+            "engineResults": [{"engine": "chatgpt", "response": {...}}, ...]
+        }
+    """
+    failures = []
+
+    for record in event.get('Records', []):
+        try:
+            execute_message(json.loads(record['body']))
+        except Exception as e:
+            logger.error(f"Error executing streamed query {record.get('messageId')}: {e}")
+            failures.append({'itemIdentifier': record['messageId']})
+
+    return {'batchItemFailures': failures}
+
+
+def execute_message(message: dict):
+    """Run one streamed query on every engine and record the results."""
+    execution_id = message['executionId']
+    query_index = int(message['queryIndex'])
+    payload = {'query': message['query'], 'persona': message.get('persona', {})}
+
+    logger.info(f"Executing streamed query {query_index} of {execution_id}")
+
+    with ThreadPoolExecutor(max_workers=len(STREAM_ENGINES)) as executor:
+        responses = list(executor.map(lambda engine: invoke_engine(engine, payload), STREAM_ENGINES))
+
+    record_query(execution_id, query_index, {
+        'query': payload['query'],
+        'persona': payload['persona'],
+        'executionId': execution_id,
+        'engineResults': [
+            {'engine': engine, 'response': response}
+            for engine, response in zip(STREAM_ENGINES, responses)
+        ]
+    })
+
+
+def invoke_engine(engine: str, payload: dict) -> dict:
+    """Invoke one engine's execute-query function."""
+    response = lambda_client.invoke(
+        FunctionName=f"{ENGINE_FUNCTION_PREFIX}{engine}",
+        InvocationType='RequestResponse',
+        Payload=json.dumps(payload)
+    )
+    result = json.loads(response['Payload'].read())
+    # An unhandled error fails the message so SQS retries it, as the
+    # workflow's engine task would have failed the execution
+    if response.get('FunctionError'):
+        raise RuntimeError(f"{engine} failed: {result.get('errorMessage', result)}")
+    return result
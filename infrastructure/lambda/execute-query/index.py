@@ -11,6 +11,7 @@ import time
 import boto3
 import requests
 from botocore.exceptions import ClientError
+from common.bedrock import invoke_claude
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -22,7 +23,6 @@ BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-5-sonn
 
 # Clients
 secrets_client = boto3.client('secretsmanager')
-bedrock_client = boto3.client('bedrock-runtime')
 
 # Cache for API keys
 _api_key_cache = {}
@@ -216,21 +216,4 @@ def execute_gemini(query: str) -> str:
 
 def execute_claude(query: str) -> str:
     """Execute query against Claude via AWS Bedrock."""
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 2048,
-        "temperature": 0.7,
-        "messages": [
-            {"role": "user", "content": query}
-        ]
-    }
-
-    response = bedrock_client.invoke_model(
-        modelId=BEDROCK_MODEL_ID,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
-
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text']
+    return invoke_claude(BEDROCK_MODEL_ID, query, max_tokens=2048, temperature=0.7)
@@ -5,11 +5,10 @@ Extracts features from content for ML model inference.
 Used by the Intelligence Engine for content analysis.
 """
 import os
-import json
 import logging
 import re
 from datetime import datetime
-import boto3
+from common.embeddings import embed_document
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,9 +16,6 @@ logger.setLevel(logging.INFO)
 # Environment variables
 BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'amazon.titan-embed-text-v2:0')
 
-# Clients
-bedrock = boto3.client('bedrock-runtime')
-
 
 def handler(event, context):
     """
@@ -144,24 +140,8 @@ def extract_content_metrics(content: str, content_type: str) -> dict:
 
 def generate_embedding(content: str) -> list:
     """Generate embedding vector using Bedrock Titan."""
-    # Truncate content if too long (Titan has input limits)
-    max_chars = 8000
-    truncated_content = content[:max_chars] if len(content) > max_chars else content
-
     try:
-        body = {
-            "inputText": truncated_content
-        }
-
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps(body),
-            contentType="application/json",
-            accept="application/json"
-        )
-
-        response_body = json.loads(response['body'].read())
-        embedding = response_body.get('embedding', [])
+        embedding = embed_document(content, BEDROCK_MODEL_ID)['embedding']
 
         logger.info(f"Generated embedding with {len(embedding)} dimensions")
         return embedding
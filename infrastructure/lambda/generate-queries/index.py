@@ -5,9 +5,23 @@ Uses Bedrock Claude to generate persona-specific search queries
 that simulate how real users would query AI assistants.
 """
 import os
+import re
 import json
+import math
+import time
+import zlib
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from string import Template
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from common.bedrock import build_claude_body, invoke_model, invoke_model_stream
+from common.active_personas import load_active_personas
+from common.embeddings import embed_many
+from common.query_stream import open_run, close_run, fail_run
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -15,8 +29,89 @@ logger.setLevel(logging.INFO)
 # Environment variables
 BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-5-sonnet-20241022-v2:0')
 
-# Bedrock client
-bedrock = boto3.client('bedrock-runtime')
+# Batch mode: several personas are packed into one prompt
+BATCH_PERSONAS_PER_PROMPT = int(os.environ.get('BATCH_PERSONAS_PER_PROMPT', '5'))
+BATCH_PROMPT_TOKEN_BUDGET = int(os.environ.get('BATCH_PROMPT_TOKEN_BUDGET', '6000'))
+BATCH_MAX_OUTPUT_TOKENS = int(os.environ.get('BATCH_MAX_OUTPUT_TOKENS', '4096'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+TOKENS_PER_QUERY = 40  # generous output estimate per generated query
+
+# Query bank: precomputed panel (stable) and pool (rotating) queries
+QUERY_BANK_TABLE = os.environ.get('QUERY_BANK_TABLE', '')
+PERSONAS_TABLE = os.environ.get('PERSONAS_TABLE', '')
+BANK_PANEL_SIZE = int(os.environ.get('BANK_PANEL_SIZE', '3'))
+BANK_POOL_SIZE = int(os.environ.get('BANK_POOL_SIZE', '20'))
+BANK_PANEL_PER_RUN = int(os.environ.get('BANK_PANEL_PER_RUN', '2'))
+BANK_MAX_AGE_DAYS = int(os.environ.get('BANK_MAX_AGE_DAYS', '14'))
+BANK_ROTATION_SECONDS = int(os.environ.get('BANK_ROTATION_SECONDS', str(24 * 60 * 60)))
+PRECOMPUTE_CHUNK_SIZE = int(os.environ.get('PRECOMPUTE_CHUNK_SIZE', '10'))
+PRECOMPUTE_RESERVE_MS = int(os.environ.get('PRECOMPUTE_RESERVE_MS', '120000'))  # room for one more chunk
+
+# Semantic dedup of generated queries
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_EMBEDDER = os.environ.get('DEDUP_EMBEDDER', 'bedrock')  # bedrock | local
+DEDUP_EMBEDDING_MODEL = os.environ.get('DEDUP_EMBEDDING_MODEL', 'amazon.titan-embed-text-v2:0')
+DEDUP_EMBEDDING_DIMENSIONS = int(os.environ.get('DEDUP_EMBEDDING_DIMENSIONS', '256'))
+DEDUP_SIMILARITY_THRESHOLD = float(os.environ.get('DEDUP_SIMILARITY_THRESHOLD', '0.9'))
+DEDUP_HISTORY_RUNS = int(os.environ.get('DEDUP_HISTORY_RUNS', '3'))
+ENGINES_PER_QUERY = int(os.environ.get('ENGINES_PER_QUERY', '4'))  # parallel engine branches per query
+HASHING_DIMENSIONS = 2 ** 12
+QUERY_RESULTS_TABLE = os.environ.get('QUERY_RESULTS_TABLE', '')
+
+# Streaming generation: queries are handed to execute-query-stream as each
+# line completes (see common/query_stream.py)
+QUERY_STREAM_QUEUE_URL = os.environ.get('QUERY_STREAM_QUEUE_URL', '')
+RESULTS_PERSONA_INDEX = os.environ.get('RESULTS_PERSONA_INDEX', 'personaId-executedAt-index')
+
+# Prompt caching: compiled prompts per persona version, and Bedrock
+# cache_control on the stable system prompt for models that support it,
+# once it reaches the model's minimum cacheable length
+PROMPT_CACHE_MAX_ENTRIES = int(os.environ.get('PROMPT_CACHE_MAX_ENTRIES', '256'))
+PROMPT_CACHING_MODELS = [m for m in os.environ.get(
+    'PROMPT_CACHING_MODELS',
+    'claude-3-5-sonnet-20241022-v2,claude-3-5-haiku,claude-3-7-sonnet,claude-sonnet-4,claude-opus-4'
+).split(',') if m]
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get('PROMPT_CACHE_MIN_TOKENS', '1024'))
+
+# Clients
+sqs = boto3.client('sqs')
+lambda_client = boto3.client('lambda')
+dynamodb = boto3.resource('dynamodb')
+
+# Compiled prompts keyed by (personaId, persona version, query count)
+prompt_cache = OrderedDict()
+prompt_caching_supported = any(m in BEDROCK_MODEL_ID for m in PROMPT_CACHING_MODELS)
+
+SYSTEM_PROMPT_TEMPLATE = Template("""You are simulating a $age_min-$age_max year old $gender who is searching for information.
+
+Character traits:
+- Education: $education
+- Location: $location
+- Interests: $interests
+- Concerns: $concerns
+
+Speaking style: $speaking_style
+Patterns to use: $typical_questions
+Patterns to AVOID: $avoided_patterns
+
+Generate search queries exactly as this person would type them into an AI assistant like ChatGPT or Perplexity.
+Be authentic - use their natural language patterns, including casual phrasing, slang if appropriate, and realistic typos or abbreviations they might use.""")
+
+QUERY_PROMPT_TEMPLATE = Template("""Generate exactly $query_count search queries that this persona would naturally type into an AI assistant.
+
+$topic_context
+
+Requirements:
+1. Each query should sound authentic to this persona's voice and concerns
+2. Queries should be the kind someone would actually type, not formal questions
+3. Include a mix of question types (how-to, comparison, opinion-seeking, factual)
+4. Do NOT use formal or corporate language
+5. Do NOT include numbering or explanations - just the raw queries
+$examples
+
+Output one JSON object per line and nothing else, for example:
+{"query": "first query"}
+{"query": "second query"}""")
 
 
 def handler(event, context):
@@ -40,7 +135,54 @@ def handler(event, context):
             "personaId": "...",
             "generatedAt": "..."
         }
+
+    Batch mode input:
+        {
+            "personas": [{...}, {...}],
+            "queryCount": 5
+        }
+
+    Batch mode output:
+        {
+            "results": [{"personaId": "...", "queries": [...], ...}],
+            "personaCount": 2,
+            "fallbackCount": 0,
+            "duplicatesDropped": 3,
+            "generatedAt": "..."
+        }
+
+    Query bank refill (scheduled):
+        {
+            "mode": "precompute",
+            "personas": [...],  # Optional, defaults to all active personas
+            "cursor": "..."     # Set on continuations: last personaId refilled
+        }
+
+    When QUERY_BANK_TABLE is configured, single-persona requests are
+    served from the bank unless it is missing or stale, or the request
+    sets "fresh": true.
+
+    Streamed generation (workflow task token):
+        {
+            "persona": {...},
+            "queryCount": 5,
+            "stream": true,
+            "executionId": "arn:aws:states:...",
+            "taskToken": "..."
+        }
+
+    A streamed request always generates live. Each accepted query is sent
+    to QUERY_STREAM_QUEUE_URL as soon as its line completes, so engine
+    calls start while the model is still generating, and the workflow
+    resumes once execute-query-stream has recorded every query. The
+    function output is the same as a live request with "streamed": true.
     """
+    if event.get('mode') == 'precompute':
+        return precompute_query_bank(event.get('personas'), event.get('cursor'), context)
+
+    if 'personas' in event:
+        return generate_batch(event.get('personas') or [], event.get('queryCount', 5))
+
     logger.info(f"Generating queries for persona: {event.get('persona', {}).get('personaId')}")
 
     persona = event.get('persona', {})
@@ -48,32 +190,460 @@ def handler(event, context):
 
     if not persona:
         raise ValueError("persona is required")
+    streamed = bool(event.get('stream'))
+    if streamed:
+        if not QUERY_STREAM_QUEUE_URL:
+            raise ValueError("stream requires QUERY_STREAM_QUEUE_URL to be configured")
+        if not event.get('executionId') or not event.get('taskToken'):
+            raise ValueError("stream requires executionId and taskToken")
+        return generate_streamed(persona, query_count, event['executionId'], event['taskToken'])
+
+    if QUERY_BANK_TABLE and not event.get('fresh'):
+        banked = draw_from_bank(persona, query_count)
+        if banked:
+            return banked
 
     # Build the prompt
-    prompt = build_query_generation_prompt(persona, query_count)
-    system_prompt = build_system_prompt(persona)
+    system_prompt, prompt = get_prompts(persona, query_count)
 
     try:
+        history = load_recent_queries(persona.get('personaId'))
+
         # Invoke Bedrock Claude
         response = invoke_claude(system_prompt, prompt)
 
         # Parse the generated queries
-        queries = parse_queries(response)
+        dedup = dedupe_queries(parse_queries(response), history)
 
-        logger.info(f"Generated {len(queries)} queries for persona {persona.get('personaId')}")
+        logger.info(f"Generated {len(dedup['queries'])} queries for persona {persona.get('personaId')}")
 
-        return {
-            'queries': queries,
-            'personaId': persona.get('personaId'),
-            'queryCount': len(queries),
-            'generatedAt': get_timestamp()
-        }
+        return build_generation_result(persona, dedup, streamed=False)
 
     except Exception as e:
         logger.error(f"Error generating queries: {e}")
         raise
 
 
+def generate_streamed(persona: dict, query_count: int, execution_id: str, task_token: str) -> dict:
+    """
+    Generate queries live, sending each to the stream queue as it completes.
+
+    The run is opened before the first query is sent and closed with the
+    final count afterwards; a failure fails the waiting workflow step.
+    """
+    open_run(execution_id, task_token)
+    try:
+        system_prompt, prompt = get_prompts(persona, query_count)
+        history = load_recent_queries(persona.get('personaId'))
+        dedup = stream_queries(
+            system_prompt, prompt, history,
+            on_query=build_queue_emitter(persona, execution_id)
+        )
+        close_run(execution_id, len(dedup['queries']))
+    except Exception as e:
+        logger.error(f"Error streaming queries: {e}")
+        fail_run(task_token, 'QueryGenerationFailed', str(e))
+        raise
+
+    logger.info(f"Streamed {len(dedup['queries'])} queries for persona {persona.get('personaId')}")
+
+    return build_generation_result(persona, dedup, streamed=True)
+
+
+def build_generation_result(persona: dict, dedup: dict, streamed: bool) -> dict:
+    queries = dedup['queries']
+    return {
+        'queries': queries,
+        'personaId': persona.get('personaId'),
+        'queryCount': len(queries),
+        'source': 'generated',
+        'streamed': streamed,
+        'duplicatesDropped': dedup['dropped'],
+        'engineCallsAvoided': dedup['dropped'] * ENGINES_PER_QUERY,
+        'generatedAt': get_timestamp()
+    }
+
+
+def draw_from_bank(persona: dict, query_count: int) -> dict:
+    """
+    Serve a run's queries from the persona's query bank.
+
+    Each run takes up to BANK_PANEL_PER_RUN panel queries, which stay the
+    same run over run so results are comparable, and fills the rest from
+    the pool. The pool window advances every BANK_ROTATION_SECONDS.
+    Returns None if the bank is missing, was built for another persona
+    version, or is older than BANK_MAX_AGE_DAYS. If the bank holds too
+    few queries, the remainder is generated live.
+    """
+    persona_id = persona.get('personaId')
+    try:
+        item = dynamodb.Table(QUERY_BANK_TABLE).get_item(Key={'personaId': persona_id}).get('Item')
+    except Exception as e:
+        logger.warning(f"Query bank lookup failed for {persona_id}: {e}")
+        return None
+
+    if not item:
+        return None
+    if item.get('personaVersion') != bank_version(persona):
+        logger.info(f"Query bank for {persona_id} is for an older persona version")
+        return None
+    generated_at = datetime.fromisoformat(item['generatedAt'])
+    if datetime.now(timezone.utc) - generated_at > timedelta(days=BANK_MAX_AGE_DAYS):
+        logger.info(f"Query bank for {persona_id} is stale")
+        return None
+
+    panel = item.get('panel', [])[:min(BANK_PANEL_PER_RUN, query_count)]
+    pool = item.get('pool', [])
+    fresh_count = min(query_count - len(panel), len(pool))
+
+    fresh = []
+    if fresh_count:
+        period = int(time.time() // BANK_ROTATION_SECONDS)
+        offset = (period * fresh_count) % len(pool)
+        fresh = [pool[(offset + i) % len(pool)] for i in range(fresh_count)]
+
+    queries = panel + fresh
+    source = 'bank'
+    if len(queries) < query_count:
+        queries += generate_for_persona(persona, query_count - len(queries))[:query_count - len(queries)]
+        source = 'mixed'
+
+    logger.info(f"Served {len(queries)} queries for persona {persona_id} from the query bank")
+
+    return {
+        'queries': queries,
+        'panelQueries': panel,
+        'personaId': persona_id,
+        'queryCount': len(queries),
+        'source': source,
+        'generatedAt': get_timestamp()
+    }
+
+
+def precompute_query_bank(personas: list = None, cursor: str = None, context=None) -> dict:
+    """
+    Refill the query bank offline.
+
+    Personas are refilled in personaId order, PRECOMPUTE_CHUNK_SIZE at a
+    time, and each chunk is written to the bank before the next starts.
+    When less than PRECOMPUTE_RESERVE_MS of the invocation remains, the
+    rest is handed to a fresh invocation with the last refilled personaId
+    as its cursor, so a refill larger than one Lambda timeout completes.
+    """
+    if not QUERY_BANK_TABLE:
+        raise ValueError("QUERY_BANK_TABLE is not configured")
+
+    if personas is None and not PERSONAS_TABLE:
+        raise ValueError("PERSONAS_TABLE is not configured")
+
+    requested = personas
+    personas = sorted(
+        personas if personas is not None else load_active_personas(PERSONAS_TABLE),
+        key=lambda p: p['personaId']
+    )
+    if cursor:
+        personas = [p for p in personas if p['personaId'] > cursor]
+
+    totals = {'personaCount': len(personas), 'refreshed': 0, 'panelsRegenerated': 0, 'duplicatesDropped': 0}
+    remaining = personas
+    while remaining:
+        chunk, remaining = remaining[:PRECOMPUTE_CHUNK_SIZE], remaining[PRECOMPUTE_CHUNK_SIZE:]
+        for name, value in refill_bank_chunk(chunk).items():
+            totals[name] += value
+        if remaining and context and context.get_remaining_time_in_millis() < PRECOMPUTE_RESERVE_MS:
+            break
+
+    if remaining:
+        payload = {'mode': 'precompute', 'cursor': chunk[-1]['personaId']}
+        if requested is not None:
+            payload['personas'] = requested
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps(payload, default=str)
+        )
+        totals['cursor'] = payload['cursor']
+
+    logger.info(f"Refreshed query bank for {totals['refreshed']}/{len(personas)} personas, "
+                f"{len(remaining)} handed to a continuation")
+
+    totals['continued'] = bool(remaining)
+    totals['generatedAt'] = get_timestamp()
+    return totals
+
+
+def refill_bank_chunk(personas: list) -> dict:
+    """
+    Refill the bank for a group of personas.
+
+    Pools are regenerated on every refill. Panels are kept while the
+    persona version is unchanged so panel queries stay comparable, and
+    regenerated when the persona changes.
+    """
+    bank_table = dynamodb.Table(QUERY_BANK_TABLE)
+    existing = get_bank_items([p['personaId'] for p in personas])
+
+    keep_panel = []
+    new_panel = []
+    for persona in personas:
+        item = existing.get(persona['personaId'])
+        if item and item.get('personaVersion') == bank_version(persona) and item.get('panel'):
+            keep_panel.append(persona)
+        else:
+            new_panel.append(persona)
+    kept_ids = {p['personaId'] for p in keep_panel}
+
+    generated = {}
+    for group, count in ((new_panel, BANK_PANEL_SIZE + BANK_POOL_SIZE), (keep_panel, BANK_POOL_SIZE)):
+        if group:
+            for result in generate_batch(group, count)['results']:
+                generated[result['personaId']] = result['queries']
+
+    timestamp = get_timestamp()
+    refreshed = 0
+    dropped = 0
+    with bank_table.batch_writer() as batch:
+        for persona in personas:
+            persona_id = persona['personaId']
+            if persona_id in kept_ids:
+                panel = existing[persona_id]['panel']
+                dedup = dedupe_queries(generated.get(persona_id, []), panel)
+            else:
+                dedup = dedupe_queries(generated.get(persona_id, []))
+            queries = dedup['queries']
+            dropped += dedup['dropped']
+            if not queries:
+                continue
+
+            if persona_id in kept_ids:
+                panel_generated_at = existing[persona_id].get('panelGeneratedAt', timestamp)
+            else:
+                panel, queries = queries[:BANK_PANEL_SIZE], queries[BANK_PANEL_SIZE:]
+                panel_generated_at = timestamp
+
+            batch.put_item(Item={
+                'personaId': persona_id,
+                'personaVersion': bank_version(persona),
+                'panel': panel,
+                'pool': [q for q in queries if q not in panel],
+                'panelGeneratedAt': panel_generated_at,
+                'generatedAt': timestamp
+            })
+            refreshed += 1
+
+    return {
+        'refreshed': refreshed,
+        'panelsRegenerated': len(new_panel),
+        'duplicatesDropped': dropped
+    }
+
+
+def get_bank_items(persona_ids: list) -> dict:
+    """Fetch existing bank items keyed by personaId."""
+    items = {}
+    for i in range(0, len(persona_ids), 100):
+        request = {QUERY_BANK_TABLE: {'Keys': [{'personaId': pid} for pid in persona_ids[i:i + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(QUERY_BANK_TABLE, []):
+                items[item['personaId']] = item
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                time.sleep(0.1)
+    return items
+
+
+def bank_version(persona: dict) -> str:
+    """Persona version a bank entry was generated for."""
+    return f"{persona.get('version', 0)}:{persona.get('updatedAt', '')}"
+
+
+def generate_batch(personas: list, query_count: int) -> dict:
+    """
+    Generate queries for many personas with packed Bedrock calls.
+
+    Personas are packed into prompts of up to BATCH_PERSONAS_PER_PROMPT
+    within BATCH_PROMPT_TOKEN_BUDGET, the packed prompts run
+    concurrently, and the model answers with JSON keyed by personaId.
+    Any persona whose queries cannot be read from that JSON falls back
+    to its own single-persona call. Each persona's queries are then
+    deduplicated against its recent runs, as in single-persona mode.
+    """
+    if not personas:
+        raise ValueError("personas is required")
+
+    logger.info(f"Generating queries for {len(personas)} personas in batch mode")
+
+    packs = pack_personas(personas, query_count)
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+        pack_results = list(executor.map(lambda pack: invoke_pack(pack, query_count), packs))
+
+    generated = {}
+    for pack_result in pack_results:
+        generated.update(pack_result)
+
+    fallback = [p for p in personas if not generated.get(p.get('personaId'))]
+    if fallback:
+        logger.warning(f"Falling back to per-persona generation for {len(fallback)} personas")
+        with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+            fallback_queries = executor.map(lambda p: generate_for_persona(p, query_count), fallback)
+            for persona, queries in zip(fallback, fallback_queries):
+                generated[persona.get('personaId')] = queries
+
+    def dedupe(persona):
+        persona_id = persona.get('personaId')
+        return dedupe_queries(generated.get(persona_id, []), load_recent_queries(persona_id))
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+        deduped = list(executor.map(dedupe, personas))
+
+    timestamp = get_timestamp()
+    results = [
+        {
+            'personaId': p.get('personaId'),
+            'queries': dedup['queries'],
+            'queryCount': len(dedup['queries']),
+            'duplicatesDropped': dedup['dropped'],
+            'generatedAt': timestamp
+        }
+        for p, dedup in zip(personas, deduped)
+    ]
+    dropped = sum(dedup['dropped'] for dedup in deduped)
+
+    return {
+        'results': results,
+        'personaCount': len(personas),
+        'promptCount': len(packs),
+        'fallbackCount': len(fallback),
+        'duplicatesDropped': dropped,
+        'engineCallsAvoided': dropped * ENGINES_PER_QUERY,
+        'generatedAt': timestamp
+    }
+
+
+def generate_for_persona(persona: dict, query_count: int) -> list:
+    """Generate queries for one persona with its own Bedrock call."""
+    system_prompt, prompt = get_prompts(persona, query_count)
+    return parse_queries(invoke_claude(system_prompt, prompt))
+
+
+def pack_personas(personas: list, query_count: int) -> list:
+    """Group personas into prompts that respect the size and token budgets."""
+    packs = []
+    current = []
+    current_tokens = 0
+    output_tokens_per_persona = query_count * TOKENS_PER_QUERY
+
+    for persona in personas:
+        tokens = estimate_tokens(build_persona_block(persona, query_count))
+        full = (
+            len(current) >= BATCH_PERSONAS_PER_PROMPT
+            or current_tokens + tokens > BATCH_PROMPT_TOKEN_BUDGET
+            or (len(current) + 1) * output_tokens_per_persona > BATCH_MAX_OUTPUT_TOKENS
+        )
+        if current and full:
+            packs.append(current)
+            current = []
+            current_tokens = 0
+        current.append(persona)
+        current_tokens += tokens
+
+    if current:
+        packs.append(current)
+    return packs
+
+
+def invoke_pack(personas: list, query_count: int) -> dict:
+    """Generate queries for a pack of personas; returns {personaId: queries}."""
+    blocks = "\n\n".join(build_persona_block(p, query_count) for p in personas)
+    persona_ids = [p.get('personaId') for p in personas]
+
+    prompt = f"""Below are {len(personas)} personas. For EACH persona, write exactly {query_count} search queries that the persona would naturally type into an AI assistant like ChatGPT or Perplexity.
+
+Requirements:
+1. Each query should sound authentic to that persona's voice and concerns
+2. Queries should be the kind someone would actually type, not formal questions
+3. Include a mix of question types (how-to, comparison, opinion-seeking, factual)
+4. Do NOT use formal or corporate language
+
+{blocks}
+
+Respond with only a JSON object mapping each personaId to its list of queries, for example:
+{{"{persona_ids[0]}": ["query one", "query two"]}}"""
+
+    system_prompt = ("You simulate several different people searching for information. "
+                     "Keep each persona's voice distinct and never mix their concerns.")
+
+    max_tokens = min(BATCH_MAX_OUTPUT_TOKENS, len(personas) * query_count * TOKENS_PER_QUERY + 256)
+
+    try:
+        response = invoke_claude(system_prompt, prompt, max_tokens=max_tokens)
+        return parse_batch_queries(response, persona_ids)
+    except Exception as e:
+        logger.warning(f"Packed generation failed for {persona_ids}: {e}")
+        return {}
+
+
+def build_persona_block(persona: dict, query_count: int) -> str:
+    """Describe one persona inside a packed prompt."""
+    lines = [f"### personaId: {persona.get('personaId')}", get_prompts(persona, query_count)[0]]
+    if persona.get('brandId'):
+        lines.append(f"The topics should relate to {persona['brandId']} and what this person might want to know about it.")
+    target_queries = persona.get('targetQueries', [])
+    if target_queries:
+        lines.append("Example queries this persona might ask:\n" + "\n".join(f"- {q}" for q in target_queries[:3]))
+    return "\n".join(lines)
+
+
+def parse_batch_queries(response: str, persona_ids: list) -> dict:
+    """Parse the {personaId: [queries]} JSON returned for a packed prompt."""
+    match = re.search(r'\{.*\}', response, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        logger.warning(f"Failed to parse batch response: {e}")
+        return {}
+
+    results = {}
+    for persona_id in persona_ids:
+        queries = parsed.get(persona_id)
+        if not isinstance(queries, list):
+            continue
+        cleaned = [q.strip() for q in queries if isinstance(q, str) and len(q.strip()) > 5]
+        if cleaned:
+            results[persona_id] = cleaned
+    return results
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def get_prompts(persona: dict, query_count: int) -> tuple:
+    """
+    Return (system_prompt, user_prompt) for a persona.
+
+    Rendered prompts are cached per container by persona version, so a
+    persona that has not changed is rendered once.
+    """
+    key = (persona.get('personaId'), bank_version(persona), query_count)
+    prompts = prompt_cache.get(key)
+    if prompts is not None:
+        prompt_cache.move_to_end(key)
+        return prompts
+
+    prompts = (build_system_prompt(persona), build_query_generation_prompt(persona, query_count))
+    if persona.get('personaId'):
+        prompt_cache[key] = prompts
+        if len(prompt_cache) > PROMPT_CACHE_MAX_ENTRIES:
+            prompt_cache.popitem(last=False)
+    return prompts
+
+
 def build_system_prompt(persona: dict) -> str:
     """Build the system prompt for query generation."""
     demographics = persona.get('demographics', {})
@@ -81,22 +651,19 @@ def build_system_prompt(persona: dict) -> str:
     query_patterns = persona.get('queryPatterns', {})
 
     age_range = demographics.get('ageRange', [25, 35])
-    gender = demographics.get('gender', 'person')
 
-    return f"""You are simulating a {age_range[0]}-{age_range[1]} year old {gender} who is searching for information.
-
-Character traits:
-- Education: {demographics.get('education', 'average')}
-- Location: {demographics.get('location', 'United States')}
-- Interests: {', '.join(psychographics.get('interests', ['general topics']))}
-- Concerns: {', '.join(psychographics.get('concerns', ['finding accurate information']))}
-
-Speaking style: {query_patterns.get('speakingStyle', 'casual')}
-Patterns to use: {', '.join(query_patterns.get('typicalQuestions', ['how to', 'what is']))}
-Patterns to AVOID: {', '.join(query_patterns.get('avoidedPatterns', ['formal language']))}
-
-Generate search queries exactly as this person would type them into an AI assistant like ChatGPT or Perplexity.
-Be authentic - use their natural language patterns, including casual phrasing, slang if appropriate, and realistic typos or abbreviations they might use."""
+    return SYSTEM_PROMPT_TEMPLATE.substitute(
+        age_min=age_range[0],
+        age_max=age_range[1],
+        gender=demographics.get('gender', 'person'),
+        education=demographics.get('education', 'average'),
+        location=demographics.get('location', 'United States'),
+        interests=', '.join(psychographics.get('interests', ['general topics'])),
+        concerns=', '.join(psychographics.get('concerns', ['finding accurate information'])),
+        speaking_style=query_patterns.get('speakingStyle', 'casual'),
+        typical_questions=', '.join(query_patterns.get('typicalQuestions', ['how to', 'what is'])),
+        avoided_patterns=', '.join(query_patterns.get('avoidedPatterns', ['formal language']))
+    )
 
 
 def build_query_generation_prompt(persona: dict, query_count: int) -> str:
@@ -112,54 +679,151 @@ def build_query_generation_prompt(persona: dict, query_count: int) -> str:
     if target_queries:
         examples = f"\n\nExample queries this persona might ask:\n" + "\n".join(f"- {q}" for q in target_queries[:3])
 
-    return f"""Generate exactly {query_count} search queries that this persona would naturally type into an AI assistant.
+    return QUERY_PROMPT_TEMPLATE.substitute(
+        query_count=query_count,
+        topic_context=topic_context,
+        examples=examples
+    )
 
-{topic_context}
 
-Requirements:
-1. Each query should sound authentic to this persona's voice and concerns
-2. Queries should be the kind someone would actually type, not formal questions
-3. Include a mix of question types (how-to, comparison, opinion-seeking, factual)
-4. Do NOT use formal or corporate language
-5. Do NOT include numbering or explanations - just the raw queries
-{examples}
+def build_system_blocks(system_prompt: str):
+    """
+    System prompt in the form Bedrock should receive it.
 
-Output only the queries, one per line, no numbering, no explanations:"""
+    Long, stable system prompts on models with prompt caching are sent as
+    a content block marked with cache_control so later calls with the same
+    prefix read it from cache. Prompts below the model's minimum cacheable
+    length are sent as plain text; nothing is added to reach it.
+    """
+    if not prompt_caching_supported or estimate_tokens(system_prompt) < PROMPT_CACHE_MIN_TOKENS:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
 
 
-def invoke_claude(system_prompt: str, user_prompt: str) -> str:
+def invoke_claude(system_prompt: str, user_prompt: str, max_tokens: int = 1024) -> str:
     """Invoke Bedrock Claude and return the response."""
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 1024,
-        "temperature": 0.8,  # Higher temperature for more creative/varied queries
-        "system": system_prompt,
-        "messages": [
-            {"role": "user", "content": user_prompt}
-        ]
-    }
+    body = build_request(system_prompt, user_prompt, max_tokens)
+    try:
+        response_body = invoke_model(BEDROCK_MODEL_ID, body)
+    except ClientError as e:
+        if not prompt_caching_rejected(body, e):
+            raise
+        return invoke_claude(system_prompt, user_prompt, max_tokens)
+    return response_body['content'][0]['text']
 
-    response = bedrock.invoke_model(
-        modelId=BEDROCK_MODEL_ID,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
 
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text']
+def stream_claude(system_prompt: str, user_prompt: str, on_line, max_tokens: int = 1024):
+    """
+    Invoke Bedrock Claude with response streaming.
+
+    on_line is called with each complete line of output as soon as the
+    model finishes it, including a final unterminated line.
+    """
+    body = build_request(system_prompt, user_prompt, max_tokens)
+    buffer = ''
+    received = False
+
+    try:
+        for data in invoke_model_stream(BEDROCK_MODEL_ID, body):
+            if data.get('type') != 'content_block_delta':
+                continue
+            received = True
+            buffer += data.get('delta', {}).get('text', '')
+            while '\n' in buffer:
+                line, buffer = buffer.split('\n', 1)
+                on_line(line)
+    except ClientError as e:
+        if received or not prompt_caching_rejected(body, e):
+            raise
+        return stream_claude(system_prompt, user_prompt, on_line, max_tokens)
+
+    if buffer:
+        on_line(buffer)
+
+
+def build_request(system_prompt: str, user_prompt: str, max_tokens: int) -> dict:
+    """Claude request body for query generation."""
+    # Higher temperature for more creative/varied queries
+    return build_claude_body(user_prompt, build_system_blocks(system_prompt), max_tokens, temperature=0.8)
+
+
+def prompt_caching_rejected(body: dict, error: ClientError) -> bool:
+    """If the model rejected cache_control, stop sending it and return True."""
+    global prompt_caching_supported
+
+    if not isinstance(body.get('system'), list) or error.response['Error']['Code'] != 'ValidationException':
+        return False
+    logger.warning(f"Prompt caching not accepted by {BEDROCK_MODEL_ID}, disabling: {error}")
+    prompt_caching_supported = False
+    return True
+
+
+def stream_queries(system_prompt: str, user_prompt: str, history: list, on_query) -> dict:
+    """
+    Generate queries with streaming, deduplicating and emitting each one
+    as its line completes.
+
+    Returns {"queries": [...], "dropped": n} like dedupe_queries.
+    """
+    dedup = QueryDeduplicator(history)
+    queries = []
+
+    def handle_line(line):
+        query = parse_query_line(line)
+        if not query or not dedup.accept(query):
+            return
+        on_query(query, len(queries))
+        queries.append(query)
+
+    stream_claude(system_prompt, user_prompt, handle_line)
+
+    if dedup.dropped:
+        logger.info(f"Dropped {dedup.dropped} near-duplicate queries")
+
+    return {'queries': queries, 'dropped': dedup.dropped}
+
+
+def build_queue_emitter(persona: dict, execution_id: str):
+    """Callback that sends each streamed query to QUERY_STREAM_QUEUE_URL."""
+    def emit(query: str, query_index: int):
+        message = {
+            'executionId': execution_id,
+            'queryIndex': query_index,
+            'query': query,
+            'persona': persona
+        }
+        # A query that is not enqueued would never be recorded and the run
+        # could not complete, so a send failure fails the run
+        sqs.send_message(QueueUrl=QUERY_STREAM_QUEUE_URL, MessageBody=json.dumps(message, default=str))
+
+    return emit
 
 
 def parse_queries(response: str) -> list:
     """Parse the generated queries from Claude's response."""
-    # Split by newlines and clean up
-    lines = response.strip().split('\n')
     queries = []
+    for line in response.strip().split('\n'):
+        query = parse_query_line(line)
+        if query:
+            queries.append(query)
+    return queries
 
-    for line in lines:
-        # Clean up each line
-        query = line.strip()
 
+def parse_query_line(line: str):
+    """
+    Parse one line of output into a query, or None.
+
+    Lines are expected as {"query": "..."} objects; plain-text lines, with
+    or without numbering, are still accepted.
+    """
+    query = line.strip()
+
+    if query.startswith('{'):
+        try:
+            query = str(json.loads(query).get('query', '')).strip()
+        except (ValueError, AttributeError):
+            return None
+    else:
         # Remove any numbering (1. or 1) or - prefix)
         if query and query[0].isdigit():
             # Remove "1. " or "1) " patterns
@@ -170,11 +834,140 @@ def parse_queries(response: str) -> list:
         if query.startswith('- '):
             query = query[2:].strip()
 
-        # Only include non-empty queries
-        if query and len(query) > 5:
-            queries.append(query)
+    # Only include non-empty queries
+    if query and len(query) > 5:
+        return query
+    return None
 
-    return queries
+
+def dedupe_queries(queries: list, history: list = None) -> dict:
+    """
+    Drop queries that paraphrase an earlier query or a recent one.
+
+    Queries are compared by cosine similarity of their embeddings, in
+    order, against every query already kept and against history. Every
+    query dropped here saves one call per engine downstream.
+
+    Returns {"queries": [...], "dropped": n}.
+    """
+    if not DEDUP_ENABLED or not queries:
+        return {'queries': queries, 'dropped': 0}
+
+    dedup = QueryDeduplicator(history)
+
+    # Exact repeats (ignoring case and punctuation) never need embedding
+    pending = set()
+    candidates = []
+    for query in queries:
+        key = normalize_query(query)
+        if key not in dedup.seen and key not in pending:
+            pending.add(key)
+            candidates.append(query)
+
+    vectors = embed_texts(candidates)
+    kept = [query for query, vector in zip(candidates, vectors) if dedup.accept(query, vector)]
+
+    dropped = len(queries) - len(kept)
+    if dropped:
+        logger.info(f"Dropped {dropped} near-duplicate queries")
+
+    return {'queries': kept, 'dropped': dropped}
+
+
+class QueryDeduplicator:
+    """Incremental near-duplicate filter over accepted queries and history."""
+
+    def __init__(self, history: list = None):
+        history = history or []
+        self.seen = {normalize_query(q) for q in history}
+        self.vectors = embed_texts(history) if DEDUP_ENABLED else []
+        self.dropped = 0
+
+    def accept(self, query: str, vector: list = None) -> bool:
+        """Return True and remember the query if it is not a duplicate."""
+        if not DEDUP_ENABLED:
+            return True
+
+        key = normalize_query(query)
+        if key in self.seen:
+            self.dropped += 1
+            return False
+        self.seen.add(key)
+
+        vector = vector or embed_texts([query])[0]
+        if any(cosine_similarity(vector, other) >= DEDUP_SIMILARITY_THRESHOLD for other in self.vectors):
+            self.dropped += 1
+            return False
+
+        self.vectors.append(vector)
+        return True
+
+
+def embed_texts(texts: list) -> list:
+    """
+    Embed texts with Titan, falling back to local hashing vectors.
+
+    Set DEDUP_EMBEDDER=local to skip Bedrock entirely (e.g. in tests).
+    """
+    if not texts:
+        return []
+    if DEDUP_EMBEDDER == 'local':
+        return [hashing_vector(text) for text in texts]
+
+    try:
+        return embed_many(texts, DEDUP_EMBEDDING_MODEL, dimensions=DEDUP_EMBEDDING_DIMENSIONS, normalize=True)
+    except Exception as e:
+        logger.warning(f"Titan embeddings failed, using hashing vectors: {e}")
+        return [hashing_vector(text) for text in texts]
+
+
+def hashing_vector(text: str) -> list:
+    """L2-normalized hashed bag of words and character trigrams."""
+    vector = [0.0] * HASHING_DIMENSIONS
+    words = normalize_query(text).split()
+    features = words + [
+        word[i:i + 3] for word in words for i in range(max(len(word) - 2, 1))
+    ]
+    for feature in features:
+        vector[zlib.crc32(feature.encode('utf-8')) % HASHING_DIMENSIONS] += 1.0
+
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def cosine_similarity(a: list, b: list) -> float:
+    """Cosine similarity of two vectors."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and strip punctuation."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+def load_recent_queries(persona_id: str) -> list:
+    """Queries from the persona's last DEDUP_HISTORY_RUNS stored runs."""
+    if not (DEDUP_ENABLED and QUERY_RESULTS_TABLE and persona_id and DEDUP_HISTORY_RUNS):
+        return []
+
+    try:
+        response = dynamodb.Table(QUERY_RESULTS_TABLE).query(
+            IndexName=RESULTS_PERSONA_INDEX,
+            KeyConditionExpression=Key('personaId').eq(persona_id),
+            ScanIndexForward=False,
+            Limit=DEDUP_HISTORY_RUNS,
+            ProjectionExpression='queries'
+        )
+    except Exception as e:
+        logger.warning(f"Could not load query history for {persona_id}: {e}")
+        return []
+
+    history = []
+    for item in response.get('Items', []):
+        history.extend(item.get('queries', []))
+    return list(dict.fromkeys(history))
 
 
 def get_timestamp() -> str:
@@ -8,7 +8,7 @@ import os
 import json
 import logging
 from datetime import datetime
-import boto3
+from common.bedrock import invoke_claude
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,9 +16,6 @@ logger.setLevel(logging.INFO)
 # Environment variables
 BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-5-sonnet-20241022-v2:0')
 
-# Clients
-bedrock = boto3.client('bedrock-runtime')
-
 
 def handler(event, context):
     """
@@ -280,24 +277,7 @@ Respond only with the JSON object, no additional text."""
 
 def invoke_bedrock(prompt: str) -> str:
     """Invoke Bedrock Claude model."""
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 4096,
-        "temperature": 0.3,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-
-    response = bedrock.invoke_model(
-        modelId=BEDROCK_MODEL_ID,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
-
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text']
+    return invoke_claude(BEDROCK_MODEL_ID, prompt, max_tokens=4096, temperature=0.3)
 
 
 def parse_json_response(response: str) -> dict:
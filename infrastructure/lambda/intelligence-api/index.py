@@ -6,6 +6,7 @@ Provides access to graph queries, similarity search, and insights.
 """
 import os
 import json
+import uuid
 import logging
 from datetime import datetime
 import boto3
@@ -20,6 +21,9 @@ GRAPH_QUERY_FUNCTION = os.environ.get('GRAPH_QUERY_FUNCTION', '')
 INSIGHTS_GENERATOR_FUNCTION = os.environ.get('INSIGHTS_GENERATOR_FUNCTION', '')
 CONTENT_INGESTION_FUNCTION = os.environ.get('CONTENT_INGESTION_FUNCTION', '')
 
+# Largest "limit" accepted by /similar (openapi SimilarityRequest)
+SIMILAR_MAX_LIMIT = 50
+
 # Clients
 lambda_client = boto3.client('lambda')
 
@@ -30,6 +34,8 @@ def handler(event, context):
 
     API Gateway Event:
         - POST /intelligence/search - Similarity search
+        - POST /intelligence/similar - Content similar to contentId(s) or text
+        - GET /intelligence/content/{contentId}/similar?limit=10 - Content similar to one item
         - POST /intelligence/graph - Graph queries
         - POST /intelligence/insights - Generate insights
         - POST /intelligence/ingest - Ingest content
@@ -47,6 +53,8 @@ def handler(event, context):
     try:
         if '/search' in path:
             return handle_search(body)
+        elif '/similar' in path:
+            return handle_similar(body, path_params, query_params)
         elif '/graph' in path:
             return handle_graph_query(body)
         elif '/insights' in path:
@@ -71,34 +79,144 @@ def handler(event, context):
 
 
 def handle_search(body: dict) -> dict:
-    """Handle similarity search requests."""
+    """Handle similarity search requests (one query, or a "queries" batch)."""
     query = body.get('query', '')
     brand_id = body.get('brandId', '')
     content_type = body.get('contentType', '')
     k = body.get('k', 10)
     filters = body.get('filters', {})
+    queries = body.get('queries')
 
-    if not query:
+    if queries is not None:
+        if not isinstance(queries, list) or not queries:
+            raise ValueError("queries must be a non-empty list")
+    elif not query:
         raise ValueError("query is required")
 
     if not SIMILARITY_SEARCH_FUNCTION:
         return api_response(503, {'error': 'Search service not configured'})
 
-    # Invoke similarity search Lambda
-    result = invoke_lambda(SIMILARITY_SEARCH_FUNCTION, {
+    if queries is not None:
+        # One invoke, one embedding batch and one _msearch for the whole batch
+        payload = {'queries': queries}
+        for key in ('brandId', 'contentType', 'k', 'filters', 'hybrid', 'fusion', 'vectorWeight',
+                    'mmr', 'mmrLambda', 'collapse', 'pool'):
+            if key in body:
+                payload[key] = body[key]
+        result = invoke_lambda(SIMILARITY_SEARCH_FUNCTION, payload)
+        return api_response(200, {
+            'responses': result.get('responses', []),
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        })
+
+    payload = {
         'query': query,
         'brandId': brand_id,
         'contentType': content_type,
         'k': k,
         'filters': filters
-    })
+    }
+    # Hybrid (lexical + vector) and diversity options pass through as given
+    for key in ('hybrid', 'fusion', 'vectorWeight', 'mmr', 'mmrLambda', 'collapse', 'pool'):
+        if key in body:
+            payload[key] = body[key]
 
-    return api_response(200, {
+    # Invoke similarity search Lambda
+    result = invoke_lambda(SIMILARITY_SEARCH_FUNCTION, payload)
+
+    response = {
         'results': result.get('results', []),
         'totalFound': result.get('totalFound', 0),
         'query': query,
         'timestamp': datetime.utcnow().isoformat() + 'Z'
-    })
+    }
+    if result.get('timings'):
+        response['timings'] = result['timings']
+    return api_response(200, response)
+
+
+def handle_similar(body: dict, path_params: dict, query_params: dict) -> dict:
+    """
+    Handle "more like this" requests (openapi SimilarityRequest).
+
+    Content is matched to one contentId (path or body), several
+    contentIds, or free text. limit (or k) is at most SIMILAR_MAX_LIMIT;
+    filters.minScore and filters.clientId narrow the results. Returns 404
+    only when a content id has no stored embedding; other search
+    failures are 502.
+    """
+    content_id = path_params.get('contentId') or body.get('contentId', '')
+    content_ids = body.get('contentIds')
+    text = body.get('text', '')
+
+    if content_ids is not None:
+        if not isinstance(content_ids, list) or not content_ids:
+            raise ValueError("contentIds must be a non-empty list")
+    elif not content_id and not text:
+        raise ValueError("contentId or text is required")
+
+    filters = body.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    limit = body.get('limit', body.get('k', query_params.get('limit', query_params.get('k'))))
+
+    if not SIMILARITY_SEARCH_FUNCTION:
+        return api_response(503, {'error': 'Search service not configured'})
+
+    if content_ids is not None:
+        payload = {'contentIds': content_ids}
+    elif content_id:
+        payload = {'contentId': content_id}
+    else:
+        payload = {'query': text}
+    for key in ('brandId', 'contentType', 'minScore', 'mmr', 'mmrLambda', 'collapse', 'pool'):
+        if key in body:
+            payload[key] = body[key]
+    if limit is not None:
+        payload['k'] = parse_limit(limit)
+    # The spec carries minScore inside filters
+    search_filters = {key: value for key, value in filters.items() if key != 'minScore'}
+    if 'minScore' in filters:
+        payload.setdefault('minScore', filters['minScore'])
+    if search_filters:
+        payload['filters'] = search_filters
+
+    try:
+        result = invoke_lambda(SIMILARITY_SEARCH_FUNCTION, payload)
+    except Exception as e:
+        logger.error(f"Similar content search failed: {e}")
+        return api_response(502, {'error': 'Search service error'})
+
+    if content_ids is not None:
+        return api_response(200, {
+            'responses': result.get('responses', []),
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        })
+    error = result.get('error')
+    if error:
+        return api_response(404 if error.startswith('No embedding found') else 502, {'error': error})
+
+    response = {
+        'results': result.get('results', []),
+        'totalFound': result.get('totalFound', 0),
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }
+    if content_id:
+        response['contentId'] = content_id
+    else:
+        response['query'] = text
+    return api_response(200, response)
+
+
+def parse_limit(limit) -> int:
+    """Validate a result limit against SIMILAR_MAX_LIMIT."""
+    try:
+        value = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if not 1 <= value <= SIMILAR_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {SIMILAR_MAX_LIMIT}")
+    return value
 
 
 def handle_graph_query(body: dict) -> dict:
@@ -153,7 +271,16 @@ def handle_insights(body: dict) -> dict:
 
 
 def handle_ingest(body: dict) -> dict:
-    """Handle content ingestion requests."""
+    """
+    Handle content ingestion requests.
+
+    A body with "source" (an s3:// JSON-lines or CSV object, optionally
+    gzip) starts an asynchronous pipeline job and returns its jobId;
+    otherwise "content" is ingested synchronously.
+    """
+    if 'source' in body:
+        return start_ingestion_job(body)
+
     content = body.get('content', '')
     content_type = body.get('contentType', 'article')
     brand_id = body.get('brandId', '')
@@ -186,6 +313,35 @@ def handle_ingest(body: dict) -> dict:
     })
 
 
+def start_ingestion_job(body: dict) -> dict:
+    """Start a streamed ingestion of an S3 object."""
+    source = body.get('source')
+    if not isinstance(source, str) or not source.startswith('s3://'):
+        raise ValueError("source must be an s3:// URI")
+
+    if not CONTENT_INGESTION_FUNCTION:
+        return api_response(503, {'error': 'Ingestion service not configured'})
+
+    job_id = body.get('jobId') or str(uuid.uuid4())
+    payload = {'mode': 'pipeline', 'source': source, 'jobId': job_id}
+    for name in ('format', 'embedWorkers', 'indexWorkers'):
+        if body.get(name):
+            payload[name] = body[name]
+
+    lambda_client.invoke(
+        FunctionName=CONTENT_INGESTION_FUNCTION,
+        InvocationType='Event',
+        Payload=json.dumps(payload)
+    )
+
+    return api_response(202, {
+        'message': 'Ingestion job started',
+        'jobId': job_id,
+        'source': source,
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    })
+
+
 def get_entity(entity_id: str) -> dict:
     """Get entity details from graph."""
     if not entity_id:
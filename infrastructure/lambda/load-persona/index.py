@@ -6,7 +6,8 @@ Retrieves a persona definition from DynamoDB for use in the persona agent workfl
 import os
 import logging
 import boto3
-from boto3.dynamodb.conditions import Key
+from common.active_personas import load_active_personas
+from common.persona_cache import PersonaCache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -18,6 +19,9 @@ PERSONAS_TABLE = os.environ.get('PERSONAS_TABLE', 'brandpoint-ai-dev-personas')
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table(PERSONAS_TABLE)
 
+# Persona cache (survives across warm invocations)
+persona_cache = PersonaCache(table)
+
 
 def handler(event, context):
     """
@@ -51,14 +55,11 @@ def handler(event, context):
 
     # Load single persona
     try:
-        response = table.get_item(
-            Key={'personaId': persona_id}
-        )
+        persona = persona_cache.get(persona_id)
 
-        if 'Item' not in response:
+        if persona is None:
             raise ValueError(f"Persona '{persona_id}' not found")
 
-        persona = response['Item']
         logger.info(f"Successfully loaded persona: {persona_id}")
 
         return persona
@@ -72,29 +73,15 @@ def load_all_active_personas():
     """
     Load all active personas for scheduled batch execution.
 
+    Reads the active-personas index, or scans until it is backfilled
+    (see common/active_personas.py).
+
     Returns a list of personas to be processed.
     """
     logger.info("Loading all active personas for scheduled execution")
 
     try:
-        # Scan for all active personas
-        response = table.scan(
-            FilterExpression='#status = :active',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={':active': 'active'}
-        )
-
-        personas = response.get('Items', [])
-
-        # Handle pagination if needed
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(
-                FilterExpression='#status = :active',
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues={':active': 'active'},
-                ExclusiveStartKey=response['LastEvaluatedKey']
-            )
-            personas.extend(response.get('Items', []))
+        personas = load_active_personas(PERSONAS_TABLE)
 
         logger.info(f"Loaded {len(personas)} active personas")
 
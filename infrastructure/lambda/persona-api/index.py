@@ -8,10 +8,17 @@ import os
 import json
 import logging
 import uuid
+import time
+import base64
+import binascii
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 import boto3
+from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
+from common.persona_cache import PersonaCache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -19,12 +26,44 @@ logger.setLevel(logging.INFO)
 # Environment variables
 PERSONAS_TABLE = os.environ.get('PERSONAS_TABLE', 'brandpoint-personas')
 STEP_FUNCTION_NAME = os.environ.get('STEP_FUNCTION_NAME', '')
+QUERY_RESULTS_TABLE = os.environ.get('QUERY_RESULTS_TABLE', 'brandpoint-query-results')
+RESULTS_PERSONA_INDEX = os.environ.get('RESULTS_PERSONA_INDEX', 'personaId-executedAt-index')
+CLIENT_INDEX = os.environ.get('CLIENT_INDEX', 'clientId-index')
+
+# Upper bound on DynamoDB pages read to fill one GET /personas page
+MAX_LIST_PAGES = int(os.environ.get('MAX_LIST_PAGES', '10'))
+
+# Bulk endpoint limits
+MAX_IMPORT_ROWS = int(os.environ.get('MAX_IMPORT_ROWS', '1000'))
+MAX_EXPORT_ROWS = int(os.environ.get('MAX_EXPORT_ROWS', '1000'))
+MAX_BATCH_EXECUTIONS = int(os.environ.get('MAX_BATCH_EXECUTIONS', '500'))
+BATCH_START_CONCURRENCY = int(os.environ.get('BATCH_START_CONCURRENCY', '8'))
+BATCH_START_RATE = float(os.environ.get('BATCH_START_RATE', '20'))  # starts per second
+
+# Persona attributes callers may request through the `fields` projection
+PERSONA_FIELDS = {
+    'personaId', 'name', 'brandId', 'clientId', 'description', 'demographics',
+    'psychographics', 'queryPatterns', 'interests', 'painPoints', 'searchBehavior',
+    'preferredEngines', 'queryTemplates', 'targetQueries', 'isActive', 'version',
+    'createdAt', 'updatedAt'
+}
+
+# Result attributes callers may request through the `fields` projection
+RESULT_FIELDS = {
+    'resultId', 'executionId', 'personaId', 'personaName', 'brandId', 'clientId',
+    'executedAt', 'overallVisibility', 'queryCount', 'engineBreakdown', 'insights',
+    'recordType'
+}
 
 # Clients
 dynamodb = boto3.resource('dynamodb')
 sfn_client = boto3.client('stepfunctions')
 sts_client = boto3.client('sts')
 personas_table = dynamodb.Table(PERSONAS_TABLE)
+results_table = dynamodb.Table(QUERY_RESULTS_TABLE)
+
+# Persona cache (survives across warm invocations)
+persona_cache = PersonaCache(personas_table)
 
 # Construct Step Function ARN at runtime to avoid circular dependency
 _step_function_arn_cache = None
@@ -64,20 +103,38 @@ def handler(event, context):
         - DELETE /personas/{personaId} - Delete persona
         - POST /personas/{personaId}/execute - Execute persona agent
         - GET /personas/{personaId}/results - Get persona results
+        - POST /personas/import - Bulk import personas (JSON or JSON Lines)
+        - GET /personas/export - Export personas as JSON Lines
+        - POST /personas/batch-execute - Execute persona agent for many personas
     """
     http_method = event.get('httpMethod', 'GET')
     path = event.get('path', '')
     path_params = event.get('pathParameters', {}) or {}
-    body = json.loads(event.get('body', '{}')) if event.get('body') else {}
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
     query_params = event.get('queryStringParameters', {}) or {}
 
     persona_id = path_params.get('personaId', '')
+    bulk_action = '' if persona_id else path.rstrip('/').rsplit('/', 1)[-1]
 
     logger.info(f"Persona API: {http_method} {path}")
 
     try:
+        if headers.get('content-type', '').startswith('application/x-ndjson'):
+            body = {'personas': parse_json_lines(event.get('body') or '')}
+        else:
+            body = json.loads(event.get('body', '{}')) if event.get('body') else {}
+
         # Route based on path and method
-        if path == '/personas' or path == '/personas/':
+        if bulk_action == 'import' and http_method == 'POST':
+            return import_personas(body)
+
+        elif bulk_action == 'export' and http_method == 'GET':
+            return export_personas(query_params)
+
+        elif bulk_action == 'batch-execute' and http_method == 'POST':
+            return batch_execute_personas(body)
+
+        elif path == '/personas' or path == '/personas/':
             if http_method == 'GET':
                 return list_personas(query_params)
             elif http_method == 'POST':
@@ -110,41 +167,80 @@ def handler(event, context):
 
 
 def list_personas(query_params: dict) -> dict:
-    """List all personas with optional filtering."""
+    """
+    List personas with server-side filtering and cursor pagination.
+
+    Queries the clientId-index GSI when clientId is given, otherwise
+    scans. DynamoDB applies Limit before filters, so pages are read
+    until `limit` matches are collected (bounded by MAX_LIST_PAGES) and
+    the cursor is rebuilt from the last persona returned.
+
+    Query parameters:
+        clientId, brandId, isActive: filters
+        limit: page size (default 50, max 100)
+        fields: comma-separated attribute projection
+        nextToken: continuation token from a previous page
+    """
     brand_id = query_params.get('brandId', '')
     client_id = query_params.get('clientId', '')
+    is_active = query_params.get('isActive', '')
     limit = min(int(query_params.get('limit', 50)), 100)
 
-    # Build filter expression
-    filter_parts = []
-    expression_values = {}
+    key_fields = ['personaId', 'clientId'] if client_id else ['personaId']
 
+    read_kwargs = build_projection(query_params.get('fields', ''), PERSONA_FIELDS, key_fields)
+
+    filter_condition = None
     if brand_id:
-        filter_parts.append('brandId = :brandId')
-        expression_values[':brandId'] = brand_id
+        filter_condition = Attr('brandId').eq(brand_id)
+    if is_active:
+        active_condition = Attr('isActive').eq(is_active.lower() == 'true')
+        filter_condition = active_condition if filter_condition is None else filter_condition & active_condition
+    if filter_condition is not None:
+        read_kwargs['FilterExpression'] = filter_condition
 
     if client_id:
-        filter_parts.append('clientId = :clientId')
-        expression_values[':clientId'] = client_id
-
-    scan_kwargs = {'Limit': limit}
-    if filter_parts:
-        scan_kwargs['FilterExpression'] = ' AND '.join(filter_parts)
-        scan_kwargs['ExpressionAttributeValues'] = expression_values
-
-    response = personas_table.scan(**scan_kwargs)
-    items = response.get('Items', [])
+        read_kwargs['IndexName'] = CLIENT_INDEX
+        read_kwargs['KeyConditionExpression'] = Key('clientId').eq(client_id)
+        read_page = personas_table.query
+    else:
+        read_page = personas_table.scan
+
+    start_key = decode_page_token(query_params.get('nextToken', ''))
+
+    items = []
+    last_key = None
+    for _ in range(MAX_LIST_PAGES):
+        page_kwargs = dict(read_kwargs, Limit=limit)
+        if start_key:
+            page_kwargs['ExclusiveStartKey'] = start_key
+
+        response = read_page(**page_kwargs)
+        page_items = response.get('Items', [])
+        start_key = response.get('LastEvaluatedKey')
+
+        needed = limit - len(items)
+        if len(page_items) > needed:
+            # Resume right after the last persona we return
+            items.extend(page_items[:needed])
+            last_key = {field: items[-1][field] for field in key_fields}
+            break
+
+        items.extend(page_items)
+        last_key = start_key
+        if not start_key or len(items) == limit:
+            break
 
     return api_response(200, {
         'personas': json.loads(json.dumps(items, cls=DecimalEncoder)),
-        'count': len(items)
+        'count': len(items),
+        'nextToken': encode_page_token(last_key)
     })
 
 
 def get_persona(persona_id: str) -> dict:
     """Get persona by ID."""
-    response = personas_table.get_item(Key={'personaId': persona_id})
-    item = response.get('Item')
+    item = persona_cache.get(persona_id)
 
     if not item:
         return api_response(404, {'error': 'Persona not found'})
@@ -156,13 +252,34 @@ def get_persona(persona_id: str) -> dict:
 
 def create_persona(body: dict) -> dict:
     """Create new persona."""
+    persona = build_persona_item(body)
+
+    personas_table.put_item(Item=persona)
+    persona_cache.put(persona)
+
+    logger.info(f"Created persona: {persona['personaId']}")
+
+    return api_response(201, {
+        'persona': json.loads(json.dumps(persona, cls=DecimalEncoder)),
+        'message': 'Persona created successfully'
+    })
+
+
+def build_persona_item(body: dict, persona_id: str = None, timestamp: str = None) -> dict:
+    """Validate a persona payload and build its DynamoDB item."""
+    if not isinstance(body, dict):
+        raise ValueError("persona must be a JSON object")
+
     required_fields = ['name', 'brandId']
     for field in required_fields:
-        if field not in body:
+        if not body.get(field):
             raise ValueError(f"{field} is required")
 
-    persona_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat() + 'Z'
+    if body.get('clientId') is not None and not isinstance(body['clientId'], str):
+        raise ValueError("clientId must be a string")
+
+    persona_id = persona_id or str(uuid.uuid4())
+    timestamp = timestamp or datetime.utcnow().isoformat() + 'Z'
 
     persona = {
         'personaId': persona_id,
@@ -177,31 +294,37 @@ def create_persona(body: dict) -> dict:
         'preferredEngines': body.get('preferredEngines', ['chatgpt', 'perplexity', 'gemini', 'claude']),
         'queryTemplates': body.get('queryTemplates', []),
         'isActive': body.get('isActive', True),
+        'version': 1,
         'createdAt': timestamp,
         'updatedAt': timestamp
     }
 
-    personas_table.put_item(Item=persona)
+    # Carry every other persona attribute given, so an export re-imports
+    # without losing fields the workflow reads (psychographics, ...)
+    for field in PERSONA_FIELDS - persona.keys():
+        if field in body:
+            persona[field] = body[field]
 
-    logger.info(f"Created persona: {persona_id}")
+    # activeStatus is the sparse key of the active-personas GSI; it is
+    # only present while the persona is active
+    if persona['isActive']:
+        persona['activeStatus'] = 'active'
 
-    return api_response(201, {
-        'persona': persona,
-        'message': 'Persona created successfully'
-    })
+    # clientId keys the clientId-index GSI, which rejects empty strings;
+    # a persona without a client is simply left out of that index
+    if not persona['clientId']:
+        del persona['clientId']
+
+    # Floats (e.g. in demographics) must be Decimals for DynamoDB
+    return json.loads(json.dumps(persona), parse_float=Decimal)
 
 
 def update_persona(persona_id: str, body: dict) -> dict:
     """Update existing persona."""
-    # Check if persona exists
-    existing = personas_table.get_item(Key={'personaId': persona_id})
-    if not existing.get('Item'):
-        return api_response(404, {'error': 'Persona not found'})
-
     # Build update expression
     update_parts = []
-    expression_names = {}
-    expression_values = {':updatedAt': datetime.utcnow().isoformat() + 'Z'}
+    expression_names = {'#version': 'version'}
+    expression_values = {':updatedAt': datetime.utcnow().isoformat() + 'Z', ':one': 1}
 
     updatable_fields = [
         'name', 'description', 'demographics', 'interests', 'painPoints',
@@ -217,13 +340,33 @@ def update_persona(persona_id: str, body: dict) -> dict:
     update_parts.append("#updatedAt = :updatedAt")
     expression_names["#updatedAt"] = "updatedAt"
 
-    response = personas_table.update_item(
-        Key={'personaId': persona_id},
-        UpdateExpression='SET ' + ', '.join(update_parts),
-        ExpressionAttributeNames=expression_names,
-        ExpressionAttributeValues=expression_values,
-        ReturnValues='ALL_NEW'
-    )
+    # Keep the sparse active-personas GSI key in step with isActive
+    update_expression = 'SET ' + ', '.join(update_parts)
+    if 'isActive' in body:
+        expression_names['#activeStatus'] = 'activeStatus'
+        if body['isActive']:
+            update_expression += ', #activeStatus = :activeStatus'
+            expression_values[':activeStatus'] = 'active'
+        else:
+            update_expression += ' REMOVE #activeStatus'
+    update_expression += ' ADD #version :one'
+
+    # The condition replaces a separate existence read
+    try:
+        response = personas_table.update_item(
+            Key={'personaId': persona_id},
+            UpdateExpression=update_expression,
+            ConditionExpression='attribute_exists(personaId)',
+            ExpressionAttributeNames=expression_names,
+            ExpressionAttributeValues=expression_values,
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return api_response(404, {'error': 'Persona not found'})
+        raise
+
+    persona_cache.put(response['Attributes'])
 
     logger.info(f"Updated persona: {persona_id}")
 
@@ -235,12 +378,17 @@ def update_persona(persona_id: str, body: dict) -> dict:
 
 def delete_persona(persona_id: str) -> dict:
     """Delete persona."""
-    # Check if persona exists
-    existing = personas_table.get_item(Key={'personaId': persona_id})
-    if not existing.get('Item'):
-        return api_response(404, {'error': 'Persona not found'})
-
-    personas_table.delete_item(Key={'personaId': persona_id})
+    try:
+        personas_table.delete_item(
+            Key={'personaId': persona_id},
+            ConditionExpression='attribute_exists(personaId)'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return api_response(404, {'error': 'Persona not found'})
+        raise
+    finally:
+        persona_cache.invalidate(persona_id)
 
     logger.info(f"Deleted persona: {persona_id}")
 
@@ -257,12 +405,28 @@ def execute_persona(persona_id: str, body: dict) -> dict:
         return api_response(503, {'error': 'Workflow execution not configured'})
 
     # Get persona
-    response = personas_table.get_item(Key={'personaId': persona_id})
-    persona = response.get('Item')
+    persona = persona_cache.get(persona_id)
 
     if not persona:
         return api_response(404, {'error': 'Persona not found'})
 
+    try:
+        execution = start_persona_execution(step_function_arn, persona, body)
+
+        return api_response(202, {
+            'message': 'Persona agent execution started',
+            **execution
+        })
+
+    except ClientError as e:
+        logger.error(f"Failed to start execution: {e}")
+        return api_response(500, {'error': 'Failed to start workflow execution'})
+
+
+def start_persona_execution(step_function_arn: str, persona: dict, body: dict) -> dict:
+    """Start one persona agent workflow execution."""
+    persona_id = persona['personaId']
+
     # Prepare workflow input
     execution_input = {
         'personaId': persona_id,
@@ -272,44 +436,359 @@ def execute_persona(persona_id: str, body: dict) -> dict:
         'requestedAt': datetime.utcnow().isoformat() + 'Z'
     }
 
-    # Start Step Functions execution
-    execution_name = f"persona-{persona_id[:8]}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    # Start Step Functions execution; the suffix keeps names unique when
+    # several personas share a prefix or start in the same second
+    execution_name = (
+        f"persona-{persona_id[:8]}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    )
 
-    try:
-        sfn_response = sfn_client.start_execution(
-            stateMachineArn=step_function_arn,
-            name=execution_name,
-            input=json.dumps(execution_input)
+    sfn_response = sfn_client.start_execution(
+        stateMachineArn=step_function_arn,
+        name=execution_name,
+        input=json.dumps(execution_input)
+    )
+
+    logger.info(f"Started execution: {sfn_response['executionArn']}")
+
+    return {
+        'executionArn': sfn_response['executionArn'],
+        'executionName': execution_name,
+        'personaId': persona_id,
+        'startedAt': sfn_response['startDate'].isoformat()
+    }
+
+
+def import_personas(body: dict) -> dict:
+    """
+    Bulk import personas with BatchWriteItem.
+
+    Each row is validated independently; invalid rows are reported by
+    index and skipped. Rows carrying a personaId replace that persona,
+    so an export can be re-imported as-is; a replaced persona keeps its
+    createdAt and its version is bumped, as with an update.
+    """
+    rows = body.get('personas', [])
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("personas must be a non-empty list")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"At most {MAX_IMPORT_ROWS} personas per import")
+
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    items = []
+    errors = []
+    given_ids = set()
+
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("persona must be a JSON object")
+            persona_id = row.get('personaId')
+            if persona_id is not None and (not isinstance(persona_id, str) or not persona_id.strip()):
+                raise ValueError("personaId must be a non-empty string")
+            items.append(build_persona_item(row, persona_id, timestamp))
+            if persona_id:
+                given_ids.add(persona_id)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    # Replaced personas keep createdAt and move to the next version
+    existing = {
+        item['personaId']: item
+        for item in batch_get_items(
+            list(given_ids),
+            ProjectionExpression='personaId, #version, createdAt',
+            ExpressionAttributeNames={'#version': 'version'}
         )
+    }
+    for item in items:
+        current = existing.get(item['personaId'])
+        if current:
+            item['version'] = int(current.get('version') or 0) + 1
+            item['createdAt'] = current.get('createdAt', item['createdAt'])
+
+    # batch_writer chunks into 25-item BatchWriteItem calls and resends
+    # unprocessed items; duplicate keys in one request keep the last row
+    with personas_table.batch_writer(overwrite_by_pkeys=['personaId']) as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+    for item in items:
+        persona_cache.invalidate(item['personaId'])
+
+    logger.info(f"Imported {len(items)} personas, {len(errors)} rejected")
+
+    return api_response(200 if not errors else 207, {
+        'imported': len(items),
+        'failed': len(errors),
+        'personaIds': [item['personaId'] for item in items],
+        'errors': errors
+    })
 
-        logger.info(f"Started execution: {sfn_response['executionArn']}")
 
-        return api_response(202, {
-            'message': 'Persona agent execution started',
-            'executionArn': sfn_response['executionArn'],
-            'executionName': execution_name,
-            'personaId': persona_id,
-            'startedAt': sfn_response['startDate'].isoformat()
-        })
+def export_personas(query_params: dict) -> dict:
+    """
+    Export personas as JSON Lines, one persona per line.
 
-    except ClientError as e:
-        logger.error(f"Failed to start execution: {e}")
-        return api_response(500, {'error': 'Failed to start workflow execution'})
+    Rows are serialized page by page as they are read. Large exports
+    are split across requests: the X-Next-Token response header carries
+    the cursor for the next chunk (empty on the last one).
+    """
+    client_id = query_params.get('clientId', '')
+    max_rows = min(int(query_params.get('limit', MAX_EXPORT_ROWS)), MAX_EXPORT_ROWS)
+
+    read_kwargs = {}
+    if client_id:
+        read_kwargs['IndexName'] = CLIENT_INDEX
+        read_kwargs['KeyConditionExpression'] = Key('clientId').eq(client_id)
+        read_page = personas_table.query
+    else:
+        read_page = personas_table.scan
+
+    start_key = decode_page_token(query_params.get('nextToken', ''))
+    lines = []
+
+    while len(lines) < max_rows:
+        page_kwargs = dict(read_kwargs, Limit=max_rows - len(lines))
+        if start_key:
+            page_kwargs['ExclusiveStartKey'] = start_key
+
+        response = read_page(**page_kwargs)
+        for item in response.get('Items', []):
+            item.pop('activeStatus', None)
+            lines.append(json.dumps(item, cls=DecimalEncoder, separators=(',', ':')))
+
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            break
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/x-ndjson',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-API-Key',
+            'Access-Control-Expose-Headers': 'X-Next-Token',
+            'X-Next-Token': encode_page_token(start_key) or ''
+        },
+        'body': '\n'.join(lines) + ('\n' if lines else '')
+    }
+
+
+def batch_execute_personas(body: dict) -> dict:
+    """
+    Start persona agent executions for a list of persona IDs.
+
+    Personas are fetched with BatchGetItem (cache misses only) and the
+    executions are started in parallel under a shared rate limit so the
+    StartExecution API is not throttled.
+    """
+    step_function_arn = get_step_function_arn()
+    if not step_function_arn:
+        return api_response(503, {'error': 'Workflow execution not configured'})
+
+    persona_ids = body.get('personaIds', [])
+    if not isinstance(persona_ids, list) or not persona_ids:
+        raise ValueError("personaIds must be a non-empty list")
+    persona_ids = list(dict.fromkeys(persona_ids))
+    if len(persona_ids) > MAX_BATCH_EXECUTIONS:
+        raise ValueError(f"At most {MAX_BATCH_EXECUTIONS} personas per batch")
+
+    personas = batch_get_personas(persona_ids)
+    missing = [pid for pid in persona_ids if pid not in personas]
+
+    limiter = RateLimiter(BATCH_START_RATE)
+
+    def start(persona_id):
+        limiter.wait()
+        try:
+            return start_persona_execution(step_function_arn, personas[persona_id], body)
+        except ClientError as e:
+            logger.error(f"Failed to start execution for {persona_id}: {e}")
+            return {'personaId': persona_id, 'error': e.response['Error']['Code']}
+
+    to_start = [pid for pid in persona_ids if pid in personas]
+    with ThreadPoolExecutor(max_workers=BATCH_START_CONCURRENCY) as executor:
+        outcomes = list(executor.map(start, to_start))
+
+    started = [o for o in outcomes if 'executionArn' in o]
+    failed = [o for o in outcomes if 'error' in o]
+    failed.extend({'personaId': pid, 'error': 'Persona not found'} for pid in missing)
+
+    logger.info(f"Batch execute: {len(started)} started, {len(failed)} failed")
+
+    return api_response(202, {
+        'message': 'Persona agent executions started',
+        'started': len(started),
+        'failed': len(failed),
+        'executions': started,
+        'errors': failed
+    })
+
+
+def batch_get_personas(persona_ids: list) -> dict:
+    """Fetch personas by ID, using the cache and BatchGetItem for misses."""
+    personas = {}
+    misses = []
+    for persona_id in persona_ids:
+        cached = persona_cache.get_cached(persona_id)
+        if cached:
+            personas[persona_id] = cached
+        else:
+            misses.append(persona_id)
+
+    for item in batch_get_items(misses):
+        personas[item['personaId']] = item
+        persona_cache.put(item)
+
+    return personas
+
+
+def batch_get_items(persona_ids: list, **request_options) -> list:
+    """Read personas by ID with BatchGetItem, 100 keys per call, retrying unprocessed keys."""
+    items = []
+    for i in range(0, len(persona_ids), 100):
+        request = {PERSONAS_TABLE: {
+            'Keys': [{'personaId': pid} for pid in persona_ids[i:i + 100]],
+            **request_options
+        }}
+        attempt = 0
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(PERSONAS_TABLE, []))
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                attempt += 1
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+    return items
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly at `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def parse_json_lines(raw_body: str) -> list:
+    """Parse a JSON Lines request body."""
+    rows = []
+    for line_number, line in enumerate(raw_body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON on line {line_number}")
+    return rows
 
 
 def get_persona_results(persona_id: str, query_params: dict) -> dict:
-    """Get execution results for a persona."""
-    # This would query the results table
-    # For now, return a stub
+    """
+    Get execution results for a persona, newest first.
+
+    Reads the personaId-executedAt-index GSI so history is a single
+    index query rather than a table scan.
+
+    Query parameters:
+        limit: page size (default 10, max 50)
+        startDate / endDate: ISO-8601 bounds on executedAt
+        fields: comma-separated attribute projection
+        nextToken: continuation token from a previous page
+    """
+    if not persona_id:
+        raise ValueError("personaId is required")
+
     limit = min(int(query_params.get('limit', 10)), 50)
+    start_date = query_params.get('startDate', '')
+    end_date = query_params.get('endDate', '')
+
+    key_condition = Key('personaId').eq(persona_id)
+    if start_date and end_date:
+        key_condition = key_condition & Key('executedAt').between(start_date, end_date)
+    elif start_date:
+        key_condition = key_condition & Key('executedAt').gte(start_date)
+    elif end_date:
+        key_condition = key_condition & Key('executedAt').lte(end_date)
+
+    query_kwargs = {
+        'IndexName': RESULTS_PERSONA_INDEX,
+        'KeyConditionExpression': key_condition,
+        'ScanIndexForward': False,
+        'Limit': limit
+    }
+
+    query_kwargs.update(build_projection(query_params.get('fields', ''), RESULT_FIELDS))
+
+    start_key = decode_page_token(query_params.get('nextToken', ''))
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+
+    response = results_table.query(**query_kwargs)
+    items = response.get('Items', [])
 
     return api_response(200, {
         'personaId': persona_id,
-        'results': [],
-        'message': 'Query results table for actual results'
+        'results': json.loads(json.dumps(items, cls=DecimalEncoder)),
+        'count': len(items),
+        'nextToken': encode_page_token(response.get('LastEvaluatedKey'))
     })
 
 
+def build_projection(fields_param: str, allowed_fields: set, required_fields: list = ()) -> dict:
+    """
+    Translate a comma-separated field list into ProjectionExpression kwargs.
+
+    required_fields (e.g. key attributes needed for cursors) are always
+    projected when a projection is requested.
+    """
+    if not fields_param:
+        return {}
+
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    fields += [f for f in required_fields if f not in fields]
+
+    names = {f"#f{i}": field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names.keys()),
+        'ExpressionAttributeNames': names
+    }
+
+
+def encode_page_token(last_key: dict) -> str:
+    """Encode a DynamoDB LastEvaluatedKey as an opaque continuation token."""
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, cls=DecimalEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_page_token(token: str) -> dict:
+    """Decode a continuation token back into an ExclusiveStartKey."""
+    if not token:
+        return None
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid nextToken")
+    if not isinstance(start_key, dict):
+        raise ValueError("Invalid nextToken")
+    return start_key
+
+
 def api_response(status_code: int, body: dict) -> dict:
     """Format API Gateway response."""
     return {
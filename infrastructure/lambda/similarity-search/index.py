@@ -5,28 +5,70 @@ Performs k-NN vector similarity search on OpenSearch
 to find semantically similar content.
 """
 import os
+import sys
 import json
+import math
+import time
 import logging
 import boto3
+import numpy as np
 from opensearchpy import OpenSearch, RequestsHttpConnection
 from requests_aws4auth import AWS4Auth
+from common import content_index, search_cache
+from common.content_index import OPENSEARCH_READ_ALIAS
+from common.embeddings import embed_document, embed_many
+from common.vector_encoding import (
+    TITAN_DIMENSIONS, check_dimension, encode_vector, exact_score_config, normalize_score, score_cosine,
+    score_threshold
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Environment variables
 OPENSEARCH_ENDPOINT = os.environ.get('OPENSEARCH_ENDPOINT', '')
-OPENSEARCH_INDEX = os.environ.get('OPENSEARCH_INDEX', 'content-embeddings')
 BEDROCK_EMBEDDING_MODEL = os.environ.get('BEDROCK_EMBEDDING_MODEL', 'amazon.titan-embed-text-v2:0')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+# pooled: match document vectors; chunks: match best chunk via nested k-NN
+EMBEDDING_MODE = os.environ.get('EMBEDDING_MODE', 'pooled')
+
+# Filtered k-NN: filters matching at least this share of documents are
+# applied after an oversampled search; narrower ones inside the search
+KNN_POSTFILTER_MIN_SELECTIVITY = float(os.environ.get('KNN_POSTFILTER_MIN_SELECTIVITY', '0.8'))
+KNN_OVERSAMPLE_FACTOR = float(os.environ.get('KNN_OVERSAMPLE_FACTOR', '1.5'))
+KNN_MAX_CANDIDATES = int(os.environ.get('KNN_MAX_CANDIDATES', '10000'))
+# Engines without k-NN filtering (nmslib) score filters this narrow exactly
+KNN_EXACT_MAX_DOCS = int(os.environ.get('KNN_EXACT_MAX_DOCS', '20000'))
+KNN_SELECTIVITY_TTL_SECONDS = int(os.environ.get('KNN_SELECTIVITY_TTL_SECONDS', '300'))
+SEARCH_METRICS_ENABLED = os.environ.get('SEARCH_METRICS_ENABLED', 'true').lower() == 'true'
+SEARCH_METRICS_NAMESPACE = os.environ.get('SEARCH_METRICS_NAMESPACE', 'Brandpoint/Search')
+
+STRATEGIES = ('prefilter', 'postfilter', 'exact')
+
+# Hybrid search: each leg retrieves this many candidates for fusion
+HYBRID_CANDIDATES = int(os.environ.get('HYBRID_CANDIDATES', '50'))
+HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', '60'))
+HYBRID_VECTOR_WEIGHT = float(os.environ.get('HYBRID_VECTOR_WEIGHT', '0.5'))
+LEXICAL_FIELDS = ['title^2', 'content']
+
+BATCH_MAX_QUERIES = int(os.environ.get('BATCH_MAX_QUERIES', '50'))
+
+# Diversity: MMR and collapsing pick k results from a pool this many times k
+DIVERSITY_POOL_FACTOR = float(os.environ.get('DIVERSITY_POOL_FACTOR', '3'))
+DIVERSITY_MAX_POOL = int(os.environ.get('DIVERSITY_MAX_POOL', '100'))
+MMR_LAMBDA = float(os.environ.get('MMR_LAMBDA', '0.5'))
+# near_duplicate groups flagged near-duplicates with their original
+COLLAPSE_FIELDS = ('content_hash', 'source_url', 'near_duplicate')
 
 # Clients
-bedrock = boto3.client('bedrock-runtime')
 credentials = boto3.Session().get_credentials()
 
 # OpenSearch client (lazy initialization)
 _opensearch_client = None
 
+# (indices, filter) -> (matching docs, total docs, expires at)
+_selectivity = {}
+
 
 def get_opensearch_client():
     """Get or create OpenSearch client."""
@@ -73,6 +115,43 @@ def handler(event, context):
             "k": 10
         }
 
+    Scores and minScore are on the scale 1 / (2 - cosine), in [1/3, 1],
+    whatever the index encoding: minScore 0.5 keeps results with a
+    cosine similarity of at least 0 and 0.7 at least about 0.57.
+
+    Hybrid search (BM25 over title and content plus k-NN, in one
+    _msearch, merged by reciprocal rank fusion or weighted min-max
+    normalized scores; needs query text):
+        {"query": "...", "hybrid": true, "fusion": "rrf|weighted", "vectorWeight": 0.5, ...}
+
+    Batch search (queries embedded in one batch and run in one _msearch;
+    top-level fields are defaults for every query):
+        {"queries": [{"query": "...", "brandId": "..."}, ...], "k": 10, ...}
+    returns {"responses": [<search output or {"error": "..."}>, ...]}
+    in query order.
+
+    Diversity (either or both; k results are chosen from a candidate
+    pool of DIVERSITY_POOL_FACTOR * k, or "pool"):
+        {"query": "...", "mmr": true, "mmrLambda": 0.5, "collapse": "content_hash|source_url|near_duplicate"}
+    "mmr" re-ranks by maximal marginal relevance over the candidate
+    vectors (mmrLambda 1 is pure relevance); "collapse" keeps the best
+    result per field value.
+
+    More like this (seed vectors fetched in one ids search, seeds
+    excluded from their own results; other fields as for a search):
+        {"contentId": "..."} or {"contentIds": ["...", ...], "k": 10, ...}
+    A single contentId returns a search output; contentIds return
+    {"responses": [...]} in id order, each with its "contentId". An
+    unknown id gets {"contentId": "...", "error": "..."}.
+
+    Results are cached per normalized request until ingestion changes
+    the indexed content (see common.search_cache); pass "cache": false
+    to bypass. Cached responses carry "cached": true.
+
+    Short-result report (replays sampled documents as brand-filtered
+    queries under each filtering strategy):
+        {"mode": "short-results", "probes": 50, "k": 10, "filters": {...}}
+
     Output:
         {
             "results": [
@@ -85,9 +164,36 @@ def handler(event, context):
                     "metadata": {...}
                 }
             ],
-            "totalFound": 10
+            "totalFound": 10,
+            "strategy": "prefilter|postfilter|exact|none"
         }
+
+        Hybrid results also carry vectorScore/vectorRank and
+        lexicalScore/lexicalRank, with "fusion" and per-leg "timings"
+        (embedMs, vectorMs, lexicalMs, fusionMs) in milliseconds.
     """
+    if event.get('mode') == 'short-results':
+        return measure_short_results(event)
+    if 'queries' in event:
+        return batch_search(event)
+    if 'contentId' in event or 'contentIds' in event:
+        return more_like_this(event)
+
+    use_cache = event.get('cache', True)
+    request = normalize_request(event)
+    if use_cache:
+        cached, generation = search_cache.get(request)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+    result = search(event)
+    if use_cache:
+        search_cache.put(request, result, generation)
+    return result
+
+
+def search(event: dict) -> dict:
+    """Run one similarity search (see handler for the request format)."""
     query_text = event.get('query', '')
     embedding = event.get('embedding', [])
     brand_id = event.get('brandId', '')
@@ -95,61 +201,309 @@ def handler(event, context):
     k = min(event.get('k', 10), 100)  # Cap at 100
     min_score = event.get('minScore', 0.5)
     filters = event.get('filters', {})
+    hybrid = bool(event.get('hybrid'))
+    fusion = event.get('fusion', 'rrf')
+    diversity = diversity_options(event, k)
 
-    # Generate embedding if query text provided
-    if query_text and not embedding:
-        embedding = generate_embedding(query_text)
-    elif not embedding:
+    if not query_text and not embedding:
         raise ValueError("Either query or embedding is required")
+    if hybrid and not query_text:
+        raise ValueError("Hybrid search requires query text")
+    if fusion not in ('rrf', 'weighted'):
+        raise ValueError("fusion must be rrf or weighted")
 
     logger.info(f"Similarity search: k={k}, brandId={brand_id}, contentType={content_type}")
 
     client = get_opensearch_client()
+    # Dimension and encoding follow the indices behind the read alias
+    config = content_index.vector_config(client)
+
+    # Generate embedding if query text provided
+    started = time.monotonic()
+    if query_text and not embedding:
+        embedding = generate_embedding(query_text, config['dimension'])
+    embedding = encode_vector(check_dimension(embedding, config), config)
+    embed_ms = round((time.monotonic() - started) * 1000, 1)
+
+    # Date-bounded searches only go to indices covering the range
+    indices = content_index.indices_for_dates(client, filters.get('dateFrom'), filters.get('dateTo'))
+    query_type = 'text' if query_text else 'embedding'
+    if indices == []:
+        return {'results': [], 'totalFound': 0, 'k': k, 'queryType': query_type, 'strategy': 'none'}
 
     # Build query
-    search_query = build_knn_query(embedding, k, brand_id, content_type, filters, min_score)
+    filter_clauses = build_filter_clauses(brand_id, content_type, filters)
+    pool = diversity['pool'] if diversity else k
+    window = max(pool, HYBRID_CANDIDATES) if hybrid else pool
+    strategy, candidates, matching = choose_strategy(client, indices, filter_clauses, window)
+    if matching == 0:
+        record_search(strategy, k, 0, 0, 0)
+        return {'results': [], 'totalFound': 0, 'k': k, 'queryType': query_type, 'strategy': strategy}
+    if strategy == 'exact':
+        config = exact_score_config(config)
+    with_vectors = bool(diversity and diversity['mmrLambda'] is not None)
+    search_query = build_knn_query(
+        embedding, window, filter_clauses, score_threshold(min_score, config), strategy, candidates, with_vectors
+    )
+    target = ','.join(indices) if indices else OPENSEARCH_READ_ALIAS
+
+    if hybrid:
+        result = hybrid_search(
+            client, target, search_query, build_lexical_query(query_text, window, filter_clauses, with_vectors),
+            k, config, fusion, float(event.get('vectorWeight', HYBRID_VECTOR_WEIGHT)), diversity
+        )
+        result['timings']['embedMs'] = embed_ms
+        record_search(f"hybrid-{strategy}", k, min(k, matching), len(result['results']), result['timings']['vectorMs'])
+        return {**result, 'k': k, 'queryType': query_type, 'strategy': strategy}
 
     # Execute search
-    response = client.search(
-        index=OPENSEARCH_INDEX,
-        body=search_query
-    )
+    response = client.search(index=target, body=search_query)
 
     # Process results
-    results = []
-    for hit in response['hits']['hits']:
-        source = hit['_source']
-        results.append({
-            'contentId': source.get('content_id', hit['_id']),
-            'title': source.get('title', ''),
-            'preview': source.get('content_preview', ''),
-            'score': round(hit['_score'], 4),
-            'contentType': source.get('content_type', ''),
-            'brandId': source.get('brand_id', ''),
-            'sourceUrl': source.get('source_url', ''),
-            'author': source.get('author', ''),
-            'publishedDate': source.get('published_date', ''),
-            'ingestedAt': source.get('ingested_at', ''),
-            'sentimentScore': source.get('sentiment_score', 0),
-            'wordCount': source.get('word_count', 0),
-            'tags': source.get('tags', [])
-        })
+    hits = response['hits']['hits']
+    if diversity:
+        hits = diversify_hits(hits, k, config, diversity)
+    results = [format_hit(hit, config) for hit in hits]
 
     total_found = response['hits']['total']['value']
-    logger.info(f"Found {total_found} similar documents, returning {len(results)}")
+    logger.info(f"Found {total_found} similar documents, returning {len(results)} ({strategy})")
+    record_search(strategy, k, min(k, matching), len(results), response.get('took', 0))
 
-    return {
+    result = {
         'results': results,
         'totalFound': total_found,
         'k': k,
-        'queryType': 'text' if query_text else 'embedding'
+        'queryType': query_type,
+        'strategy': strategy
+    }
+    if diversity:
+        result['diversity'] = diversity
+    return result
+
+
+def normalize_request(event: dict) -> dict:
+    """The fields that determine a search's results, with defaults filled in."""
+    request = {
+        'query': ' '.join(str(event.get('query', '')).split()),
+        'brandId': event.get('brandId', ''),
+        'contentType': event.get('contentType', ''),
+        'k': min(event.get('k', 10), 100),
+        'minScore': event.get('minScore', 0.5),
+        'filters': event.get('filters', {}),
+        'hybrid': bool(event.get('hybrid'))
     }
+    if event.get('embedding'):
+        request['embedding'] = search_cache.request_key({'embedding': event['embedding']})
+    if request['hybrid']:
+        request['fusion'] = event.get('fusion', 'rrf')
+        request['vectorWeight'] = float(event.get('vectorWeight', HYBRID_VECTOR_WEIGHT))
+    if event.get('mmr') or event.get('collapse'):
+        request['diversity'] = diversity_options(event, request['k'])
+    return request
+
+
+def diversity_options(event: dict, k: int) -> dict:
+    """MMR and collapse settings for a request, or None when neither is asked for."""
+    mmr = bool(event.get('mmr'))
+    collapse = event.get('collapse') or None
+    if not mmr and not collapse:
+        return None
+    if collapse and collapse not in COLLAPSE_FIELDS:
+        raise ValueError(f"collapse must be one of {', '.join(COLLAPSE_FIELDS)}")
+    mmr_lambda = float(event.get('mmrLambda', MMR_LAMBDA)) if mmr else None
+    if mmr_lambda is not None and not 0 <= mmr_lambda <= 1:
+        raise ValueError("mmrLambda must be between 0 and 1")
+    pool = int(event.get('pool') or math.ceil(k * DIVERSITY_POOL_FACTOR))
+    return {
+        'mmrLambda': mmr_lambda,
+        'collapse': collapse,
+        'pool': max(k, min(DIVERSITY_MAX_POOL, pool))
+    }
+
 
+def diversify_hits(hits: list, k: int, config: dict, diversity: dict) -> list:
+    """Top k of a ranked k-NN candidate pool after collapsing and MMR."""
+    # Relevance is the cosine similarity to the query
+    relevance = [score_cosine(hit['_score'], config) for hit in hits]
+    chosen = diversify([hit['_source'] for hit in hits], relevance, k, diversity)
+    return [hits[i] for i in chosen]
 
-def build_knn_query(embedding: list, k: int, brand_id: str, content_type: str,
-                    filters: dict, min_score: float) -> dict:
-    """Build k-NN query with optional filters."""
-    # Build filter clauses
+
+def diversify(sources: list, relevance: list, k: int, diversity: dict) -> list:
+    """
+    Positions of the k sources to return, in order.
+
+    sources are ranked best first. Collapsing keeps the first source per
+    value of the collapse field (sources without one are kept). MMR then
+    picks greedily by mmrLambda * relevance - (1 - mmrLambda) * the
+    highest cosine similarity to a source already picked, with vectors
+    from each source's embedding.
+    """
+    kept = []
+    seen = set()
+    for position, source in enumerate(sources):
+        key = collapse_key(source, diversity['collapse'])
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(position)
+
+    mmr_lambda = diversity['mmrLambda']
+    vectors = [sources[i].get('embedding') or [] for i in kept]
+    dimension = max((len(v) for v in vectors), default=0)
+    if mmr_lambda is None or len(kept) <= 1 or not dimension:
+        return kept[:k]
+
+    # A candidate without a vector is treated as unlike every other
+    matrix = np.array([v if len(v) == dimension else [0.0] * dimension for v in vectors], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1.0, norms)
+    similarity = matrix @ matrix.T
+
+    relevance = np.array([relevance[i] for i in kept], dtype=np.float32)
+    redundancy = np.zeros(len(kept), dtype=np.float32)
+    available = np.ones(len(kept), dtype=bool)
+    chosen = []
+    for _ in range(min(k, len(kept))):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(kept[pick])
+        available[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick]) if len(chosen) > 1 else similarity[pick].copy()
+    return chosen
+
+
+def collapse_key(source: dict, field: str):
+    """Value results are collapsed on (None: never collapsed)."""
+    if not field:
+        return None
+    if field == 'near_duplicate':
+        return source.get('near_duplicate_of') or source.get('content_id')
+    return source.get(field) or None
+
+
+def format_hit(hit: dict, config: dict) -> dict:
+    """Result entry for a search hit."""
+    source = hit['_source']
+    return {
+        'contentId': source.get('content_id', hit['_id']),
+        'title': source.get('title', ''),
+        'preview': source.get('content_preview', ''),
+        'score': round(normalize_score(hit['_score'], config), 4),
+        'contentType': source.get('content_type', ''),
+        'brandId': source.get('brand_id', ''),
+        'sourceUrl': source.get('source_url', ''),
+        'author': source.get('author', ''),
+        'publishedDate': source.get('published_date', ''),
+        'ingestedAt': source.get('ingested_at', ''),
+        'sentimentScore': source.get('sentiment_score', 0),
+        'wordCount': source.get('word_count', 0),
+        'tags': source.get('tags', [])
+    }
+
+
+def build_lexical_query(query_text: str, size: int, filter_clauses: list, with_vectors: bool = False) -> dict:
+    """BM25 query over title and content with the same filters."""
+    return {
+        "size": size,
+        "query": {
+            "bool": {
+                "must": [{
+                    "multi_match": {
+                        "query": query_text,
+                        "fields": LEXICAL_FIELDS,
+                        "type": "best_fields"
+                    }
+                }],
+                "filter": filter_clauses
+            }
+        },
+        "_source": {
+            "excludes": ["chunks"] if with_vectors else ["embedding", "chunks"]
+        }
+    }
+
+
+def hybrid_search(client, target: str, vector_query: dict, lexical_query: dict, k: int,
+                  config: dict, fusion: str, vector_weight: float, diversity: dict = None) -> dict:
+    """
+    Run both legs in one _msearch and fuse them.
+
+    rrf scores a document sum(1 / (HYBRID_RRF_K + rank)) over the legs
+    that found it, so only ranks matter. weighted min-max normalizes
+    each leg's scores to [0, 1] and combines them with vector_weight;
+    a leg that missed a document contributes 0.
+    """
+    response = client.msearch(body=[
+        {"index": target}, vector_query,
+        {"index": target}, lexical_query
+    ])
+    return fuse_legs(response['responses'], k, config, fusion, vector_weight, diversity)
+
+
+def fuse_legs(responses: list, k: int, config: dict, fusion: str, vector_weight: float,
+              diversity: dict = None) -> dict:
+    """Fuse the vector and lexical _msearch responses of a hybrid search."""
+    legs = {}
+    timings = {}
+    for name, leg in zip(('vector', 'lexical'), responses):
+        if 'error' in leg:
+            # One failed leg degrades to the other rather than failing the search
+            logger.warning(f"Hybrid {name} leg failed: {leg['error']}")
+            leg = {'took': 0, 'hits': {'hits': []}}
+        legs[name] = leg['hits']['hits']
+        timings[f"{name}Ms"] = leg.get('took', 0)
+
+    started = time.monotonic()
+    weights = {'vector': vector_weight, 'lexical': 1 - vector_weight}
+    fused = {}
+    for name, hits in legs.items():
+        scores = [hit['_score'] for hit in hits]
+        low, high = (min(scores), max(scores)) if scores else (0, 0)
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit['_id'], {'hit': hit, 'score': 0.0})
+            entry[f"{name}Rank"] = rank
+            entry[f"{name}Score"] = hit['_score']
+            if fusion == 'rrf':
+                entry['score'] += 1 / (HYBRID_RRF_K + rank)
+            else:
+                entry['score'] += weights[name] * ((hit['_score'] - low) / (high - low) if high > low else 1.0)
+
+    ranked = sorted(fused.values(), key=lambda e: -e['score'])
+    if diversity:
+        # Fused scores, scaled to [0, 1], stand in for relevance
+        top = ranked[0]['score'] if ranked and ranked[0]['score'] > 0 else 1.0
+        ranked = [ranked[i] for i in diversify(
+            [entry['hit']['_source'] for entry in ranked], [entry['score'] / top for entry in ranked], k, diversity
+        )]
+
+    results = []
+    for entry in ranked[:k]:
+        result = format_hit(entry['hit'], config)
+        result['score'] = round(entry['score'], 6)
+        result['vectorScore'] = round(normalize_score(entry['vectorScore'], config), 4) if 'vectorScore' in entry else None
+        result['vectorRank'] = entry.get('vectorRank')
+        result['lexicalScore'] = round(entry['lexicalScore'], 4) if 'lexicalScore' in entry else None
+        result['lexicalRank'] = entry.get('lexicalRank')
+        results.append(result)
+    timings['fusionMs'] = round((time.monotonic() - started) * 1000, 2)
+
+    logger.info(f"Hybrid search fused {len(legs['vector'])} vector and {len(legs['lexical'])} lexical hits ({fusion})")
+    output = {
+        'results': results,
+        'totalFound': len(fused),
+        'fusion': fusion,
+        'timings': timings
+    }
+    if diversity:
+        output['diversity'] = diversity
+    return output
+
+
+def build_filter_clauses(brand_id: str, content_type: str, filters: dict) -> list:
+    """Filter clauses for the search request."""
     filter_clauses = []
 
     if brand_id:
@@ -159,6 +513,9 @@ def build_knn_query(embedding: list, k: int, brand_id: str, content_type: str,
         filter_clauses.append({"term": {"content_type": content_type}})
 
     # Add custom filters
+    if filters.get('clientId'):
+        filter_clauses.append({"term": {"client_id": filters['clientId']}})
+
     if filters.get('tags'):
         filter_clauses.append({"terms": {"tags": filters['tags']}})
 
@@ -183,86 +540,496 @@ def build_knn_query(embedding: list, k: int, brand_id: str, content_type: str,
             }
         })
 
-    # Build k-NN query
+    # Excluded documents (such as more-like-this seeds) go last; see choose_strategy
+    if filters.get('excludeIds'):
+        filter_clauses.append({
+            "bool": {
+                "must_not": [{"ids": {"values": filters['excludeIds']}}]
+            }
+        })
+
+    return filter_clauses
+
+
+def choose_strategy(client, indices: list, filter_clauses: list, k: int, strategy: str = None):
+    """
+    How to combine the filter with the k-NN search.
+
+    Returns (strategy, k-NN candidates, documents matching the filter):
+        prefilter   filter inside the k-NN clause (faiss/lucene); the
+                    engine searches only matching vectors, exactly when
+                    few match, so k results come back whenever k match
+        postfilter  oversampled k-NN, then the filter; cheapest when the
+                    filter keeps most documents
+        exact       script-scored exact k-NN over the filtered documents,
+                    for narrow filters on engines without k-NN filtering
+    A strategy can be forced, as the short-result report does.
+    """
+    # A handful of excluded ids cannot change the selectivity, and
+    # counting without them keeps one cached count per filter
+    counted = filter_clauses[:-1] if filter_clauses and is_exclusion(filter_clauses[-1]) else filter_clauses
+    matching, total = filter_counts(client, indices, counted)
+    if not filter_clauses:
+        return 'none', k, matching
+    selectivity = matching / total if total else 1.0
+
+    if strategy is None:
+        if selectivity >= KNN_POSTFILTER_MIN_SELECTIVITY:
+            strategy = 'postfilter'
+        elif content_index.knn_filter_supported(client, indices):
+            strategy = 'prefilter'
+        elif matching <= KNN_EXACT_MAX_DOCS and EMBEDDING_MODE != 'chunks':
+            strategy = 'exact'
+        else:
+            strategy = 'postfilter'
+
+    candidates = k
+    if strategy == 'postfilter':
+        # Enough candidates that k are expected to survive the filter
+        candidates = min(KNN_MAX_CANDIDATES, math.ceil(k * KNN_OVERSAMPLE_FACTOR / max(selectivity, 1e-6)))
+    return strategy, candidates, matching
+
+
+def is_exclusion(clause: dict) -> bool:
+    """True for the excludeIds clause from build_filter_clauses."""
+    return list(clause.get('bool', {})) == ['must_not']
+
+
+def filter_counts(client, indices: list, filter_clauses: list):
+    """(documents matching the filter, all documents), cached briefly per filter."""
+    target = ','.join(indices) if indices else OPENSEARCH_READ_ALIAS
+    key = (target, json.dumps(filter_clauses, sort_keys=True))
+    cached = _selectivity.get(key)
+    if cached and cached[2] > time.monotonic():
+        return cached[0], cached[1]
+
+    total = client.count(index=target)['count']
+    matching = total
     if filter_clauses:
+        matching = client.count(index=target, body={"query": {"bool": {"filter": filter_clauses}}})['count']
+    _cache_counts(key, matching, total)
+    return matching, total
+
+
+def prime_filter_counts(client, searches: list):
+    """Fetch the uncached counts for (indices, filter clauses) pairs in one _msearch."""
+    now = time.monotonic()
+    pending = {}
+    for indices, filter_clauses in searches:
+        target = ','.join(indices) if indices else OPENSEARCH_READ_ALIAS
+        key = (target, json.dumps(filter_clauses, sort_keys=True))
+        cached = _selectivity.get(key)
+        if not (cached and cached[2] > now):
+            pending[key] = filter_clauses
+    if not pending:
+        return
+
+    body = []
+    targets = sorted({target for target, _ in pending})
+    for target in targets:
+        body += [{"index": target}, {"size": 0, "track_total_hits": True}]
+    for (target, _), filter_clauses in pending.items():
+        body += [{"index": target}, {
+            "size": 0,
+            "track_total_hits": True,
+            "query": {"bool": {"filter": filter_clauses}}
+        }]
+    responses = client.msearch(body=body)['responses']
+
+    totals = {}
+    for target, response in zip(targets, responses):
+        if 'error' not in response:
+            totals[target] = response['hits']['total']['value']
+    for (key, _), response in zip(pending.items(), responses[len(targets):]):
+        # Anything that failed is counted on demand by filter_counts
+        if 'error' not in response and key[0] in totals:
+            _cache_counts(key, response['hits']['total']['value'], totals[key[0]])
+
+
+def _cache_counts(key: tuple, matching: int, total: int):
+    if len(_selectivity) >= 1000:
+        _selectivity.clear()
+    _selectivity[key] = (matching, total, time.monotonic() + KNN_SELECTIVITY_TTL_SECONDS)
+
+
+def batch_search(event: dict) -> dict:
+    """Run many searches with one embedding batch and one _msearch."""
+    defaults = {
+        key: event[key]
+        for key in ('brandId', 'contentType', 'k', 'minScore', 'filters', 'hybrid', 'fusion', 'vectorWeight',
+                    'mmr', 'mmrLambda', 'collapse', 'pool')
+        if key in event
+    }
+    queries = [{**defaults, **query} for query in event['queries']]
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise ValueError(f"At most {BATCH_MAX_QUERIES} queries per batch")
+
+    # Cached queries are answered without embedding or searching
+    use_cache = event.get('cache', True)
+    requests = []
+    for query in queries:
+        try:
+            requests.append(normalize_request(query))
+        except ValueError:
+            # Reported as that query's error below
+            requests.append(None)
+    lookups = [search_cache.get(request) if use_cache and request else (None, 0) for request in requests]
+    cached = [hit for hit, _ in lookups]
+    pending = [query for query, hit in zip(queries, cached) if hit is None]
+    if not pending:
+        return {'responses': [{**hit, 'cached': True} for hit in cached], 'timings': {'embedMs': 0}}
+
+    client = get_opensearch_client()
+    config = content_index.vector_config(client)
+
+    # One embedding batch for every query given as text
+    texts = [q.get('query', '') for q in pending if q.get('query') and not q.get('embedding')]
+    started = time.monotonic()
+    vectors = iter(embed_many(
+        texts, BEDROCK_EMBEDDING_MODEL,
+        dimensions=config['dimension'] if config['dimension'] in TITAN_DIMENSIONS else None
+    ) if texts else [])
+    embed_ms = round((time.monotonic() - started) * 1000, 1)
+
+    plans = []
+    for query in pending:
+        plan = {'query': query, 'k': min(query.get('k', 10), 100)}
+        plans.append(plan)
+        if query.get('query') and not query.get('embedding'):
+            query['embedding'] = next(vectors)
+        fusion = query.get('fusion', 'rrf')
+        if not query.get('query') and not query.get('embedding'):
+            plan['error'] = "Either query or embedding is required"
+        elif query.get('hybrid') and not query.get('query'):
+            plan['error'] = "Hybrid search requires query text"
+        elif fusion not in ('rrf', 'weighted'):
+            plan['error'] = "fusion must be rrf or weighted"
+        else:
+            try:
+                check_dimension(query['embedding'], config)
+                plan['diversity'] = diversity_options(query, plan['k'])
+            except ValueError as e:
+                plan['error'] = str(e)
+        if 'error' in plan:
+            continue
+        filters = query.get('filters', {})
+        plan['indices'] = content_index.indices_for_dates(client, filters.get('dateFrom'), filters.get('dateTo'))
+        plan['filterClauses'] = build_filter_clauses(query.get('brandId', ''), query.get('contentType', ''), filters)
+
+    prime_filter_counts(client, [
+        (plan['indices'], [clause for clause in plan['filterClauses'] if not is_exclusion(clause)])
+        for plan in plans if 'error' not in plan and plan['indices'] != []
+    ])
+
+    # Every search (two per hybrid query) goes into one _msearch
+    body = []
+    for plan in plans:
+        if 'error' in plan or plan['indices'] == []:
+            continue
+        query, k, diversity = plan['query'], plan['k'], plan['diversity']
+        pool = diversity['pool'] if diversity else k
+        window = max(pool, HYBRID_CANDIDATES) if query.get('hybrid') else pool
+        with_vectors = bool(diversity and diversity['mmrLambda'] is not None)
+        strategy, candidates, matching = choose_strategy(client, plan['indices'], plan['filterClauses'], window)
+        # Exact search scores 1 + cosine whatever the index's space
+        plan.update({
+            'strategy': strategy,
+            'matching': matching,
+            'scoring': exact_score_config(config) if strategy == 'exact' else config
+        })
+        if matching == 0:
+            continue
+        target = ','.join(plan['indices']) if plan['indices'] else OPENSEARCH_READ_ALIAS
+        plan['offset'] = len(body) // 2
+        body += [{"index": target}, build_knn_query(
+            encode_vector(query['embedding'], config), window, plan['filterClauses'],
+            score_threshold(query.get('minScore', 0.5), plan['scoring']), strategy, candidates, with_vectors
+        )]
+        if query.get('hybrid'):
+            body += [{"index": target}, build_lexical_query(query['query'], window, plan['filterClauses'], with_vectors)]
+    responses = client.msearch(body=body)['responses'] if body else []
+
+    output = []
+    for plan in plans:
+        query, k = plan['query'], plan['k']
+        if 'error' in plan:
+            output.append({'error': plan['error']})
+            continue
+        result = {
+            'results': [],
+            'totalFound': 0,
+            'k': k,
+            'queryType': 'text' if query.get('query') else 'embedding',
+            'strategy': plan.get('strategy', 'none')
+        }
+        if 'offset' in plan:
+            response = responses[plan['offset']]
+            if query.get('hybrid'):
+                result.update(fuse_legs(
+                    responses[plan['offset']:plan['offset'] + 2], k, plan['scoring'], query.get('fusion', 'rrf'),
+                    float(query.get('vectorWeight', HYBRID_VECTOR_WEIGHT)), plan['diversity']
+                ))
+            elif 'error' in response:
+                error = response['error']
+                result = {'error': error.get('reason', str(error)) if isinstance(error, dict) else str(error)}
+            else:
+                hits = response['hits']['hits']
+                if plan['diversity']:
+                    hits = diversify_hits(hits, k, plan['scoring'], plan['diversity'])
+                    result['diversity'] = plan['diversity']
+                result['results'] = [format_hit(hit, plan['scoring']) for hit in hits]
+                result['totalFound'] = response['hits']['total']['value']
+            if 'results' in result:
+                record_search(
+                    f"hybrid-{plan['strategy']}" if query.get('hybrid') else plan['strategy'],
+                    k, min(k, plan['matching']), len(result['results']), response.get('took', 0)
+                )
+        output.append(result)
+
+    searched = iter(output)
+    merged = []
+    for request, (hit, generation) in zip(requests, lookups):
+        if hit is not None:
+            merged.append({**hit, 'cached': True})
+            continue
+        result = next(searched)
+        if use_cache and request and 'error' not in result:
+            search_cache.put(request, result, generation)
+        merged.append(result)
+
+    logger.info(f"Batch search: {len(queries)} queries ({len(queries) - len(pending)} cached), "
+                f"{len(texts)} embedded, {len(body) // 2} searches")
+    return {'responses': merged, 'timings': {'embedMs': embed_ms}}
+
+
+def build_knn_query(embedding: list, k: int, filter_clauses: list, min_score: float,
+                    strategy: str = 'postfilter', candidates: int = None, with_vectors: bool = False) -> dict:
+    """Build k-NN query with optional filters, combined per strategy."""
+    candidates = candidates or k
+    if not filter_clauses:
+        query = build_vector_clause(embedding, k)
+    elif strategy == 'prefilter':
+        query = build_vector_clause(embedding, k, filter_clauses)
+    elif strategy == 'exact':
         query = {
-            "size": k,
-            "min_score": min_score,
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "knn": {
-                                "embedding": {
-                                    "vector": embedding,
-                                    "k": k * 2  # Fetch more to account for filtering
-                                }
-                            }
-                        }
-                    ],
-                    "filter": filter_clauses
+            "script_score": {
+                "query": {"bool": {"filter": filter_clauses}},
+                "script": {
+                    "source": "knn_score",
+                    "lang": "knn",
+                    "params": {
+                        "field": "embedding",
+                        "query_value": embedding,
+                        # 1 + cosine; normalize_score maps it to the public scale
+                        "space_type": "cosinesimil"
+                    }
                 }
-            },
-            "_source": {
-                "excludes": ["embedding"]  # Don't return the embedding vector
             }
         }
     else:
         query = {
-            "size": k,
-            "min_score": min_score,
-            "query": {
-                "knn": {
-                    "embedding": {
-                        "vector": embedding,
-                        "k": k
+            "bool": {
+                "must": [
+                    build_vector_clause(embedding, candidates)
+                ],
+                "filter": filter_clauses
+            }
+        }
+
+    return {
+        "size": k,
+        "min_score": min_score,
+        "query": query,
+        "_source": {
+            # Document vectors are only returned for MMR re-ranking
+            "excludes": ["chunks"] if with_vectors else ["embedding", "chunks"]
+        }
+    }
+
+
+def build_vector_clause(embedding: list, k: int, filter_clauses: list = None) -> dict:
+    """k-NN clause against document vectors or, in chunks mode, chunk vectors."""
+    knn = {
+        "vector": embedding,
+        "k": k
+    }
+    if filter_clauses:
+        # Efficient filtering: applied while searching, not afterwards
+        knn["filter"] = {"bool": {"filter": filter_clauses}}
+
+    if EMBEDDING_MODE == 'chunks':
+        # A document scores as its best-matching chunk
+        return {
+            "nested": {
+                "path": "chunks",
+                "score_mode": "max",
+                "query": {
+                    "knn": {
+                        "chunks.embedding": knn
                     }
                 }
-            },
-            "_source": {
-                "excludes": ["embedding"]
             }
         }
+    return {
+        "knn": {
+            "embedding": knn
+        }
+    }
 
-    return query
 
+def measure_short_results(event: dict) -> dict:
+    """
+    How often each filtering strategy returns fewer than k results.
 
-def generate_embedding(text: str) -> list:
-    """Generate embedding using Bedrock Titan."""
-    max_chars = 8000
-    truncated_text = text[:max_chars] if len(text) > max_chars else text
+    Samples documents at random and searches with each one's embedding,
+    filtered to its brand (plus any filters given). Every probe matches
+    at least its own document, so a result is short when it returns
+    fewer than min(k, documents matching the filter).
+    """
+    probes = min(int(event.get('probes', 50)), 500)
+    k = min(int(event.get('k', 10)), 100)
+    filters = event.get('filters', {})
+    min_score = event.get('minScore', 0.0)
 
-    try:
-        body = {"inputText": truncated_text}
+    client = get_opensearch_client()
+    config = content_index.vector_config(client)
+    indices = content_index.indices_for_dates(client, filters.get('dateFrom'), filters.get('dateTo'))
+    if indices == []:
+        return {'probes': 0, 'k': k, 'strategies': {}}
+    target = ','.join(indices) if indices else OPENSEARCH_READ_ALIAS
 
-        response = bedrock.invoke_model(
-            modelId=BEDROCK_EMBEDDING_MODEL,
-            body=json.dumps(body),
-            contentType="application/json",
-            accept="application/json"
-        )
+    sample = client.search(index=target, body={
+        "size": probes,
+        "query": {"function_score": {"query": {"exists": {"field": "embedding"}}, "random_score": {}}},
+        "_source": ["embedding", "brand_id"]
+    })['hits']['hits']
 
-        response_body = json.loads(response['body'].read())
-        return response_body.get('embedding', [])
+    strategies = list(STRATEGIES)
+    if not content_index.knn_filter_supported(client, indices):
+        strategies.remove('prefilter')
+    if EMBEDDING_MODE == 'chunks':
+        strategies.remove('exact')
+    report = {name: {'probes': 0, 'short': 0, 'returned': 0, 'expected': 0, 'tookMs': 0} for name in strategies + ['auto']}
+
+    for hit in sample:
+        source = hit['_source']
+        filter_clauses = build_filter_clauses(source.get('brand_id', ''), '', filters)
+        for name in report:
+            strategy, candidates, matching = choose_strategy(
+                client, indices, filter_clauses, k, None if name == 'auto' else name
+            )
+            response = client.search(index=target, body=build_knn_query(
+                source['embedding'], k, filter_clauses,
+                score_threshold(min_score, exact_score_config(config) if strategy == 'exact' else config),
+                strategy, candidates
+            ))
+            returned = len(response['hits']['hits'])
+            expected = min(k, matching)
+            stats = report[name]
+            stats['probes'] += 1
+            stats['short'] += int(returned < expected)
+            stats['returned'] += returned
+            stats['expected'] += expected
+            stats['tookMs'] += response.get('took', 0)
+
+    summary = {}
+    for name, stats in report.items():
+        count = stats['probes'] or 1
+        summary[name] = {
+            'probes': stats['probes'],
+            'shortResults': stats['short'],
+            'shortRate': round(stats['short'] / count, 4),
+            'meanReturned': round(stats['returned'] / count, 2),
+            'meanExpected': round(stats['expected'] / count, 2),
+            'meanTookMs': round(stats['tookMs'] / count, 1)
+        }
+    logger.info(f"Short-result report over {len(sample)} probes: {json.dumps(summary)}")
+    return {'probes': len(sample), 'k': k, 'strategies': summary}
+
+
+def record_search(strategy: str, k: int, expected: int, returned: int, took_ms: float):
+    """Emit result-count metrics per strategy in embedded metric format."""
+    if not SEARCH_METRICS_ENABLED:
+        return
+    metrics = {
+        'Results': returned,
+        'Shortfall': max(0, expected - returned),
+        'ShortResult': int(returned < expected),
+        'TookMs': took_ms
+    }
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': SEARCH_METRICS_NAMESPACE,
+                'Dimensions': [['Strategy']],
+                'Metrics': [
+                    {'Name': name, 'Unit': 'Milliseconds' if name.endswith('Ms') else 'Count'}
+                    for name in metrics
+                ]
+            }]
+        },
+        'Strategy': strategy,
+        'K': k,
+        **metrics
+    }
+    # One write, so the line stays pure JSON for EMF parsing
+    sys.stdout.write(json.dumps(record) + '\n')
+
+
+def generate_embedding(text: str, dimensions: int = None) -> list:
+    """Generate embedding using Bedrock Titan."""
+    try:
+        return embed_document(
+            text,
+            BEDROCK_EMBEDDING_MODEL,
+            dimensions=dimensions if dimensions in TITAN_DIMENSIONS else None
+        )['embedding']
 
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise
 
 
-def search_by_content_id(content_id: str, k: int = 10) -> dict:
-    """Find similar content by content ID."""
+def more_like_this(event: dict) -> dict:
+    """Search with stored document vectors as queries, excluding each seed."""
+    content_ids = event.get('contentIds') or [event.get('contentId')]
+    content_ids = [content_id for content_id in content_ids if content_id]
+    if not content_ids:
+        raise ValueError("contentId or contentIds is required")
+    if len(content_ids) > BATCH_MAX_QUERIES:
+        raise ValueError(f"At most {BATCH_MAX_QUERIES} content ids per request")
+
+    # Only the vector field; a get cannot span the indices behind the read alias
     client = get_opensearch_client()
+    response = client.search(index=OPENSEARCH_READ_ALIAS, body={
+        "size": len(content_ids),
+        "query": {"ids": {"values": content_ids}},
+        "_source": {"includes": ["embedding"]}
+    })
+    vectors = {hit['_id']: hit['_source'].get('embedding') for hit in response['hits']['hits']}
 
-    # First, get the embedding for the content
-    response = client.get(index=OPENSEARCH_INDEX, id=content_id)
-    embedding = response['_source'].get('embedding', [])
+    options = {key: value for key, value in event.items() if key not in ('contentId', 'contentIds', 'mode')}
+    filters = options.pop('filters', {})
+    queries = []
+    for content_id in content_ids:
+        if vectors.get(content_id):
+            excluded = list(dict.fromkeys(filters.get('excludeIds', []) + [content_id]))
+            queries.append({'embedding': vectors[content_id], 'filters': {**filters, 'excludeIds': excluded}})
 
-    if not embedding:
-        raise ValueError(f"No embedding found for content: {content_id}")
+    searched = iter(batch_search({**options, 'queries': queries})['responses'] if queries else [])
+    responses = []
+    for content_id in content_ids:
+        if vectors.get(content_id):
+            responses.append({'contentId': content_id, **next(searched)})
+        else:
+            responses.append({'contentId': content_id, 'error': f"No embedding found for content: {content_id}"})
 
-    # Now search for similar
-    return handler({
-        'embedding': embedding,
-        'k': k
-    }, None)
+    if 'contentIds' not in event:
+        return responses[0]
+    return {'responses': responses}
+
+
+def search_by_content_id(content_id: str, k: int = 10) -> dict:
+    """Find similar content by content ID."""
+    return more_like_this({'contentId': content_id, 'k': k})
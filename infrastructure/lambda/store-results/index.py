@@ -21,6 +21,7 @@ logger.setLevel(logging.INFO)
 RESULTS_TABLE = os.environ.get('RESULTS_TABLE', 'brandpoint-query-results')
 HUB_API_URL = os.environ.get('HUB_API_URL', '')
 HUB_API_SECRET = os.environ.get('HUB_API_SECRET', '')
+RESULT_RETENTION_DAYS = int(os.environ.get('RESULT_RETENTION_DAYS', '90'))
 
 # Clients
 dynamodb = boto3.resource('dynamodb')
@@ -72,24 +73,36 @@ def handler(event, context):
     logger.info(f"Storing results for execution: {execution_id}")
 
     result_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat() + 'Z'
+    now = datetime.utcnow()
+    executed_at = now.isoformat() + 'Z'
+    expires_at = get_expires_at(now)
 
-    # Prepare result record
+    # Prepare result record. executedAt/expiresAt back the
+    # personaId-executedAt-index GSI and the table TTL respectively.
     result_record = {
         'resultId': result_id,
         'executionId': execution_id,
+        'recordType': 'summary',
         'brandId': brand_id,
         'clientId': client_id,
-        'timestamp': timestamp,
+        'executedAt': executed_at,
         'overallVisibility': Decimal(str(overall_visibility)),
         'queryCount': len(query_results),
+        # Distinct queries of the run, read back by generate-queries to
+        # skip paraphrases of recent runs
+        'queries': list(dict.fromkeys(r.get('query', '') for r in query_results if r.get('query'))),
         'insights': insights,
         'engineBreakdown': json.loads(json.dumps(engine_breakdown), parse_float=Decimal),
-        'personaId': persona.get('personaId', ''),
         'personaName': persona.get('name', ''),
-        'ttl': int(datetime.utcnow().timestamp()) + (90 * 24 * 60 * 60)  # 90 days
+        'expiresAt': expires_at
     }
 
+    # GSI key attributes cannot be empty strings; leave personaId off
+    # records without one so they simply stay out of the index.
+    persona_id = persona.get('personaId', '')
+    if persona_id:
+        result_record['personaId'] = persona_id
+
     # Store summary in DynamoDB
     try:
         results_table.put_item(Item=result_record)
@@ -99,7 +112,7 @@ def handler(event, context):
         raise
 
     # Store individual query results
-    store_query_results(execution_id, query_results)
+    store_query_results(execution_id, query_results, executed_at, expires_at)
 
     # Sync to Hub API if configured
     synced_to_hub = False
@@ -111,12 +124,22 @@ def handler(event, context):
         'executionId': execution_id,
         'stored': True,
         'syncedToHub': synced_to_hub,
-        'timestamp': timestamp
+        'timestamp': executed_at
     }
 
 
-def store_query_results(execution_id: str, query_results: list):
-    """Store individual query results."""
+def get_expires_at(now: datetime) -> int:
+    """Epoch seconds after which DynamoDB TTL may remove a result."""
+    return int(now.timestamp()) + (RESULT_RETENTION_DAYS * 24 * 60 * 60)
+
+
+def store_query_results(execution_id: str, query_results: list, executed_at: str, expires_at: int):
+    """
+    Store individual query results.
+
+    Query rows carry no personaId so they stay out of the per-persona
+    GSI; they are read back by querying the executionId partition.
+    """
     if not query_results:
         return
 
@@ -134,8 +157,8 @@ def store_query_results(execution_id: str, query_results: list):
                 'sentiment': result.get('sentiment', 'neutral'),
                 'position': result.get('position'),
                 'mentionContext': result.get('mentionContext'),
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'ttl': int(datetime.utcnow().timestamp()) + (90 * 24 * 60 * 60)
+                'executedAt': executed_at,
+                'expiresAt': expires_at
             }
             batch.put_item(Item=item)
 
@@ -161,7 +184,7 @@ def sync_to_hub(result_record: dict, query_results: list) -> bool:
             'executionId': result_record['executionId'],
             'brandId': result_record['brandId'],
             'clientId': result_record['clientId'],
-            'timestamp': result_record['timestamp'],
+            'timestamp': result_record['executedAt'],
             'overallVisibility': float(result_record['overallVisibility']),
             'queryCount': result_record['queryCount'],
             'insights': result_record['insights'],
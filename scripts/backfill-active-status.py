@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# Brandpoint AI Platform - activeStatus Backfill
+#
+# Sets activeStatus = 'active' on personas written before the sparse
+# active-personas index existed, so the index returns every active
+# persona. A persona is active when isActive is true or, for older
+# records, status is 'active' (the same test load-persona's scan uses).
+#
+# load-persona and generate-queries keep scanning the table until the
+# stack is updated with ActivePersonasBackfilled=true; run this first.
+# Re-running is safe: personas that already carry activeStatus are
+# skipped, and the update is conditional, so a persona deactivated
+# mid-run is left alone.
+#
+# Usage:
+#   ./backfill-active-status.py --table brandpoint-ai-dev-personas
+#   ./backfill-active-status.py --table brandpoint-ai-prod-personas --dry-run
+#
+# Requires boto3.
+#
+import sys
+import argparse
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+ACTIVE = Attr('isActive').eq(True) | Attr('status').eq('active')
+
+
+def backfill(table, dry_run: bool) -> dict:
+    """Set activeStatus on every active persona that lacks it."""
+    scan_kwargs = {
+        'FilterExpression': ACTIVE & Attr('activeStatus').not_exists(),
+        'ProjectionExpression': 'personaId'
+    }
+    counts = {'updated': 0, 'skipped': 0}
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if dry_run:
+                counts['updated'] += 1
+                continue
+            try:
+                table.update_item(
+                    Key={'personaId': item['personaId']},
+                    UpdateExpression='SET activeStatus = :active',
+                    ConditionExpression=ACTIVE & Attr('activeStatus').not_exists(),
+                    ExpressionAttributeValues={':active': 'active'}
+                )
+                counts['updated'] += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                counts['skipped'] += 1
+        if 'LastEvaluatedKey' not in response:
+            return counts
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Backfill activeStatus on active personas')
+    parser.add_argument('--table', required=True, help='Personas table name')
+    parser.add_argument('--region', default=None)
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='Count personas without writing')
+    args = parser.parse_args()
+
+    session = boto3.session.Session(profile_name=args.profile, region_name=args.region)
+    table = session.resource('dynamodb').Table(args.table)
+
+    counts = backfill(table, args.dry_run)
+    verb = 'Would update' if args.dry_run else 'Updated'
+    print(f"{verb} {counts['updated']} personas ({counts['skipped']} changed during the run)")
+    if not args.dry_run:
+        print("Now update the stack with ActivePersonasBackfilled=true")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
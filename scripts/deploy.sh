@@ -261,6 +261,7 @@ EXPECTED_FUNCTIONS=(
     "analyze-visibility"
     "content-ingestion"
     "execute-query"
+    "execute-query-stream"
     "feature-extraction"
     "generate-queries"
     "graph-query"
@@ -293,7 +294,7 @@ if [ ${#MISSING_FUNCTIONS[@]} -gt 0 ]; then
     echo "Run without --skip-lambda-build to package and upload Lambda functions."
     exit 1
 fi
-echo -e "  ${GREEN}✓ All 15 Lambda packages found in S3${NC}"
+echo -e "  ${GREEN}✓ All ${#EXPECTED_FUNCTIONS[@]} Lambda packages found in S3${NC}"
 
 # Validate CloudFormation template
 echo "  Validating CloudFormation template..."
@@ -25,6 +25,7 @@ FUNCTIONS=(
     "load-persona"
     "generate-queries"
     "execute-query"
+    "execute-query-stream"
     "analyze-visibility"
     "store-results"
     "feature-extraction"
@@ -118,6 +118,7 @@ EXPECTED_FUNCTIONS=(
     "load-persona"
     "generate-queries"
     "execute-query"
+    "execute-query-stream"
     "analyze-visibility"
     "store-results"
     "feature-extraction"
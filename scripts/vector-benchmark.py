@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Brandpoint AI Platform - k-NN Recall vs Memory Benchmark
+#
+# Embeds a sample of content at each Titan v2 dimension and measures how
+# well each vector encoding preserves nearest neighbours, next to the
+# estimated native memory of an HNSW graph holding the full corpus. Use
+# it to choose EMBEDDING_DIMENSIONS / VECTOR_ENCODING before running a
+# migrate-vectors job against content-ingestion.
+#
+# Recall@k is measured by exact search over the encoded vectors against
+# exact fp32 search at the largest dimension, so it isolates encoding and
+# dimension loss from HNSW approximation (which all encodings share).
+#
+# Usage:
+#   ./vector-benchmark.py --input sample.jsonl --corpus-size 2000000
+#   ./vector-benchmark.py --input s3://bucket/export.jsonl.gz --limit 3000 --k 10
+#
+# Requires boto3 and numpy; faiss (faiss-cpu) adds the pq rows.
+#
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrastructure', 'lambda'))
+
+from common.embeddings import embed_many  # noqa: E402
+from common.vector_encoding import (  # noqa: E402
+    BYTES_PER_DIMENSION, TITAN_DIMENSIONS, encode_vector, make_config, memory_bytes
+)
+
+
+def load_texts(source: str, limit: int) -> list:
+    """Content strings from a local JSON-lines file or an s3:// object."""
+    if source.startswith('s3://'):
+        from common.s3_records import iter_records
+        records = (record for record, _ in iter_records(source))
+    else:
+        with open(source) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    texts = []
+    for record in records:
+        text = (record.get('content') or '').strip()
+        if text:
+            texts.append(text)
+        if len(texts) >= limit:
+            break
+    return texts
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries.astype(np.float32) @ corpus.astype(np.float32).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def suggested_byte_scale(vectors: np.ndarray) -> float:
+    # Map the 99.9th percentile magnitude to the int8 limit
+    return round(127 / float(np.percentile(np.abs(vectors), 99.9)), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='k-NN recall vs memory benchmark')
+    parser.add_argument('--input', required=True, help='JSON-lines file or s3:// object with "content"')
+    parser.add_argument('--limit', type=int, default=2000, help='texts to embed')
+    parser.add_argument('--queries', type=int, default=200, help='texts held out as queries')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--corpus-size', type=int, default=1000000, help='vectors to size memory for')
+    parser.add_argument('--byte-scale', type=float, default=None, help='default: derived from the sample')
+    parser.add_argument('--model', default='amazon.titan-embed-text-v2:0')
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.limit)
+    if len(texts) <= args.queries + args.k:
+        sys.exit(f"Need more than {args.queries + args.k} texts, got {len(texts)}")
+
+    vectors = {
+        dimension: np.array(embed_many(texts, args.model, dimensions=dimension, normalize=True), dtype=np.float32)
+        for dimension in TITAN_DIMENSIONS
+    }
+    reference = vectors[max(TITAN_DIMENSIONS)]
+    truth = top_k(reference[:args.queries], reference[args.queries:], args.k)
+    baseline = memory_bytes(args.corpus_size, {'dimension': 1536, 'encoding': 'fp32'})
+
+    try:
+        import faiss
+    except ImportError:
+        faiss = None
+
+    rows = []
+    for dimension, matrix in vectors.items():
+        queries, corpus = matrix[:args.queries], matrix[args.queries:]
+        byte_scale = args.byte_scale or suggested_byte_scale(matrix)
+
+        for encoding in ('fp32', 'fp16', 'byte', 'pq'):
+            if encoding == 'pq':
+                if faiss is None or len(corpus) < 256:
+                    continue
+                config = {'dimension': dimension, 'encoding': 'pq'}
+                pq = faiss.IndexPQ(dimension, dimension // 8, 8, faiss.METRIC_INNER_PRODUCT)
+                pq.train(corpus)
+                pq.add(corpus)
+                _, found = pq.search(queries, args.k)
+            else:
+                config = make_config(dimension, encoding, byte_scale=byte_scale)
+                if encoding == 'fp16':
+                    encode = lambda m: m.astype(np.float16)  # noqa: E731
+                elif encoding == 'byte':
+                    encode = lambda m: np.array([encode_vector(v.tolist(), config) for v in m], dtype=np.int8)  # noqa: E731
+                else:
+                    encode = lambda m: m  # noqa: E731
+                found = top_k(encode(queries), encode(corpus), args.k)
+
+            memory = memory_bytes(args.corpus_size, config)
+            rows.append({
+                'dimension': dimension,
+                'encoding': encoding,
+                'recallAtK': round(recall(found, truth), 4),
+                'memoryGiB': round(memory / 1024 ** 3, 2),
+                'reductionVs1536Fp32': round(baseline / memory, 1),
+                'bytesPerDimension': BYTES_PER_DIMENSION.get(encoding),
+                'byteScale': byte_scale if encoding == 'byte' else None
+            })
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{len(texts) - args.queries} corpus / {args.queries} query vectors, recall@{args.k} "
+          f"vs fp32 at {max(TITAN_DIMENSIONS)} dims, memory for {args.corpus_size:,} vectors")
+    print(f"{'dims':>5} {'encoding':>8} {'recall':>7} {'memory GiB':>11} {'vs 1536 fp32':>13}")
+    for row in rows:
+        print(f"{row['dimension']:>5} {row['encoding']:>8} {row['recallAtK']:>7.3f} "
+              f"{row['memoryGiB']:>11.2f} {row['reductionVs1536Fp32']:>12.1f}x")
+    scales = {row['dimension']: row['byteScale'] for row in rows if row['byteScale']}
+    print(f"Suggested VECTOR_BYTE_SCALE by dimension: {scales}")
+
+
+if __name__ == '__main__':
+    main()